@@ -1,10 +1,16 @@
 from __future__ import annotations
+import hashlib
+import ipaddress
 import json
 import re
+import sqlite3
+import time
 from pathlib import Path
-from collections import Counter, defaultdict
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Executor
 from dataclasses import dataclass, field, asdict
-from typing import Any
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterator, TextIO
 
 MAX_PROTOCOLS_DISPLAY = 10
 MAX_TOP_TALKERS = 10
@@ -19,6 +25,58 @@ MAX_PAYLOAD_ASCII_LENGTH = 1000
 MAX_PAYLOAD_PREVIEW_LENGTH = 100
 MAX_PAYLOAD_HEX_PREVIEW_BYTES = 100
 PORT_SCAN_THRESHOLD = 20
+MAX_EVENTS_PER_SESSION = 100
+MAX_TRACKED_HOSTS = 100
+MAX_PENDING_HTTP_REQUESTS = 10000
+HTTP_PENDING_TIMEOUT = 120.0
+MAX_TRACKED_DOMAINS = 1000
+MAX_PENDING_DNS_QUERIES = 50000
+DNS_QUERY_TIMEOUT = 10.0
+# Rows kept as search columns per analysis; larger results are not cached
+MAX_CACHED_ROWS = 500_000
+MAX_COLUMN_CACHES = 50
+
+# Minimum seconds between progress callbacks
+PROGRESS_INTERVAL = 1.0
+
+# Tshark outputs numeric query types (1=A, 28=AAAA, etc)
+DNS_QTYPE_NAMES = {
+    "1": "A",
+    "2": "NS",
+    "5": "CNAME",
+    "6": "SOA",
+    "12": "PTR",
+    "15": "MX",
+    "16": "TXT",
+    "28": "AAAA",
+    "33": "SRV",
+    "65": "HTTPS",
+    "255": "ANY",
+}
+
+DNS_RCODE_NAMES = {
+    "0": "NOERROR",
+    "1": "FORMERR",
+    "2": "SERVFAIL",
+    "3": "NXDOMAIN",
+    "4": "NOTIMP",
+    "5": "REFUSED",
+}
+
+# Any tcp anomaly OR reset flag
+TCP_ANOMALY_FILTER = "tcp.analysis.flags or tcp.flags.reset==1"
+
+# tshark analysis flag -> label shown in the diagnostics panel
+TCP_ANOMALY_FLAGS = {
+    "tcp.analysis.retransmission": "Retransmission",
+    "tcp.analysis.fast_retransmission": "Fast Retransmission",
+    "tcp.analysis.out_of_order": "Out-of-Order",
+    "tcp.analysis.duplicate_ack": "Duplicate ACK",
+    "tcp.analysis.zero_window": "Zero Window",
+    "tcp.analysis.window_full": "Window Full",
+    "tcp.analysis.lost_segment": "Lost Segment",
+    "tcp.analysis.ack_lost_segment": "ACK Lost",
+}
 
 
 @dataclass
@@ -101,285 +159,171 @@ class AnalysisResult:
         }
 
 
-class PcapAnalyzer:
-    def __init__(self, filepath: str | Path):
-        self.filepath = Path(filepath)
-
-    def _report_progress(self, count: int, message: str = "") -> None:
-        import sys
-
-        # Report every 1000 packets to avoid I/O overhead
-        if count % 1000 == 0:
-            data = {"type": "progress", "count": count, "message": message}
-            print(f"PROGRESS:{json.dumps(data)}", file=sys.stderr, flush=True)
-
-    def generate_html_report(self, analysis_type: str, data: dict[str, Any]) -> str:
-        import datetime
-
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        filename = self.filepath.name
-
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>NetLens Analysis Report - {analysis_type}</title>
-            <style>
-                body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; line-height: 1.6; color: #333; max-width: 1200px; margin: 0 auto; padding: 20px; }}
-                h1 {{ color: #1e40af; border-bottom: 2px solid #e2e8f0; padding-bottom: 10px; }}
-                h2 {{ color: #1e3a8a; margin-top: 30px; }}
-                .meta {{ color: #64748b; font-size: 0.9em; margin-bottom: 30px; }}
-                .card {{ background: #f8fafc; border: 1px solid #e2e8f0; border-radius: 8px; padding: 20px; margin-bottom: 20px; }}
-                .stat-grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 20px; }}
-                .stat-item {{ background: white; padding: 15px; border-radius: 6px; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }}
-                .stat-label {{ color: #64748b; font-size: 0.85em; display: block; }}
-                .stat-value {{ color: #0f172a; font-size: 1.5em; font-weight: bold; }}
-                table {{ width: 100%; border-collapse: collapse; margin-top: 10px; background: white; }}
-                th, td {{ padding: 12px; text-align: left; border-bottom: 1px solid #e2e8f0; }}
-                th {{ background: #f1f5f9; color: #475569; font-weight: 600; }}
-                tr:hover {{ background: #f8fafc; }}
-                .badge {{ padding: 2px 8px; border-radius: 4px; font-size: 0.85em; font-weight: 500; }}
-                .badge-red {{ background: #fee2e2; color: #991b1b; }}
-                .badge-green {{ background: #dcfce7; color: #166534; }}
-                .badge-blue {{ background: #dbeafe; color: #1e40af; }}
-            </style>
-        </head>
-        <body>
-            <h1>NetLens Analysis Report</h1>
-            <div class="meta">
-                <p><strong>File:</strong> {filename}</p>
-                <p><strong>Type:</strong> {analysis_type}</p>
-                <p><strong>Generated:</strong> {timestamp}</p>
-            </div>
-        """
-
-        if analysis_type == "pcap_summary":
-            summary = data.get("summary", {})
-            protocols = data.get("protocols", [])
-
-            html += f"""
-            <div class="card">
-                <h2>Summary Overview</h2>
-                <div class="stat-grid">
-                    <div class="stat-item">
-                        <span class="stat-label">Total Packets</span>
-                        <span class="stat-value">{summary.get("total_packets", 0):,}</span>
-                    </div>
-                    <div class="stat-item">
-                        <span class="stat-label">Total Bytes</span>
-                        <span class="stat-value">{summary.get("total_bytes", 0):,}</span>
-                    </div>
-                    <div class="stat-item">
-                        <span class="stat-label">Duration</span>
-                        <span class="stat-value">{summary.get("duration_seconds", 0)}s</span>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="card">
-                <h2>Protocol Distribution</h2>
-                <table>
-                    <thead><tr><th>Protocol</th><th>Count</th><th>Percentage</th></tr></thead>
-                    <tbody>
-            """
-            for p in protocols:
-                html += f"<tr><td>{p.get('name')}</td><td>{p.get('count')}</td><td>{p.get('percentage')}%</td></tr>"
-
-            html += "</tbody></table></div>"
-
-        elif analysis_type == "security_scan":
-            alerts = data.get("security_alerts", [])
-            html += f"""
-            <div class="card">
-                <h2>Security Alerts ({len(alerts)})</h2>
-                <table>
-                    <thead><tr><th>Severity</th><th>Type</th><th>Source</th><th>Description</th></tr></thead>
-                    <tbody>
-            """
-            for alert in alerts:
-                severity = alert.get("severity", "Low")
-                badge_class = "badge-red" if severity == "High" else "badge-blue"
-                html += f"""
-                <tr>
-                    <td><span class="badge {badge_class}">{severity}</span></td>
-                    <td>{alert.get("alert_type")}</td>
-                    <td>{alert.get("source_ip")}</td>
-                    <td>{alert.get("description")}</td>
-                </tr>
-                """
-            html += "</tbody></table></div>"
+def _first_occurrence(row: dict[str, str], name: str, default: str = "") -> str:
+    """First value of a field streamed with occurrence=a"""
+    value = row.get(name)
+    return value.split(",")[0] if value else default
+
+
+class SummaryAggregator:
+    """Totals, protocol mix, top talkers and per-second timeline"""
+
+    DISPLAY_FILTER: str | None = None
+    FIELDS = [
+        "frame.time_epoch",
+        "frame.len",
+        "ip.src",
+        "ip.dst",
+        "ipv6.src",
+        "ipv6.dst",
+        "_ws.col.protocol",
+    ]
+    OCCURRENCE = "f"
+    NEEDS_CONTEXT = False
+
+    def __init__(self):
+        self.total_packets = 0
+        self.total_bytes = 0
+        self.first_timestamp: float | None = None
+        self.last_timestamp: float | None = None
+        self.start_time: int | None = None
+        self.protocol_counter: Counter[str] = Counter()
+        self.ip_stats: dict[str, dict[str, int]] = {}
+        self.timeline_buckets: dict[int, dict[str, int]] = {}
+
+    def _ip(self, ip: str) -> dict[str, int]:
+        stats = self.ip_stats.get(ip)
+        if stats is None:
+            stats = self.ip_stats[ip] = {
+                "sent": 0,
+                "received": 0,
+                "bytes_sent": 0,
+                "bytes_received": 0,
+            }
+        return stats
 
-        elif analysis_type == "tcp_anomalies":
-            sessions = data.get("anomalous_sessions", [])
-            html += f"""
-            <div class="card">
-                <h2>TCP Anomalies ({len(sessions)} Sessions)</h2>
-                <table>
-                    <thead><tr><th>Stream</th><th>Source</th><th>Destination</th><th>Issues</th></tr></thead>
-                    <tbody>
-            """
-            for s in sessions:
-                issues = ", ".join(
-                    [f"{k}: {v}" for k, v in s.get("anomaly_summary", {}).items()]
-                )
-                html += f"""
-                <tr>
-                    <td>Stream #{s.get("stream_id")}</td>
-                    <td>{s.get("src")}</td>
-                    <td>{s.get("dst")}</td>
-                    <td><span class="badge badge-red">{issues}</span></td>
-                </tr>
-                """
-            html += "</tbody></table></div>"
-
-        html += """
-        </body>
-        </html>
-        """
-        return html
+    def update(self, row: dict[str, str]) -> None:
+        self.total_packets += 1
+        pkt_len = int(row.get("frame.len") or 0)
+        self.total_bytes += pkt_len
 
-    def _save_report(
-        self, data: dict, report_type: str, output_dir: str | None = None
-    ) -> None:
+        # Time
         try:
-            if output_dir:
-                save_dir = Path(output_dir)
-            else:
-                save_dir = Path(self.filepath).parent / "analysis_reports"
-
-            save_dir.mkdir(parents=True, exist_ok=True)
-            report_path = save_dir / f"{report_type}_{Path(self.filepath).name}.json"
-
-            if "scan_time" not in data:
-                import time
-
-                data["scan_time"] = str(time.time())
-
-            with open(report_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-
-            try:
-                html_content = self.generate_html_report(report_type, data)
-                html_path = save_dir / f"{report_type}_{Path(self.filepath).name}.html"
-                with open(html_path, "w", encoding="utf-8") as f:
-                    f.write(html_content)
-                data["saved_html_path"] = str(html_path)
-            except Exception as e:
-                import sys
-
-                print(f"Error generating HTML report: {e}", file=sys.stderr)
-
-            data["saved_path"] = str(report_path)
-        except Exception as e:
-            data["save_error"] = str(e)
-            import sys
-
-            print(f"Error saving {report_type} report: {e}", file=sys.stderr)
-
-    def _build_filter(self, base_filter: str, search_query: str | None) -> str:
-        if not search_query:
-            return base_filter
-        return f"({base_filter}) and ({search_query})"
-
-    def _is_binary(self, data: bytes) -> bool:
-        if not data:
-            return False
-        # Count non-printable chars (excluding common whitespace)
-        # Printable: 32-126. Whitespace: 9, 10, 13.
-        text_chars = bytearray(
-            {7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7F}
-        )
-        return bool(data.translate(None, text_chars))
+            ts = float(row.get("frame.time_epoch", 0))
+            if self.start_time is None:
+                self.start_time = int(ts)
+            if self.first_timestamp is None or ts < self.first_timestamp:
+                self.first_timestamp = ts
+            if self.last_timestamp is None or ts > self.last_timestamp:
+                self.last_timestamp = ts
+
+            bucket_ts = int(ts) - self.start_time
+            if bucket_ts >= 0:
+                bucket = self.timeline_buckets.get(bucket_ts)
+                if bucket is None:
+                    bucket = self.timeline_buckets[bucket_ts] = {
+                        "bytes": 0,
+                        "packets": 0,
+                    }
+                bucket["bytes"] += pkt_len
+                bucket["packets"] += 1
+        except (ValueError, TypeError):
+            pass
+
+        # Protocol
+        proto = row.get("_ws.col.protocol", "Unknown")
+        self.protocol_counter[proto] += 1
+
+        # IP
+        src = row.get("ip.src") or row.get("ipv6.src")
+        dst = row.get("ip.dst") or row.get("ipv6.dst")
+
+        if src:
+            # Handle multiple IPs in one packet (e.g. tunneling)
+            for s in src.split(","):
+                stats = self._ip(s)
+                stats["sent"] += 1
+                stats["bytes_sent"] += pkt_len
+        if dst:
+            for d in dst.split(","):
+                stats = self._ip(d)
+                stats["received"] += 1
+                stats["bytes_received"] += pkt_len
+
+    def merge(self, other: SummaryAggregator) -> None:
+        self.total_packets += other.total_packets
+        self.total_bytes += other.total_bytes
+        if other.first_timestamp is not None and (
+            self.first_timestamp is None or other.first_timestamp < self.first_timestamp
+        ):
+            self.first_timestamp = other.first_timestamp
+        if other.last_timestamp is not None and (
+            self.last_timestamp is None or other.last_timestamp > self.last_timestamp
+        ):
+            self.last_timestamp = other.last_timestamp
+        self.protocol_counter.update(other.protocol_counter)
+
+        for ip, stats in other.ip_stats.items():
+            mine = self._ip(ip)
+            for key, value in stats.items():
+                mine[key] += value
+
+        if other.start_time is None:
+            return
+        if self.start_time is None:
+            self.start_time = other.start_time
+        # Buckets are seconds since start_time, re-key the other side's
+        shift = other.start_time - self.start_time
+        for bucket_ts, data in other.timeline_buckets.items():
+            if bucket_ts + shift < 0:
+                continue
+            bucket = self.timeline_buckets.setdefault(
+                bucket_ts + shift, {"bytes": 0, "packets": 0}
+            )
+            bucket["bytes"] += data["bytes"]
+            bucket["packets"] += data["packets"]
 
-    def analyze_summary(self) -> AnalysisResult:
-        from .tshark import tshark
+    def to_state(self) -> dict[str, Any]:
+        """JSON-safe state for tail checkpoints"""
+        return {
+            "total_packets": self.total_packets,
+            "total_bytes": self.total_bytes,
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp,
+            "start_time": self.start_time,
+            "protocol_counter": dict(self.protocol_counter),
+            "ip_stats": self.ip_stats,
+            "timeline_buckets": [[k, v] for k, v in self.timeline_buckets.items()],
+        }
 
-        if not tshark.is_available():
-            return AnalysisResult()
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> SummaryAggregator:
+        aggregator = cls()
+        aggregator.total_packets = int(state["total_packets"])
+        aggregator.total_bytes = int(state["total_bytes"])
+        aggregator.first_timestamp = state["first_timestamp"]
+        aggregator.last_timestamp = state["last_timestamp"]
+        aggregator.start_time = state["start_time"]
+        aggregator.protocol_counter = Counter(state["protocol_counter"])
+        aggregator.ip_stats = dict(state["ip_stats"])
+        aggregator.timeline_buckets = {
+            int(k): dict(v) for k, v in state["timeline_buckets"]
+        }
+        return aggregator
 
+    def result(self) -> AnalysisResult:
         result = AnalysisResult()
-
-        fields = [
-            "frame.time_epoch",
-            "frame.len",
-            "ip.src",
-            "ip.dst",
-            "ipv6.src",
-            "ipv6.dst",
-            "_ws.col.protocol",
-        ]
-
-        protocol_counter: Counter[str] = Counter()
-        # pyright: ignore
-        ip_stats: dict[str, dict[str, int]] = defaultdict(
-            lambda: {"sent": 0, "received": 0, "bytes_sent": 0, "bytes_received": 0}
-        )
-
-        timestamps = []
-        total_bytes = 0
-        total_packets = 0
-
-        # pyright: ignore
-        timeline_buckets: dict[int, dict[str, int]] = defaultdict(
-            lambda: {"bytes": 0, "packets": 0}
-        )
-        start_time = None
-
-        try:
-            for row in tshark.stream_fields(str(self.filepath), fields):
-                total_packets += 1
-                self._report_progress(total_packets, "Analyzing summary...")
-                pkt_len = int(row.get("frame.len", 0))
-                total_bytes += pkt_len
-
-                # Time
-                try:
-                    ts = float(row.get("frame.time_epoch", 0))
-                    if start_time is None:
-                        start_time = int(ts)
-                        timestamps.append(ts)  # First
-                    timestamps.append(
-                        ts
-                    )  # Keep track for min/max logic below if needed
-                    # Optimization: Just track min/max without list if huge?
-                    # But existing logic used list for min/max.
-
-                    bucket_ts = int(ts) - start_time
-                    if bucket_ts >= 0:
-                        timeline_buckets[bucket_ts]["bytes"] += pkt_len
-                        timeline_buckets[bucket_ts]["packets"] += 1
-                except (ValueError, TypeError):
-                    pass
-
-                # Protocol
-                proto = row.get("_ws.col.protocol", "Unknown")
-                protocol_counter[proto] += 1
-
-                # IP
-                src = row.get("ip.src") or row.get("ipv6.src")
-                dst = row.get("ip.dst") or row.get("ipv6.dst")
-
-                if src:
-                    # Handle multiple IPs in one packet (e.g. tunneling)
-                    for s in src.split(","):
-                        ip_stats[s]["sent"] += 1
-                        ip_stats[s]["bytes_sent"] += pkt_len
-                if dst:
-                    for d in dst.split(","):
-                        ip_stats[d]["received"] += 1
-                        ip_stats[d]["bytes_received"] += pkt_len
-
-        except Exception as e:
-            print(f"Summary analysis error: {e}")
+        total_packets = self.total_packets
+        first = self.first_timestamp
+        last = self.last_timestamp
 
         result.summary = PacketSummary(
             total_packets=total_packets,
-            total_bytes=total_bytes,
-            first_timestamp=min(timestamps) if timestamps else 0.0,
-            last_timestamp=max(timestamps) if timestamps else 0.0,
-            duration_seconds=round(max(timestamps) - min(timestamps), 3)
-            if len(timestamps) > 1
+            total_bytes=self.total_bytes,
+            first_timestamp=first if first is not None else 0.0,
+            last_timestamp=last if last is not None else 0.0,
+            duration_seconds=round(last - first, 3)
+            if first is not None and last is not None
             else 0.0,
         )
 
@@ -391,11 +335,11 @@ class PcapAnalyzer:
                 if total_packets
                 else 0.0,
             )
-            for name, count in protocol_counter.most_common(MAX_PROTOCOLS_DISPLAY)
+            for name, count in self.protocol_counter.most_common(MAX_PROTOCOLS_DISPLAY)
         ]
 
         sorted_ips = sorted(
-            ip_stats.items(),
+            self.ip_stats.items(),
             key=lambda x: x[1]["sent"] + x[1]["received"],
             reverse=True,
         )[:MAX_TOP_TALKERS]
@@ -412,7 +356,7 @@ class PcapAnalyzer:
         ]
 
         # Populate timeline (limit to 50 points to prevent overload)
-        sorted_buckets = sorted(timeline_buckets.items())
+        sorted_buckets = sorted(self.timeline_buckets.items())
         total_buckets = len(sorted_buckets)
 
         if total_buckets > MAX_TIMELINE_POINTS:
@@ -439,203 +383,1232 @@ class PcapAnalyzer:
 
         return result
 
-    def analyze_http(self, search_query: str | None = None) -> dict[str, Any]:
-        from .tshark import tshark
 
-        if not tshark.is_available():
-            return {}
+class SecurityAggregator:
+    """Port scan detection plus payload checks for credentials, SQLi and XSS"""
+
+    # SYNs for the port scan check and data segments for the payload checks,
+    # read in one tshark pass
+    DISPLAY_FILTER = "(tcp.flags.syn==1 and tcp.flags.ack==0) or tcp.len > 0"
+    FIELDS = [
+        "ip.src",
+        "ip.dst",
+        "tcp.dstport",
+        "tcp.flags.syn",
+        "tcp.flags.ack",
+        "tcp.payload",
+    ]
+    OCCURRENCE = "f"
+    NEEDS_CONTEXT = False
+
+    SQLI_PATTERNS = [
+        r"union\s+select",
+        r"'\s+or\s+'1'='1",
+        r'"\s+or\s+"1"="1',
+        r"information_schema",
+        r"waitfor\s+delay",
+    ]
+    XSS_PATTERNS = [
+        r"<script>",
+        r"javascript:",
+        r"onerror=",
+        r"onload=",
+        r"alert\(",
+    ]
+
+    def __init__(self):
+        self.syn_tracker: dict[str, set[str]] = {}
+        self.alerts: list[SecurityAlert] = []
+        self._seen: set[tuple[str, str, str]] = set()
+
+    def _alert(self, alert: SecurityAlert) -> None:
+        # Deduplicate alerts
+        key = (alert.alert_type, alert.source_ip, alert.description)
+        if key not in self._seen:
+            self._seen.add(key)
+            self.alerts.append(alert)
 
-        fields = [
-            "frame.number",
-            "tcp.stream",
-            "http.request.method",
-            "http.host",
-            "http.request.uri",
-            "http.response.code",
-            "http.user_agent",
-            "http.content_type",
+    def update(self, row: dict[str, str]) -> None:
+        # 1. Port Scan Detection (SYN packets)
+        if row.get("tcp.flags.syn") in ("1", "True") and row.get(
+            "tcp.flags.ack"
+        ) not in ("1", "True"):
+            src = row.get("ip.src")
+            port = row.get("tcp.dstport")
+            if src and port:
+                self.syn_tracker.setdefault(src, set()).add(port)
+
+        # 2. Payload Analysis (SQLi, XSS, Auth)
+        payload_hex = row.get("tcp.payload")
+        if not payload_hex:
+            return
+
+        try:
+            # Tshark returns AA:BB:CC, need to strip colons
+            payload = bytes.fromhex(payload_hex.replace(":", "")).decode(
+                "utf-8", errors="ignore"
+            )
+        except Exception:
+            return
+
+        src_ip = row.get("ip.src", "Unknown")
+        dst_ip = row.get("ip.dst", "Unknown")
+        lower_payload = payload.lower()
+
+        # Plaintext Auth
+        if "Authorization: Basic" in payload:
+            self._alert(
+                SecurityAlert(
+                    severity="High",
+                    alert_type="Plaintext Credentials",
+                    description="Basic Authentication header found",
+                    source_ip=src_ip,
+                    target_ip=dst_ip,
+                    payload_preview=payload[:MAX_PAYLOAD_PREVIEW_LENGTH],
+                )
+            )
+
+        # SQL Injection
+        for pattern in self.SQLI_PATTERNS:
+            if re.search(pattern, lower_payload):
+                self._alert(
+                    SecurityAlert(
+                        severity="High",
+                        alert_type="SQL Injection",
+                        description=f"SQL Injection pattern detected: {pattern}",
+                        source_ip=src_ip,
+                        target_ip=dst_ip,
+                        payload_preview=payload[:MAX_PAYLOAD_PREVIEW_LENGTH],
+                    )
+                )
+                break
+
+        # XSS
+        for pattern in self.XSS_PATTERNS:
+            if re.search(pattern, lower_payload):
+                self._alert(
+                    SecurityAlert(
+                        severity="Medium",
+                        alert_type="XSS",
+                        description=f"Cross-Site Scripting pattern detected: {pattern}",
+                        source_ip=src_ip,
+                        target_ip=dst_ip,
+                        payload_preview=payload[:MAX_PAYLOAD_PREVIEW_LENGTH],
+                    )
+                )
+                break
+
+    def merge(self, other: SecurityAggregator) -> None:
+        for src, ports in other.syn_tracker.items():
+            self.syn_tracker.setdefault(src, set()).update(ports)
+        for alert in other.alerts:
+            self._alert(alert)
+
+    def to_state(self) -> dict[str, Any]:
+        """JSON-safe state for tail checkpoints"""
+        return {
+            "syn_tracker": {
+                src: list(ports) for src, ports in self.syn_tracker.items()
+            },
+            "alerts": [asdict(a) for a in self.alerts],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> SecurityAggregator:
+        aggregator = cls()
+        aggregator.syn_tracker = {
+            src: set(ports) for src, ports in state["syn_tracker"].items()
+        }
+        for alert in state["alerts"]:
+            aggregator._alert(SecurityAlert(**alert))
+        return aggregator
+
+    def result(self) -> dict[str, Any]:
+        scan_alerts = [
+            SecurityAlert(
+                severity="Medium",
+                alert_type="Port Scan",
+                description=f"Potential port scan detected ({len(ports)} distinct ports)",
+                source_ip=src_ip,
+                target_ip="Multiple",
+                payload_preview=f"Ports: {list(ports)[:10]}...",
+            )
+            for src_ip, ports in self.syn_tracker.items()
+            if len(ports) > PORT_SCAN_THRESHOLD
         ]
+        alerts = scan_alerts + self.alerts
+
+        return {
+            "security_alerts": [asdict(a) for a in alerts],
+            "total_alerts": len(alerts),
+        }
+
+
+class TcpSessionAggregator:
+    """Per-stream packet/byte counts, timing and payload preview"""
+
+    DISPLAY_FILTER = "tcp"
+    FIELDS = [
+        "tcp.stream",
+        "ip.src",
+        "ip.dst",
+        "tcp.srcport",
+        "tcp.dstport",
+        "frame.len",
+        "frame.time_relative",
+        "tcp.payload",
+        "_ws.col.protocol",
+        "_ws.col.info",
+    ]
+    OCCURRENCE = "f"
+    NEEDS_CONTEXT = False
+
+    def __init__(self):
+        self.sessions: dict[str, dict[str, Any]] = {}
+
+    def update(self, row: dict[str, str]) -> None:
+        stream_id = row.get("tcp.stream")
+        if not stream_id:
+            return
+
+        s = self.sessions.get(stream_id)
+        if s is None:
+            s = self.sessions[stream_id] = {
+                "src": "",
+                "dst": "",
+                "sport": "",
+                "dport": "",
+                "packet_count": 0,
+                "bytes": 0,
+                "start_time": None,
+                "end_time": None,
+                "payload_hex": "",
+                "protocols": Counter(),
+                "summary": "",
+            }
+        # Capture first IP tuple seen in stream
+        if not s["src"]:
+            s["src"] = row.get("ip.src", "?")
+            s["dst"] = row.get("ip.dst", "?")
+            s["sport"] = row.get("tcp.srcport", "0")
+            s["dport"] = row.get("tcp.dstport", "0")
 
-        display_filter = self._build_filter("http", search_query)
+        s["packet_count"] += 1
+        s["bytes"] += int(row.get("frame.len") or 0)
 
         try:
-            packets = tshark.run_json(
-                str(self.filepath), display_filter=display_filter, fields=fields
+            ts = float(row.get("frame.time_relative", 0))
+            if s["start_time"] is None or ts < s["start_time"]:
+                s["start_time"] = ts
+            if s["end_time"] is None or ts > s["end_time"]:
+                s["end_time"] = ts
+        except ValueError:
+            pass
+
+        payload = row.get("tcp.payload")
+        # Limit payload accumulation to 2KB per session for preview
+        if payload and len(s["payload_hex"]) < MAX_PAYLOAD_HEX_LENGTH:
+            s["payload_hex"] += payload.replace(":", "")
+
+        proto = row.get("_ws.col.protocol")
+        if proto:
+            s["protocols"][proto] += 1
+
+        info = row.get("_ws.col.info")
+        if info and not s["summary"]:
+            s["summary"] = info
+
+    def to_state(self) -> dict[str, Any]:
+        """JSON-safe state for tail checkpoints"""
+        return {"sessions": self.sessions}
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> TcpSessionAggregator:
+        aggregator = cls()
+        for stream_id, data in state["sessions"].items():
+            aggregator.sessions[stream_id] = {
+                **data,
+                "protocols": Counter(data["protocols"]),
+            }
+        return aggregator
+
+    def result(self) -> dict[str, Any]:
+        results = []
+        for sid, data in self.sessions.items():
+            payload_ascii = ""
+            payload_hex_view = ""
+            try:
+                payload_bytes = bytes.fromhex(data["payload_hex"])
+                # ASCII decode
+                payload_ascii = payload_bytes.decode("utf-8", errors="replace")
+                payload_ascii = "".join(
+                    c if c.isprintable() or c in "\n\r\t" else "."
+                    for c in payload_ascii
+                )
+                # Hex View (first 100 bytes)
+                payload_hex_view = " ".join(
+                    f"{b:02x}" for b in payload_bytes[:MAX_PAYLOAD_HEX_PREVIEW_BYTES]
+                )
+            except Exception:
+                pass
+
+            top_proto = (
+                data["protocols"].most_common(1)[0][0] if data["protocols"] else "TCP"
             )
-        except Exception as e:
-            return {"error": str(e)}
 
-        requests = []
-        host_counter: Counter[str] = Counter()
-        total_requests = 0
-        total_responses = 0
+            results.append(
+                TcpSession(
+                    session_id=sid,
+                    src_ip=data["src"],
+                    src_port=int(data["sport"] or 0),
+                    dst_ip=data["dst"],
+                    dst_port=int(data["dport"] or 0),
+                    packet_count=data["packet_count"],
+                    byte_count=data["bytes"],
+                    duration=round(
+                        (data["end_time"] or 0) - (data["start_time"] or 0), 3
+                    ),
+                    start_time=data["start_time"] or 0,
+                    payload_ascii=payload_ascii[:MAX_PAYLOAD_ASCII_LENGTH],
+                    payload_hex=payload_hex_view,
+                    protocol=top_proto,
+                    summary=data["summary"],
+                )
+            )
 
-        for pkt in packets:
-            # pyright: ignore
-            layers = pkt.get("_source", {}).get("layers", {})
-            if not layers:
-                continue
+        results.sort(key=lambda x: x.packet_count, reverse=True)
 
-            method = layers.get("http.request.method", [None])[0]
-            host = layers.get("http.host", [None])[0]
-            uri = layers.get("http.request.uri", [None])[0]
-            code = layers.get("http.response.code", [None])[0]
-            ua = layers.get("http.user_agent", [None])[0]
-            ctype = layers.get("http.content_type", [None])[0]
-            frame = layers.get("frame.number", ["0"])[0]
-            stream = layers.get("tcp.stream", ["0"])[0]
-
-            if method:
-                total_requests += 1
-                requests.append(
+        return {
+            "tcp_sessions": [asdict(s) for s in results[:MAX_TCP_SESSIONS_OUTPUT]],
+            "total_sessions": len(results),
+        }
+
+
+class TcpAnomalyAggregator:
+    """Per-stream anomaly counters with a bounded sample of events"""
+
+    DISPLAY_FILTER = TCP_ANOMALY_FILTER
+    FIELDS = [
+        "frame.number",
+        "frame.time_relative",
+        "frame.len",
+        "ip.src",
+        "ip.dst",
+        "tcp.srcport",
+        "tcp.dstport",
+        "tcp.stream",
+        "tcp.seq",
+        "tcp.ack",
+        "tcp.window_size_value",
+        "tcp.flags",
+        "tcp.flags.str",
+        "tcp.flags.reset",
+        *TCP_ANOMALY_FLAGS,
+    ]
+    # tshark's sequence analysis needs the preceding packets of each stream
+    NEEDS_CONTEXT = True
+
+    def __init__(self):
+        self.streams: dict[str, dict[str, Any]] = {}
+        self.total_anomalies: Counter[str] = Counter()
+
+    @staticmethod
+    def _new_stream() -> dict[str, Any]:
+        return {
+            "src_ip": "",
+            "dst_ip": "",
+            "src_port": "",
+            "dst_port": "",
+            "anomaly_counts": Counter(),
+            "events_count": 0,
+            "events": [],
+        }
+
+    def update(self, row: dict[str, str]) -> dict[str, Any] | None:
+        """Count the anomalies of one packet, returning its event if any"""
+        stream_id = row.get("tcp.stream")
+        if not stream_id:
+            return None
+
+        # Flag fields are empty when absent
+        anomalies = [
+            label for flag, label in TCP_ANOMALY_FLAGS.items() if row.get(flag)
+        ]
+        if row.get("tcp.flags.reset") in ("1", "True"):
+            anomalies.append("Reset")
+
+        if not anomalies:
+            return None
+
+        s = self.streams.get(stream_id)
+        if s is None:
+            s = self.streams[stream_id] = self._new_stream()
+            # Basic info (taking from first packet is fine for static flow)
+            s["src_ip"] = row.get("ip.src") or "?"
+            s["dst_ip"] = row.get("ip.dst") or "?"
+            s["src_port"] = row.get("tcp.srcport") or "?"
+            s["dst_port"] = row.get("tcp.dstport") or "?"
+
+        for label in anomalies:
+            self.total_anomalies[label] += 1
+            s["anomaly_counts"][label] += 1
+
+        event = {
+            "frame": row.get("frame.number") or "?",
+            "time": row.get("frame.time_relative") or "0",
+            "len": row.get("frame.len") or "0",
+            "types": anomalies,
+            "src": row.get("ip.src") or "?",
+            "dst": row.get("ip.dst") or "?",
+            "tcp": {
+                "seq": row.get("tcp.seq") or "0",
+                "ack": row.get("tcp.ack") or "0",
+                "win": row.get("tcp.window_size_value") or "0",
+                "flags_str": row.get("tcp.flags.str") or "",
+                "flags_hex": row.get("tcp.flags") or "0x00",
+            },
+        }
+
+        s["events_count"] += 1
+        if len(s["events"]) < MAX_EVENTS_PER_SESSION:
+            s["events"].append(event)
+        return event
+
+    def merge(self, other: TcpAnomalyAggregator) -> None:
+        self.total_anomalies.update(other.total_anomalies)
+        for stream_id, theirs in other.streams.items():
+            s = self.streams.get(stream_id)
+            if s is None:
+                s = self.streams[stream_id] = self._new_stream()
+                for key in ("src_ip", "dst_ip", "src_port", "dst_port"):
+                    s[key] = theirs[key]
+            s["anomaly_counts"].update(theirs["anomaly_counts"])
+            s["events_count"] += theirs["events_count"]
+            room = MAX_EVENTS_PER_SESSION - len(s["events"])
+            if room > 0:
+                s["events"].extend(theirs["events"][:room])
+
+    def to_state(self) -> dict[str, Any]:
+        """JSON-safe state for tail checkpoints"""
+        return {
+            "streams": self.streams,
+            "total_anomalies": dict(self.total_anomalies),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> TcpAnomalyAggregator:
+        aggregator = cls()
+        aggregator.total_anomalies = Counter(state["total_anomalies"])
+        for stream_id, data in state["streams"].items():
+            aggregator.streams[stream_id] = {
+                **data,
+                "anomaly_counts": Counter(data["anomaly_counts"]),
+            }
+        return aggregator
+
+    def result(self) -> dict[str, Any]:
+        # Format result
+        session_list = [
+            {
+                "stream_id": sid,
+                "src": f"{data['src_ip']}:{data['src_port']}",
+                "dst": f"{data['dst_ip']}:{data['dst_port']}",
+                "anomaly_summary": dict(data["anomaly_counts"]),
+                "events_count": data["events_count"],
+                "events": data["events"],
+            }
+            for sid, data in self.streams.items()
+            if data["events_count"] > 0
+        ]
+
+        # Sort by total anomaly count desc
+        session_list.sort(
+            key=lambda x: sum(x["anomaly_summary"].values()), reverse=True
+        )
+
+        return {
+            "total_anomalies": dict(self.total_anomalies),
+            "anomalous_sessions": session_list,
+        }
+
+
+class HttpAggregator:
+    """Requests/responses, top hosts and request latency per host and status"""
+
+    DISPLAY_FILTER = "http"
+    FIELDS = [
+        "frame.number",
+        "frame.time_relative",
+        "tcp.stream",
+        "http.request.method",
+        "http.host",
+        "http.request.uri",
+        "http.response.code",
+        "http.user_agent",
+        "http.content_type",
+    ]
+    OCCURRENCE = "f"
+    NEEDS_CONTEXT = False
+
+    def __init__(self):
+        from .stats import DistinctCounter, LatencyHistogram, TopCounter
+
+        self.requests: list[dict[str, Any]] = []
+        self.host_counter = TopCounter(MAX_TRACKED_HOSTS)
+        self.unique_hosts = DistinctCounter()
+        self.total_requests = 0
+        self.total_responses = 0
+
+        # Requests waiting for their response, FIFO per tcp.stream (HTTP/1.x
+        # pipelining). Streams are kept in the order they started waiting, so
+        # the oldest outstanding requests sit at the front and can be evicted
+        # cheaply; further requests on a waiting stream don't move it.
+        self.pending: OrderedDict[str, deque[tuple[float, str]]] = OrderedDict()
+        self.pending_count = 0
+        self.evicted_requests = 0
+        self.unmatched_responses = 0
+
+        self.overall_latency = LatencyHistogram()
+        self.host_latency: dict[str, LatencyHistogram] = {}
+        self.status_latency: dict[str, LatencyHistogram] = {}
+
+    def update(self, row: dict[str, str]) -> None:
+        from .stats import LatencyHistogram
+
+        method = row.get("http.request.method")
+        code = row.get("http.response.code")
+        host = row.get("http.host") or ""
+        frame = row.get("frame.number") or "0"
+        stream = row.get("tcp.stream") or "0"
+        try:
+            ts = float(row.get("frame.time_relative") or 0)
+        except ValueError:
+            ts = 0.0
+
+        pending = self.pending
+        if method:
+            self.total_requests += 1
+            if len(self.requests) < MAX_REQUESTS_OUTPUT:
+                self.requests.append(
                     {
                         "frame": frame,
                         "stream": stream,
                         "method": method,
-                        "host": host or "",
-                        "path": uri or "",
-                        "ua": ua or "",
+                        "host": host,
+                        "path": row.get("http.request.uri") or "",
+                        "ua": row.get("http.user_agent") or "",
                         "type": "request",
                     }
                 )
-                if host:
-                    host_counter[host] += 1
+            if host:
+                self.host_counter.add(host)
+                self.unique_hosts.add(host)
+
+            queue = pending.get(stream)
+            if queue is None:
+                queue = pending[stream] = deque()
+            queue.append((ts, host))
+            self.pending_count += 1
+
+            # Evict from the stalest stream while over budget or expired
+            while pending:
+                oldest_stream, oldest_queue = next(iter(pending.items()))
+                if (
+                    self.pending_count <= MAX_PENDING_HTTP_REQUESTS
+                    and ts - oldest_queue[0][0] <= HTTP_PENDING_TIMEOUT
+                ):
+                    break
+                oldest_queue.popleft()
+                self.pending_count -= 1
+                self.evicted_requests += 1
+                if not oldest_queue:
+                    del pending[oldest_stream]
+
+        if code:
+            self.total_responses += 1
+            latency_ms = None
+
+            queue = pending.get(stream)
+            if queue:
+                req_ts, req_host = queue.popleft()
+                self.pending_count -= 1
+                if not queue:
+                    del pending[stream]
+
+                latency = max(ts - req_ts, 0.0)
+                latency_ms = round(latency * 1000, 3)
+                self.overall_latency.record(latency)
+
+                # Hosts beyond the tracking budget share one bucket
+                host_key = req_host or "(no host)"
+                if (
+                    host_key not in self.host_latency
+                    and len(self.host_latency) >= MAX_TRACKED_HOSTS
+                ):
+                    host_key = "(other)"
+                if host_key not in self.host_latency:
+                    self.host_latency[host_key] = LatencyHistogram()
+                self.host_latency[host_key].record(latency)
+
+                if code not in self.status_latency:
+                    self.status_latency[code] = LatencyHistogram()
+                self.status_latency[code].record(latency)
+            else:
+                self.unmatched_responses += 1
 
-            if code:
-                total_responses += 1
-                requests.append(
+            if len(self.requests) < MAX_REQUESTS_OUTPUT:
+                self.requests.append(
                     {
                         "frame": frame,
                         "stream": stream,
                         "status": code,
-                        "ctype": ctype or "",
+                        "ctype": row.get("http.content_type") or "",
+                        "latency_ms": latency_ms,
                         "type": "response",
                     }
                 )
 
+    def result(self) -> dict[str, Any]:
+        by_host = sorted(
+            self.host_latency.items(), key=lambda kv: kv[1].count, reverse=True
+        )[:MAX_TOP_ITEMS]
+
         return {
-            "total_requests": total_requests,
-            "total_responses": total_responses,
-            "unique_hosts": len(host_counter),
-            "requests": requests[:MAX_REQUESTS_OUTPUT],
+            "total_requests": self.total_requests,
+            "total_responses": self.total_responses,
+            "unique_hosts": self.unique_hosts.estimate(),
+            "requests": self.requests,
             "top_hosts": [
                 {"host": h, "count": c}
-                for h, c in host_counter.most_common(MAX_TOP_ITEMS)
+                for h, c in self.host_counter.most_common(MAX_TOP_ITEMS)
             ],
+            "latency": {
+                "overall": self.overall_latency.to_dict(),
+                "by_host": [{"host": h, **hist.to_dict()} for h, hist in by_host],
+                "by_status": {
+                    code: hist.to_dict()
+                    for code, hist in sorted(self.status_latency.items())
+                },
+            },
+            "unanswered_requests": self.pending_count + self.evicted_requests,
+            "unmatched_responses": self.unmatched_responses,
         }
 
-    def analyze_dns(self, search_query: str | None = None) -> dict[str, Any]:
-        from .tshark import tshark
 
-        if not tshark.is_available():
-            return {}
+class DnsAggregator:
+    """Sampled queries, top domains, rcodes and query latency per type"""
+
+    DISPLAY_FILTER = "dns"
+    FIELDS = [
+        "frame.number",
+        "frame.time_relative",
+        "ip.src",
+        "ip.dst",
+        "ipv6.src",
+        "ipv6.dst",
+        "dns.id",
+        "dns.qry.name",
+        "dns.qry.type",
+        "dns.flags.response",
+        "dns.flags.rcode",
+        "dns.a",
+        "dns.aaaa",
+        "dns.cname",
+    ]
+    # Every answer record; single-valued fields take their first occurrence
+    OCCURRENCE = "a"
+    NEEDS_CONTEXT = False
+
+    def __init__(self):
+        from .stats import (
+            DistinctCounter,
+            LatencyHistogram,
+            ReservoirSample,
+            TopCounter,
+        )
 
-        fields = [
-            "frame.number",
-            "dns.id",
-            "dns.qry.name",
-            "dns.qry.type",
-            "dns.flags.response",
-            "dns.flags.rcode",
-            "dns.a",
-            "dns.aaaa",
-            "dns.cname",
+        self.sample = ReservoirSample(MAX_QUERIES_OUTPUT)
+        self.domain_counter = TopCounter(MAX_TRACKED_DOMAINS)
+        self.unique_domains = DistinctCounter()
+        self.rcode_counter: Counter[str] = Counter()
+        self.qtype_counter: Counter[str] = Counter()
+        self.total_queries = 0
+        self.total_responses = 0
+
+        # Outstanding queries keyed by (dns.id, client, server), oldest first
+        self.pending: OrderedDict[tuple[str, str, str], tuple[float, str]] = (
+            OrderedDict()
+        )
+        self.expired_queries = 0
+        self.retransmitted_queries = 0
+        self.unmatched_responses = 0
+        self.overall_latency = LatencyHistogram()
+        self.qtype_latency: dict[str, LatencyHistogram] = {}
+
+    def update(self, row: dict[str, str]) -> None:
+        from .stats import LatencyHistogram
+
+        first = partial(_first_occurrence, row)
+        is_response = first("dns.flags.response") in ("1", "True")
+        qname = first("dns.qry.name") or None
+        qtype_val = first("dns.qry.type", "0")
+        qtype = DNS_QTYPE_NAMES.get(qtype_val, qtype_val)
+        tx_id = first("dns.id", "0")
+        frame = first("frame.number", "0")
+        src = first("ip.src") or first("ipv6.src")
+        dst = first("ip.dst") or first("ipv6.dst")
+        try:
+            ts = float(first("frame.time_relative", "0"))
+        except ValueError:
+            ts = 0.0
+
+        pending = self.pending
+        if not is_response and qname:
+            self.total_queries += 1
+            self.domain_counter.add(qname)
+            self.unique_domains.add(qname)
+            self.qtype_counter[qtype] += 1
+            self.sample.add(
+                {
+                    "frame": frame,
+                    "id": tx_id,
+                    "domain": qname,
+                    "type": qtype,
+                    "answers": [],
+                    "is_response": False,
+                }
+            )
+
+            key = (tx_id, src, dst)
+            if key in pending:
+                # Client retry: keep the original send time and place
+                self.retransmitted_queries += 1
+            else:
+                pending[key] = (ts, qtype)
+
+            while pending:
+                oldest_ts = next(iter(pending.values()))[0]
+                if (
+                    len(pending) <= MAX_PENDING_DNS_QUERIES
+                    and ts - oldest_ts <= DNS_QUERY_TIMEOUT
+                ):
+                    break
+                pending.popitem(last=False)
+                self.expired_queries += 1
+
+        elif is_response:
+            self.total_responses += 1
+            rcode = first("dns.flags.rcode", "0")
+            self.rcode_counter[DNS_RCODE_NAMES.get(rcode, rcode)] += 1
+
+            latency_ms = None
+            query = pending.pop((tx_id, dst, src), None)
+            if query:
+                query_ts, query_type = query
+                latency = max(ts - query_ts, 0.0)
+                latency_ms = round(latency * 1000, 3)
+                self.overall_latency.record(latency)
+                if query_type not in self.qtype_latency:
+                    self.qtype_latency[query_type] = LatencyHistogram()
+                self.qtype_latency[query_type].record(latency)
+            else:
+                self.unmatched_responses += 1
+
+            # Collect answers
+            answers = []
+            for answer_field in ("dns.a", "dns.aaaa", "dns.cname"):
+                if row.get(answer_field):
+                    answers.extend(row[answer_field].split(","))
+
+            if qname:
+                self.sample.add(
+                    {
+                        "frame": frame,
+                        "id": tx_id,
+                        "domain": qname,
+                        "type": qtype,
+                        "answers": answers,
+                        "rcode": rcode,
+                        "latency_ms": latency_ms,
+                        "is_response": True,
+                    }
+                )
+
+    def result(self) -> dict[str, Any]:
+        sample = self.sample
+        queries = sorted(sample.items, key=lambda q: int(q["frame"] or 0))
+
+        return {
+            "total_queries": self.total_queries,
+            "total_responses": self.total_responses,
+            "unique_domains": self.unique_domains.estimate(),
+            "queries": queries,
+            "sampled": sample.seen > len(sample.items),
+            "sampled_from": sample.seen,
+            "top_domains": [
+                {"domain": d, "count": c}
+                for d, c in self.domain_counter.most_common(MAX_TOP_ITEMS)
+            ],
+            "rcodes": dict(self.rcode_counter.most_common()),
+            "query_types": dict(self.qtype_counter.most_common()),
+            "latency": {
+                "overall": self.overall_latency.to_dict(),
+                "by_type": {
+                    t: hist.to_dict()
+                    for t, hist in sorted(
+                        self.qtype_latency.items(), key=lambda kv: -kv[1].count
+                    )
+                },
+            },
+            "unanswered_queries": len(self.pending) + self.expired_queries,
+            "retransmitted_queries": self.retransmitted_queries,
+            "unmatched_responses": self.unmatched_responses,
+        }
+
+
+# Analyses that support incremental (tail mode) refreshes
+TAIL_AGGREGATORS: dict[str, type] = {
+    "pcap_summary": SummaryAggregator,
+    "tcp_sessions": TcpSessionAggregator,
+    "security_scan": SecurityAggregator,
+    "tcp_anomalies": TcpAnomalyAggregator,
+}
+
+# Analyses PcapAnalyzer.arun() runs on the event loop, with their progress message
+ASYNC_ANALYSES: dict[str, tuple[type, str]] = {
+    "pcap_summary": (SummaryAggregator, "Analyzing summary..."),
+    "http_analysis": (HttpAggregator, "Analyzing HTTP..."),
+    "dns_analysis": (DnsAggregator, "Analyzing DNS..."),
+    "security_scan": (SecurityAggregator, "Scanning for threats..."),
+    "tcp_sessions": (TcpSessionAggregator, "Analyzing TCP sessions..."),
+}
+
+
+class PcapAnalyzer:
+    def __init__(
+        self,
+        filepath: str | Path,
+        progress: Callable[[dict[str, Any]], None] | None = None,
+    ):
+        self.filepath = Path(filepath)
+        # Called with progress data at most every PROGRESS_INTERVAL seconds,
+        # including bytes read and ETA
+        self.progress = progress
+        self._progress_count = 0
+        self._progress_message = ""
+        self._bytes_read = 0
+        self._started = time.monotonic()
+        self._last_progress = 0.0
+
+    def _report_progress(self, count: int, message: str = "") -> None:
+        import sys
+
+        # Report every 1000 packets to avoid I/O overhead
+        if count % 1000 == 0:
+            self._progress_count = count
+            self._progress_message = message
+            data = self._progress_data()
+            print(f"PROGRESS:{json.dumps(data)}", file=sys.stderr, flush=True)
+            self._notify_progress(data)
+
+    def _on_read(self, position: int) -> None:
+        # Capture bytes tshark has consumed, see tshark.stream_fields
+        self._bytes_read = position
+        self._notify_progress(self._progress_data())
+
+    def _read_callback(self) -> Callable[[int], None] | None:
+        return self._on_read if self.progress else None
+
+    def _progress_data(self) -> dict[str, Any]:
+        data: dict[str, Any] = {
+            "type": "progress",
+            "count": self._progress_count,
+            "message": self._progress_message,
+        }
+        if self._bytes_read:
+            try:
+                total = self.filepath.stat().st_size
+            except OSError:
+                return data
+            data["bytes"] = self._bytes_read
+            data["total_bytes"] = total
+            if self._bytes_read < total:
+                elapsed = time.monotonic() - self._started
+                remaining = total - self._bytes_read
+                data["eta_seconds"] = round(elapsed * remaining / self._bytes_read, 1)
+        return data
+
+    def _notify_progress(self, data: dict[str, Any]) -> None:
+        if self.progress is None:
+            return
+        now = time.monotonic()
+        if now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        try:
+            self.progress(data)
+        except Exception as e:
+            import sys
+
+            print(f"Progress callback failed: {e}", file=sys.stderr)
+
+    def generate_html_report(self, analysis_type: str, data: dict[str, Any]) -> str:
+        import io
+
+        out = io.StringIO()
+        self.write_html_report(out, analysis_type, data)
+        return out.getvalue()
+
+    def write_html_report(
+        self, out: TextIO, analysis_type: str, data: dict[str, Any]
+    ) -> None:
+        """Render the HTML report section by section into `out`"""
+        from .html_report import write_html_report
+
+        write_html_report(out, self.filepath.name, analysis_type, data)
+
+    def _report_dir(self, output_dir: str | None = None) -> Path:
+        if output_dir:
+            return Path(output_dir)
+        return Path(self.filepath).parent / "analysis_reports"
+
+    def _save_report(
+        self, data: dict, report_type: str, output_dir: str | None = None
+    ) -> None:
+        from .report_writer import report_writer
+
+        try:
+            save_dir = self._report_dir(output_dir)
+            save_dir.mkdir(parents=True, exist_ok=True)
+            name = f"{report_type}_{Path(self.filepath).name}"
+            report_path = report_writer.json_path(save_dir / f"{name}.json")
+            html_path = save_dir / f"{name}.html"
+
+            if "scan_time" not in data:
+                data["scan_time"] = str(time.time())
+
+            # Both files are written in the background, the paths are
+            # returned right away
+            report_writer.write_json(report_path, data)
+            report_writer.write_stream(
+                html_path,
+                partial(
+                    self.write_html_report, analysis_type=report_type, data=dict(data)
+                ),
+            )
+
+            data["saved_path"] = str(report_path)
+            data["saved_html_path"] = str(html_path)
+        except Exception as e:
+            data["save_error"] = str(e)
+            import sys
+
+            print(f"Error saving {report_type} report: {e}", file=sys.stderr)
+
+    def _build_filter(
+        self, base_filter: str | None, search_query: str | None
+    ) -> str | None:
+        if not search_query:
+            return base_filter
+        if not base_filter:
+            return search_query
+        return f"({base_filter}) and ({search_query})"
+
+    def _scoped_query(self, options: dict) -> str | None:
+        """
+        The search query narrowed by the scope options as one display filter:
+        display_filter, start_time/end_time (seconds from the capture start)
+        and host (an IPv4/IPv6 address or network).
+        """
+        clauses = [
+            options[key]
+            for key in ("search_query", "display_filter")
+            if options.get(key)
         ]
+        if options.get("start_time") is not None:
+            clauses.append(f"frame.time_relative >= {float(options['start_time'])}")
+        if options.get("end_time") is not None:
+            clauses.append(f"frame.time_relative <= {float(options['end_time'])}")
+        if options.get("host"):
+            network = ipaddress.ip_network(str(options["host"]).strip(), strict=False)
+            field_name = "ipv6.addr" if network.version == 6 else "ip.addr"
+            clauses.append(f"{field_name} == {network.compressed}")
+
+        if len(clauses) <= 1:
+            return clauses[0] if clauses else None
+        return " and ".join(f"({c})" for c in clauses)
+
+    def _stream_rows(
+        self,
+        base_filter: str | None,
+        fields: list[str],
+        search_query: str | None = None,
+        occurrence: str = "f",
+    ) -> Iterator[dict[str, str]]:
+        """
+        Stream rows matching base_filter, narrowed by search_query.
+
+        Unsearched runs cache their rows as columns (up to MAX_CACHED_ROWS)
+        so later searches over the same analysis are evaluated in-process by
+        the query engine. Searches without a cached table, and queries the
+        engine can't handle, run tshark with the combined display filter.
+        """
+        from .tshark import tshark
+        from .query_engine import (
+            SEARCH_FIELDS,
+            ColumnTable,
+            UnsupportedFilter,
+            compile_filter,
+        )
+
+        columns = list(dict.fromkeys(fields + SEARCH_FIELDS))
+
+        def run_filtered() -> Iterator[dict[str, str]]:
+            return tshark.stream_fields(
+                str(self.filepath),
+                fields,
+                display_filter=self._build_filter(base_filter, search_query),
+                occurrence=occurrence,
+                on_read=self._read_callback(),
+            )
+
+        compiled = None
+        if search_query:
+            try:
+                compiled = compile_filter(search_query, columns)
+            except UnsupportedFilter:
+                yield from run_filtered()
+                return
+
+        cache_path = self._column_cache_path(base_filter, columns, occurrence)
+        table = self._load_columns(cache_path) if cache_path else None
+        if table is not None:
+            indices = compiled.evaluate(table) if compiled else None
+            yield from table.rows(indices)
+            return
+
+        if compiled is not None:
+            # No table to search, e.g. the capture is too large to cache
+            yield from run_filtered()
+            return
+
+        table = ColumnTable(columns) if cache_path else None
+        for row in tshark.stream_fields(
+            str(self.filepath),
+            columns,
+            display_filter=base_filter,
+            occurrence=occurrence,
+            on_read=self._read_callback(),
+        ):
+            if table is not None:
+                table.append(row)
+                if table.length > MAX_CACHED_ROWS:
+                    table = None
+            yield row
+
+        if table is not None and cache_path is not None:
+            self._save_columns(table, cache_path)
+
+    async def _astream_rows(
+        self,
+        base_filter: str | None,
+        fields: list[str],
+        search_query: str | None = None,
+        occurrence: str = "f",
+        executor: Executor | None = None,
+    ) -> AsyncIterator[list[dict[str, str]]]:
+        """
+        _stream_rows for coroutines, yielding batches of rows from
+        tshark.astream_fields; the column cache is read and written on
+        `executor`.
+        """
+        import asyncio
+        from contextlib import aclosing
+        from .tshark import ASYNC_BATCH_ROWS, tshark
+        from .query_engine import (
+            SEARCH_FIELDS,
+            ColumnTable,
+            UnsupportedFilter,
+            compile_filter,
+        )
+
+        loop = asyncio.get_running_loop()
+        columns = list(dict.fromkeys(fields + SEARCH_FIELDS))
 
-        display_filter = self._build_filter("dns", search_query)
+        compiled = None
+        if search_query:
+            try:
+                compiled = compile_filter(search_query, columns)
+            except UnsupportedFilter:
+                pass
+
+        cache_path = None
+        if compiled is not None or not search_query:
+            cache_path = await loop.run_in_executor(
+                executor, self._column_cache_path, base_filter, columns, occurrence
+            )
+        table = None
+        if cache_path:
+            table = await loop.run_in_executor(executor, self._load_columns, cache_path)
+        if table is not None:
+            batch = []
+            for row in table.rows(compiled.evaluate(table) if compiled else None):
+                batch.append(row)
+                if len(batch) >= ASYNC_BATCH_ROWS:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            return
+
+        if search_query:
+            # Not searchable in columns or no table to search
+            async with aclosing(
+                tshark.astream_fields(
+                    str(self.filepath),
+                    fields,
+                    display_filter=self._build_filter(base_filter, search_query),
+                    occurrence=occurrence,
+                    on_read=self._read_callback(),
+                )
+            ) as batches:
+                async for batch in batches:
+                    yield batch
+            return
+
+        table = ColumnTable(columns) if cache_path else None
+        async with aclosing(
+            tshark.astream_fields(
+                str(self.filepath),
+                columns,
+                display_filter=base_filter,
+                occurrence=occurrence,
+                on_read=self._read_callback(),
+            )
+        ) as batches:
+            async for batch in batches:
+                if table is not None:
+                    for row in batch:
+                        table.append(row)
+                    if table.length > MAX_CACHED_ROWS:
+                        table = None
+                yield batch
+
+        if table is not None and cache_path is not None:
+            await loop.run_in_executor(executor, self._save_columns, table, cache_path)
+
+    def _column_cache_path(
+        self, base_filter: str | None, columns: list[str], occurrence: str
+    ) -> Path | None:
+        from .cache import cache_dir, fingerprint
 
         try:
-            packets = tshark.run_json(
-                str(self.filepath), display_filter=display_filter, fields=fields
+            key = json.dumps(
+                [fingerprint(self.filepath), base_filter, columns, occurrence]
+            )
+            return (
+                cache_dir("columns") / f"{hashlib.sha1(key.encode()).hexdigest()}.cols"
             )
+        except OSError:
+            return None
+
+    def _load_columns(self, cache_path: Path) -> Any:
+        from .query_engine import ColumnTable
+
+        if not cache_path.exists():
+            return None
+        try:
+            table = ColumnTable.load(cache_path)
+            cache_path.touch()
+        except Exception:
+            return None
+        return table
+
+    def _save_columns(self, table: Any, cache_path: Path) -> None:
+        from .cache import prune
+
+        try:
+            table.save(cache_path)
+            prune(cache_path.parent, MAX_COLUMN_CACHES, "*.cols")
+        except OSError:
+            pass
+
+    def _aggregator_rows(
+        self, aggregator: Any, search_query: str | None
+    ) -> Iterator[dict[str, str]]:
+        # Unscoped runs cache their rows as columns for later searches too
+        return self._stream_rows(
+            aggregator.DISPLAY_FILTER,
+            aggregator.FIELDS,
+            search_query,
+            aggregator.OCCURRENCE,
+        )
+
+    def _is_binary(self, data: bytes) -> bool:
+        if not data:
+            return False
+        # Count non-printable chars (excluding common whitespace)
+        # Printable: 32-126. Whitespace: 9, 10, 13.
+        text_chars = bytearray(
+            {7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7F}
+        )
+        return bool(data.translate(None, text_chars))
+
+    def analyze_summary(self, search_query: str | None = None) -> AnalysisResult:
+        from .tshark import tshark
+
+        if not tshark.is_available():
+            return AnalysisResult()
+
+        aggregator = SummaryAggregator()
+        total_packets = 0
+        try:
+            for row in self._aggregator_rows(aggregator, search_query):
+                total_packets += 1
+                self._report_progress(total_packets, "Analyzing summary...")
+                aggregator.update(row)
         except Exception as e:
-            return {"error": str(e)}
+            import sys
 
-        queries = []
-        domain_counter: Counter[str] = Counter()
-        total_queries = 0
-        total_responses = 0
-
-        # Tshark query types map (1=A, 28=AAAA, etc). Tshark usually outputs '1' not 'A'.
-        # We might need a map or use tshark's resolved values if we didn't use -T fields-like extraction?
-        # With -T json -e dns.qry.type, it outputs value.
-        # Actually Tshark JSON often has "dns.qry.type": "1".
-
-        dns_type_map = {
-            "1": "A",
-            "2": "NS",
-            "5": "CNAME",
-            "6": "SOA",
-            "12": "PTR",
-            "15": "MX",
-            "16": "TXT",
-            "28": "AAAA",
-            "33": "SRV",
-            "255": "ANY",
-        }
+            print(f"Summary analysis error: {e}", file=sys.stderr)
 
-        for pkt in packets:
-            # pyright: ignore
-            layers = pkt.get("_source", {}).get("layers", {})
-            if not layers:
-                continue
+        return aggregator.result()
+
+    def analyze_http(self, search_query: str | None = None) -> dict[str, Any]:
+        from .tshark import tshark
+
+        if not tshark.is_available():
+            return {}
+
+        aggregator = HttpAggregator()
+        packet_count = 0
+        try:
+            for row in self._aggregator_rows(aggregator, search_query):
+                packet_count += 1
+                self._report_progress(packet_count, "Analyzing HTTP...")
+                aggregator.update(row)
+        except Exception as e:
+            return {"error": str(e)}
+
+        return aggregator.result()
 
-            is_response = layers.get("dns.flags.response", ["0"])[0] == "1"
-            qname = layers.get("dns.qry.name", [None])[0]
-            qtype_val = layers.get("dns.qry.type", ["0"])[0]
-            qtype = dns_type_map.get(qtype_val, qtype_val)
-            tx_id = layers.get("dns.id", ["0"])[0]
-            frame = layers.get("frame.number", ["0"])[0]
-            rcode = layers.get("dns.flags.rcode", ["0"])[0]
-
-            if not is_response and qname:
-                total_queries += 1
-                domain_counter[qname] += 1
-                queries.append(
-                    {
-                        "frame": frame,
-                        "id": tx_id,
-                        "domain": qname,
-                        "type": qtype,
-                        "answers": [],
-                        "is_response": False,
-                    }
-                )
+    def analyze_dns(self, search_query: str | None = None) -> dict[str, Any]:
+        from .tshark import tshark
 
-            elif is_response:
-                total_responses += 1
-                # Collect answers
-                answers = []
-                if "dns.a" in layers:
-                    answers.extend(layers["dns.a"])
-                if "dns.aaaa" in layers:
-                    answers.extend(layers["dns.aaaa"])
-                if "dns.cname" in layers:
-                    answers.extend(layers["dns.cname"])
-
-                if qname:
-                    queries.append(
-                        {
-                            "frame": frame,
-                            "id": tx_id,
-                            "domain": qname,
-                            "type": qtype,
-                            "answers": answers,
-                            "rcode": rcode,
-                            "is_response": True,
-                        }
-                    )
+        if not tshark.is_available():
+            return {}
 
-        return {
-            "total_queries": total_queries,
-            "total_responses": total_responses,
-            "unique_domains": len(domain_counter),
-            "queries": queries[:MAX_QUERIES_OUTPUT],
-            "top_domains": [
-                {"domain": d, "count": c}
-                for d, c in domain_counter.most_common(MAX_TOP_ITEMS)
-            ],
-        }
+        aggregator = DnsAggregator()
+        packet_count = 0
+        try:
+            for row in self._aggregator_rows(aggregator, search_query):
+                packet_count += 1
+                self._report_progress(packet_count, "Analyzing DNS...")
+                aggregator.update(row)
+        except Exception as e:
+            return {"error": str(e)}
+
+        return aggregator.result()
 
     def analyze_tls(self) -> dict[str, Any]:
         from .tshark import tshark
@@ -716,271 +1689,35 @@ class PcapAnalyzer:
             "versions": dict(version_counter),
         }
 
-    def analyze_security(self) -> dict[str, Any]:
+    def analyze_security(self, search_query: str | None = None) -> dict[str, Any]:
         from .tshark import tshark
 
         if not tshark.is_available():
             return {}
 
-        alerts = []
-
-        # 1. Port Scan Detection (SYN packets)
-        # pyright: ignore[reportGeneralTypeIssues]
-        syn_tracker: dict[str, set[str]] = defaultdict(set)
+        aggregator = SecurityAggregator()
         scan_count = 0
-        for row in tshark.stream_fields(
-            str(self.filepath),
-            ["ip.src", "tcp.dstport"],
-            display_filter="tcp.flags.syn==1 and tcp.flags.ack==0",
-        ):
+        for row in self._aggregator_rows(aggregator, search_query):
             scan_count += 1
-            self._report_progress(scan_count, "Scanning ports...")
-            src = row.get("ip.src")
-            port = row.get("tcp.dstport")
-            if src and port:
-                syn_tracker[src].add(port)
-
-        # pyright: ignore
-        for src_ip, ports in syn_tracker.items():
-            if len(ports) > PORT_SCAN_THRESHOLD:
-                alerts.append(
-                    SecurityAlert(
-                        severity="Medium",
-                        alert_type="Port Scan",
-                        description=f"Potential port scan detected ({len(ports)} distinct ports)",
-                        source_ip=src_ip,
-                        target_ip="Multiple",
-                        payload_preview=f"Ports: {list(ports)[:10]}...",
-                    )
-                )
-
-        # 2. Payload Analysis (SQLi, XSS, Auth)
-        sqli_patterns = [
-            r"union\s+select",
-            r"'\s+or\s+'1'='1",
-            r'"\s+or\s+"1"="1',
-            r"information_schema",
-            r"waitfor\s+delay",
-        ]
-        xss_patterns = [
-            r"<script>",
-            r"javascript:",
-            r"onerror=",
-            r"onload=",
-            r"alert\(",
-        ]
-
-        # Stream payload (only packets with data)
-        payload_count = 0
-        for row in tshark.stream_fields(
-            str(self.filepath),
-            ["ip.src", "ip.dst", "tcp.payload"],
-            display_filter="tcp.len > 0",
-        ):
-            payload_count += 1
-            self._report_progress(payload_count, "Analyzing payloads...")
-            payload_hex = row.get("tcp.payload")
-            if not payload_hex:
-                continue
-
-            try:
-                # Tshark returns AA:BB:CC, need to strip colons
-                payload = bytes.fromhex(payload_hex.replace(":", "")).decode(
-                    "utf-8", errors="ignore"
-                )
-            except Exception:
-                continue
-
-            src_ip = row.get("ip.src", "Unknown")
-            dst_ip = row.get("ip.dst", "Unknown")
-            lower_payload = payload.lower()
-
-            # Plaintext Auth
-            if "Authorization: Basic" in payload:
-                alerts.append(
-                    SecurityAlert(
-                        severity="High",
-                        alert_type="Plaintext Credentials",
-                        description="Basic Authentication header found",
-                        source_ip=src_ip,
-                        target_ip=dst_ip,
-                        payload_preview=payload[:MAX_PAYLOAD_PREVIEW_LENGTH],
-                    )
-                )
-
-            # SQL Injection
-            for pattern in sqli_patterns:
-                if re.search(pattern, lower_payload):
-                    alerts.append(
-                        SecurityAlert(
-                            severity="High",
-                            alert_type="SQL Injection",
-                            description=f"SQL Injection pattern detected: {pattern}",
-                            source_ip=src_ip,
-                            target_ip=dst_ip,
-                            payload_preview=payload[:MAX_PAYLOAD_PREVIEW_LENGTH],
-                        )
-                    )
-                    break
-
-            # XSS
-            for pattern in xss_patterns:
-                if re.search(pattern, lower_payload):
-                    alerts.append(
-                        SecurityAlert(
-                            severity="Medium",
-                            alert_type="XSS",
-                            description=f"Cross-Site Scripting pattern detected: {pattern}",
-                            source_ip=src_ip,
-                            target_ip=dst_ip,
-                            payload_preview=payload[:MAX_PAYLOAD_PREVIEW_LENGTH],
-                        )
-                    )
-                    break
-
-        # Deduplicate alerts
-        unique_alerts = []
-        seen = set()
-        for alert in alerts:
-            key = (alert.alert_type, alert.source_ip, alert.description)
-            if key not in seen:
-                seen.add(key)
-                unique_alerts.append(alert)
+            self._report_progress(scan_count, "Scanning for threats...")
+            aggregator.update(row)
 
-        return {
-            "security_alerts": [asdict(a) for a in unique_alerts],
-            "total_alerts": len(unique_alerts),
-        }
+        return aggregator.result()
 
-    def analyze_tcp_sessions(self) -> dict[str, Any]:
+    def analyze_tcp_sessions(self, search_query: str | None = None) -> dict[str, Any]:
         from .tshark import tshark
 
         if not tshark.is_available():
             return {}
 
-        fields = [
-            "tcp.stream",
-            "ip.src",
-            "ip.dst",
-            "tcp.srcport",
-            "tcp.dstport",
-            "frame.len",
-            "frame.time_relative",
-            "tcp.payload",
-            "_ws.col.protocol",
-            "_ws.col.info",
-        ]
-
-        # pyright: ignore
-        sessions: dict[str, dict[str, Any]] = defaultdict(
-            lambda: {
-                "src": "",
-                "dst": "",
-                "sport": "",
-                "dport": "",
-                "packet_count": 0,
-                "bytes": 0,
-                "start_time": None,
-                "end_time": None,
-                "payload_hex": "",
-                "protocols": Counter(),
-                "summary": "",
-            }
-        )
-
+        aggregator = TcpSessionAggregator()
         total_packets = 0
-        for row in tshark.stream_fields(
-            str(self.filepath), fields, display_filter="tcp"
-        ):
+        for row in self._aggregator_rows(aggregator, search_query):
             total_packets += 1
             self._report_progress(total_packets, "Analyzing TCP sessions...")
-            stream_id = row.get("tcp.stream")
-            if not stream_id:
-                continue
-
-            s = sessions[stream_id]
-            # Capture first IP tuple seen in stream
-            if not s["src"]:
-                s["src"] = row.get("ip.src", "?")
-                s["dst"] = row.get("ip.dst", "?")
-                s["sport"] = row.get("tcp.srcport", "0")
-                s["dport"] = row.get("tcp.dstport", "0")
-
-            s["packet_count"] += 1
-            pkt_len = int(row.get("frame.len", 0))
-            s["bytes"] += pkt_len
-
-            try:
-                ts = float(row.get("frame.time_relative", 0))
-                if s["start_time"] is None or ts < s["start_time"]:
-                    s["start_time"] = ts
-                if s["end_time"] is None or ts > s["end_time"]:
-                    s["end_time"] = ts
-            except ValueError:
-                pass
-
-            payload = row.get("tcp.payload")
-            # Limit payload accumulation to 2KB per session for preview
-            if payload and len(s["payload_hex"]) < MAX_PAYLOAD_HEX_LENGTH:
-                s["payload_hex"] += payload.replace(":", "")
-
-            proto = row.get("_ws.col.protocol")
-            if proto:
-                s["protocols"][proto] += 1
-
-            info = row.get("_ws.col.info")
-            if info and not s["summary"]:
-                s["summary"] = info
-
-        results = []
-        for sid, data in sessions.items():
-            payload_ascii = ""
-            payload_hex_view = ""
-            try:
-                payload_bytes = bytes.fromhex(data["payload_hex"])
-                # ASCII decode
-                payload_ascii = payload_bytes.decode("utf-8", errors="replace")
-                payload_ascii = "".join(
-                    c if c.isprintable() or c in "\n\r\t" else "."
-                    for c in payload_ascii
-                )
-                # Hex View (first 100 bytes)
-                payload_hex_view = " ".join(
-                    f"{b:02x}" for b in payload_bytes[:MAX_PAYLOAD_HEX_PREVIEW_BYTES]
-                )
-            except Exception:
-                pass
-
-            top_proto = (
-                data["protocols"].most_common(1)[0][0] if data["protocols"] else "TCP"
-            )
-
-            results.append(
-                TcpSession(
-                    session_id=sid,
-                    src_ip=data["src"],
-                    src_port=int(data["sport"] or 0),
-                    dst_ip=data["dst"],
-                    dst_port=int(data["dport"] or 0),
-                    packet_count=data["packet_count"],
-                    byte_count=data["bytes"],
-                    duration=round(
-                        (data["end_time"] or 0) - (data["start_time"] or 0), 3
-                    ),
-                    start_time=data["start_time"] or 0,
-                    payload_ascii=payload_ascii[:MAX_PAYLOAD_ASCII_LENGTH],
-                    payload_hex=payload_hex_view,
-                    protocol=top_proto,
-                    summary=data["summary"],
-                )
-            )
-
-        results.sort(key=lambda x: x.packet_count, reverse=True)
+            aggregator.update(row)
 
-        return {
-            "tcp_sessions": [asdict(s) for s in results[:MAX_TCP_SESSIONS_OUTPUT]],
-            "total_sessions": len(results),
-        }
+        return aggregator.result()
 
     def analyze_details_tshark(self, display_filter: str = "http") -> Any:
         from .tshark import tshark
@@ -1056,191 +1793,380 @@ class PcapAnalyzer:
 
         return {"stream_id": stream_id, "page": page, "packets": packets}
 
-    def analyze_tcp_anomalies(self, search_query: str | None = None) -> dict[str, Any]:
+    def _event_store_path(
+        self, report_type: str, output_dir: str | None = None
+    ) -> Path:
+        return (
+            self._report_dir(output_dir)
+            / f"{report_type}_{self.filepath.name}.events.db"
+        )
+
+    def _source_meta(self) -> dict[str, Any]:
+        stat = self.filepath.stat()
+        return {"source_size": stat.st_size, "source_mtime": stat.st_mtime}
+
+    def analyze_tcp_anomalies(
+        self, search_query: str | None = None, output_dir: str | None = None
+    ) -> dict[str, Any]:
         from .tshark import tshark
+        from .event_store import EventStoreWriter
 
         if not tshark.is_available():
             return {"error": "Tshark not available. Please install Wireshark."}
 
-        # Simplified fields for list view (Lazy Loading Phase 1)
-        fields = [
-            "frame.number",
-            "frame.time_relative",
-            "frame.len",
-            "ip.src",
-            "ip.dst",
-            "tcp.srcport",
-            "tcp.dstport",
-            "tcp.stream",
-            "tcp.seq",
-            "tcp.ack",
-            "tcp.flags.str",
-            "tcp.analysis.retransmission",
-            "tcp.analysis.fast_retransmission",
-            "tcp.analysis.out_of_order",
-            "tcp.analysis.duplicate_ack",
-            "tcp.analysis.zero_window",
-            "tcp.analysis.window_full",
-            "tcp.analysis.lost_segment",
-            "tcp.analysis.ack_lost_segment",
-            "tcp.flags.reset",
-        ]
-
-        # Filter for ANY tcp anomaly OR reset flag
-        base_filter = "tcp.analysis.flags or tcp.flags.reset==1"
-        display_filter = self._build_filter(base_filter, search_query)
+        # Lazy Loading Phase 2: only per-stream counters and a bounded event
+        # sample are kept in memory, the full event list goes to an on-disk
+        # store that get_tcp_anomaly_events() pages through.
+        aggregator = TcpAnomalyAggregator()
 
+        store_path = self._event_store_path("tcp_anomalies", output_dir)
+        store: EventStoreWriter | None
         try:
-            packets = tshark.run_json(
-                str(self.filepath), display_filter=display_filter, fields=fields
+            store = EventStoreWriter(
+                store_path,
+                {
+                    **self._source_meta(),
+                    "display_filter": TCP_ANOMALY_FILTER,
+                    "search_query": search_query,
+                },
             )
+        except (OSError, sqlite3.Error) as e:
+            import sys
+
+            print(f"Event store disabled: {e}", file=sys.stderr)
+            store = None
+
+        current_packet = 0
+        try:
+            for row in self._stream_rows(
+                aggregator.DISPLAY_FILTER, aggregator.FIELDS, search_query
+            ):
+                current_packet += 1
+                self._report_progress(current_packet, "Analyzing TCP anomalies...")
+
+                event = aggregator.update(row)
+                if event and store:
+                    try:
+                        ts = float(event["time"])
+                    except ValueError:
+                        ts = 0.0
+                    store.add(row["tcp.stream"], ts, event)
+
         except Exception as e:
+            if store:
+                store.abort()
             return {"error": f"Tshark analysis failed: {str(e)}"}
 
-        # pyright: ignore
-        streams = defaultdict(
-            lambda: {
-                "src_ip": "",
-                "dst_ip": "",
-                "src_port": "",
-                "dst_port": "",
-                "anomaly_counts": Counter(),
-                "events": [],
+        events_store = None
+        if store:
+            try:
+                events_store = str(store.commit())
+            except (OSError, sqlite3.Error) as e:
+                store.abort()
+                import sys
+
+                print(f"Error saving anomaly events: {e}", file=sys.stderr)
+
+        result = aggregator.result()
+        result["events_store"] = events_store
+        result["scan_time"] = str(Path(self.filepath).stat().st_mtime)
+
+        return result
+
+    def get_tcp_anomaly_events(
+        self,
+        stream_id: str,
+        page: int = 1,
+        page_size: int = MAX_EVENTS_PER_SESSION,
+        output_dir: str | None = None,
+    ) -> dict[str, Any]:
+        from .event_store import EventStore
+
+        store_path = self._event_store_path("tcp_anomalies", output_dir)
+
+        def is_fresh() -> bool:
+            try:
+                with EventStore(store_path) as store:
+                    meta = store.get_meta()
+            except (OSError, sqlite3.Error):
+                return False
+            expected = {
+                **self._source_meta(),
+                "display_filter": TCP_ANOMALY_FILTER,
+                "search_query": None,
             }
-        )
+            return all(meta.get(k) == v for k, v in expected.items())
 
-        total_anomalies = Counter()
+        # Rebuild the store if it is missing or the capture changed since
+        if not is_fresh():
+            result = self.analyze_tcp_anomalies(output_dir=output_dir)
+            if "error" in result:
+                return result
+            if not result.get("events_store"):
+                return {"error": "Anomaly event store unavailable"}
 
-        current_packet = 0
-        for pkt in packets:
-            # pyright: ignore
-            current_packet += 1
-            self._report_progress(current_packet, "Analyzing TCP anomalies...")
-            layers = pkt.get("_source", {}).get("layers", {})
-            if not layers:
-                continue
+        try:
+            with EventStore(store_path) as store:
+                total = store.count(stream_id)
+                events = store.get_events(
+                    stream_id, offset=(page - 1) * page_size, limit=page_size
+                )
+        except (OSError, sqlite3.Error) as e:
+            return {"error": str(e)}
 
-            stream_id = layers.get("tcp.stream", ["-1"])[0]
-            if stream_id == "-1":
-                continue
+        return {
+            "stream_id": stream_id,
+            "page": page,
+            "page_size": page_size,
+            "total_events": total,
+            "events": events,
+        }
+
+    def analyze_tail(self, analysis_type: str) -> dict[str, Any]:
+        """
+        Incremental analysis of a capture that is still being written.
+
+        Each call only runs tshark over the records appended since the last
+        call and merges them into the checkpointed aggregator state. Frame
+        numbers and relative times are capture-wide; TCP stream ids are
+        assigned per connection 4-tuple in first-seen order. TCP anomalies
+        replay the last TAIL_CONTEXT_PACKETS records before every chunk so
+        tshark's sequence analysis has history, and keep only the per-stream
+        event sample (no event store).
+        """
+        import os
+        import tempfile
+        from .tshark import tshark
+        from .tail import TAIL_CONTEXT_PACKETS, TAIL_FIELDS, TailCheckpoint
+        from .tail import load_checkpoint, save_checkpoint
 
-            # Basic info (taking from first packet or overwriting is fine for static flow)
-            if not streams[stream_id]["src_ip"]:
-                streams[stream_id]["src_ip"] = layers.get("ip.src", ["?"])[0]
-                streams[stream_id]["dst_ip"] = layers.get("ip.dst", ["?"])[0]
-                streams[stream_id]["src_port"] = layers.get("tcp.srcport", ["?"])[0]
-                streams[stream_id]["dst_port"] = layers.get("tcp.dstport", ["?"])[0]
-
-            # Check flags present in layers
-            # Tshark fields are lists if present, or missing if not
-            anomalies = []
-
-            if "tcp.analysis.retransmission" in layers:
-                anomalies.append("Retransmission")
-                total_anomalies["Retransmission"] += 1
-                streams[stream_id]["anomaly_counts"]["Retransmission"] += 1
-
-            if "tcp.analysis.fast_retransmission" in layers:
-                anomalies.append("Fast Retransmission")
-                total_anomalies["Fast Retransmission"] += 1
-                streams[stream_id]["anomaly_counts"]["Fast Retransmission"] += 1
-
-            if "tcp.analysis.out_of_order" in layers:
-                anomalies.append("Out-of-Order")
-                total_anomalies["Out-of-Order"] += 1
-                streams[stream_id]["anomaly_counts"]["Out-of-Order"] += 1
-
-            if "tcp.analysis.duplicate_ack" in layers:
-                anomalies.append("Duplicate ACK")
-                total_anomalies["Duplicate ACK"] += 1
-                streams[stream_id]["anomaly_counts"]["Duplicate ACK"] += 1
-
-            if "tcp.analysis.zero_window" in layers:
-                anomalies.append("Zero Window")
-                total_anomalies["Zero Window"] += 1
-                streams[stream_id]["anomaly_counts"]["Zero Window"] += 1
-
-            if "tcp.analysis.window_full" in layers:
-                anomalies.append("Window Full")
-                total_anomalies["Window Full"] += 1
-                streams[stream_id]["anomaly_counts"]["Window Full"] += 1
-
-            if "tcp.analysis.lost_segment" in layers:
-                anomalies.append("Lost Segment")
-                total_anomalies["Lost Segment"] += 1
-                streams[stream_id]["anomaly_counts"]["Lost Segment"] += 1
-
-            if "tcp.analysis.ack_lost_segment" in layers:
-                anomalies.append("ACK Lost")
-                total_anomalies["ACK Lost"] += 1
-                streams[stream_id]["anomaly_counts"]["ACK Lost"] += 1
-
-            if "tcp.flags.reset" in layers and layers["tcp.flags.reset"][0] in (
-                "1",
-                "True",
+        aggregator_cls = TAIL_AGGREGATORS.get(analysis_type)
+        if aggregator_cls is None:
+            return {"error": f"Tail mode not supported for {analysis_type}"}
+        if not tshark.is_available():
+            return {"error": "Tshark not available. Please install Wireshark."}
+
+        checkpoint = load_checkpoint(self.filepath, analysis_type)
+        aggregator = None
+        if checkpoint.state is not None:
+            try:
+                aggregator = aggregator_cls.from_state(checkpoint.state)
+            except (AttributeError, KeyError, TypeError, ValueError):
+                # State of an older aggregator layout: start over
+                checkpoint = TailCheckpoint(str(self.filepath), analysis_type)
+        resumed = aggregator is not None
+        if aggregator is None:
+            aggregator = aggregator_cls()
+        context = TAIL_CONTEXT_PACKETS if aggregator.NEEDS_CONTEXT else 0
+        frames_before = checkpoint.frames
+        fields = list(dict.fromkeys(aggregator.FIELDS + TAIL_FIELDS))
+
+        chunk_path = None
+        try:
+            # Even on the first refresh tshark only gets the complete records,
+            # the capture itself may end in a partly written one
+            fd, chunk_path = tempfile.mkstemp(suffix=".cap")
+            with os.fdopen(fd, "wb") as out:
+                skip, new = checkpoint.read_new(out, context)
+
+            if new:
+                processed = 0
+                for row in tshark.stream_fields(
+                    chunk_path, fields, display_filter=aggregator.DISPLAY_FILTER
+                ):
+                    frame = int(row.get("frame.number") or 0) - skip
+                    # Context records were counted before; records past the
+                    # ones read above are left for the next refresh
+                    if frame <= 0 or frame > new:
+                        continue
+                    checkpoint.rebase(row, frames_before + frame)
+                    aggregator.update(row)
+                    processed += 1
+                    self._report_progress(processed, "Analyzing new packets...")
+
+            checkpoint.state = aggregator.to_state()
+            save_checkpoint(checkpoint)
+        except Exception as e:
+            return {"error": f"Tail analysis failed: {str(e)}"}
+        finally:
+            if chunk_path:
+                os.unlink(chunk_path)
+
+        result = aggregator.result()
+        if isinstance(result, AnalysisResult):
+            result = result.to_dict()
+        result["tail"] = {
+            "resumed": resumed,
+            "new_frames": new,
+            "total_frames": checkpoint.frames,
+            "offset": checkpoint.offset,
+        }
+        return result
+
+    def run(self, analysis_type: str, options: dict | None = None) -> dict[str, Any]:
+        """
+        Run one analysis by name.
+
+        Results are cached per capture fingerprint, analysis type, options
+        and code, so reopening an unchanged capture skips tshark.
+        Identical requests running at the same time (other threads, the CLI
+        next to the MCP server) are coalesced: one computes, the rest wait
+        and read its cached result. Tail mode is never cached since each
+        call consumes new packets.
+        """
+        from .tshark import tshark
+        from .cache import load_result, result_cache_path, single_flight, store_result
+
+        options = options or {}
+
+        if options.get("tail") and analysis_type in TAIL_AGGREGATORS:
+            return self.analyze_tail(analysis_type)
+
+        try:
+            cache_path = result_cache_path(self.filepath, analysis_type, options)
+        except OSError:
+            return self._dispatch(analysis_type, options)
+
+        cached = load_result(cache_path)
+        if cached is not None:
+            return cached
+
+        with single_flight(cache_path):
+            # Someone else may have computed it while we waited
+            cached = load_result(cache_path)
+            if cached is not None:
+                return cached
+
+            with tshark.failure_scope() as failures:
+                result = self._dispatch(analysis_type, options)
+
+            # Results without tshark are placeholders and those of a failed
+            # run may be partial, don't keep them around
+            if (
+                result
+                and "error" not in result
+                and tshark.is_available()
+                and not failures
             ):
-                anomalies.append("Reset")
-                total_anomalies["Reset"] += 1
-                streams[stream_id]["anomaly_counts"]["Reset"] += 1
+                store_result(cache_path, result)
 
-            if anomalies:
-                streams[stream_id]["events"].append(
-                    {
-                        "frame": layers.get("frame.number", ["?"])[0],
-                        "time": layers.get("frame.time_relative", ["0"])[0],
-                        "len": layers.get("frame.len", ["0"])[0],
-                        "types": anomalies,
-                        "src": layers.get("ip.src", ["?"])[0],
-                        "dst": layers.get("ip.dst", ["?"])[0],
-                        "tcp": {
-                            "seq": layers.get("tcp.seq", ["0"])[0],
-                            "ack": layers.get("tcp.ack", ["0"])[0],
-                            "win": layers.get("tcp.window_size_value", ["0"])[0],
-                            "flags_str": layers.get("tcp.flags.str", [""])[0],
-                            "flags_hex": layers.get("tcp.flags", ["0x00"])[0],
-                        },
-                    }
-                )
+        return result
 
-        # Format result
-        session_list = []
-        for sid, data in streams.items():
-            counts = data["anomaly_counts"]
+    async def arun(
+        self,
+        analysis_type: str,
+        options: dict | None = None,
+        executor: Executor | None = None,
+    ) -> dict[str, Any]:
+        """
+        run() for asyncio servers. Analyses in ASYNC_ANALYSES read tshark
+        through tshark.astream_fields on the running loop, so concurrent
+        calls don't hold a thread each; cache files are read and written on
+        `executor`, which also runs the other analyses via run().
+        """
+        import asyncio
+        import sys
+        from .tshark import tshark
+        from .cache import (
+            async_single_flight,
+            load_result,
+            result_cache_path,
+            store_result,
+        )
 
-            session_list.append(
-                {
-                    "stream_id": sid,
-                    "src": f"{data['src_ip']}:{data['src_port']}",
-                    "dst": f"{data['dst_ip']}:{data['dst_port']}",
-                    "anomaly_summary": dict(counts),
-                    "events_count": len(data["events"]),
-                    "events": data["events"],
-                }
+        options = options or {}
+        loop = asyncio.get_running_loop()
+
+        if (
+            analysis_type not in ASYNC_ANALYSES
+            or options.get("tail")
+            or not tshark.is_available()
+        ):
+            return await loop.run_in_executor(
+                executor, self.run, analysis_type, options
+            )
+
+        try:
+            cache_path = await loop.run_in_executor(
+                executor, result_cache_path, self.filepath, analysis_type, options
+            )
+        except OSError:
+            return await loop.run_in_executor(
+                executor, self.run, analysis_type, options
             )
 
-        # Filter out sessions with no events
-        session_list = [s for s in session_list if s["events_count"] > 0]
+        cached = await loop.run_in_executor(executor, load_result, cache_path)
+        if cached is not None:
+            return cached
 
-        # Sort by total anomaly count desc
-        session_list.sort(
-            key=lambda x: sum(x["anomaly_summary"].values()), reverse=True
-        )
+        aggregator_type, message = ASYNC_ANALYSES[analysis_type]
+        search_query = self._scoped_query(options)
+        async with async_single_flight(cache_path):
+            cached = await loop.run_in_executor(executor, load_result, cache_path)
+            if cached is not None:
+                return cached
 
-        result = {
-            "total_anomalies": dict(total_anomalies),
-            "anomalous_sessions": session_list,
-            "scan_time": str(Path(self.filepath).stat().st_mtime),
-        }
+            aggregator = aggregator_type()
+            packet_count = 0
+            with tshark.failure_scope() as failures:
+                try:
+                    async for rows in self._astream_rows(
+                        aggregator.DISPLAY_FILTER,
+                        aggregator.FIELDS,
+                        search_query,
+                        aggregator.OCCURRENCE,
+                        executor,
+                    ):
+                        for row in rows:
+                            packet_count += 1
+                            self._report_progress(packet_count, message)
+                            aggregator.update(row)
+                except Exception as e:
+                    # Like analyze_summary, the summary keeps what it counted
+                    if aggregator_type is not SummaryAggregator:
+                        return {"error": str(e)}
+                    print(f"Summary analysis error: {e}", file=sys.stderr)
+
+            result = aggregator.result()
+            if isinstance(result, AnalysisResult):
+                result = result.to_dict()
+            if result and not failures:
+                await loop.run_in_executor(executor, store_result, cache_path, result)
 
         return result
 
+    def _dispatch(self, analysis_type: str, options: dict) -> dict[str, Any]:
+        output_dir = options.get("output_dir")
+        search_query = self._scoped_query(options)
+
+        if analysis_type == "pcap_summary":
+            result_obj = self.analyze_summary(search_query)
+            return result_obj.to_dict()
+        elif analysis_type == "http_analysis":
+            return self.analyze_http(search_query)
+        elif analysis_type == "dns_analysis":
+            return self.analyze_dns(search_query)
+        elif analysis_type == "tls_analysis":
+            return self.analyze_tls()
+        elif analysis_type == "security_scan":
+            return self.analyze_security(search_query)
+        elif analysis_type == "tcp_sessions":
+            return self.analyze_tcp_sessions(search_query)
+        elif analysis_type == "tshark_http":
+            return {"tshark_data": self.analyze_details_tshark("http")}
+        elif analysis_type == "tshark_tls":
+            return {"tshark_data": self.analyze_details_tshark("tls")}
+        elif analysis_type == "tcp_anomalies":
+            return self.analyze_tcp_anomalies(search_query, output_dir=output_dir)
+        else:
+            raise ValueError(f"Unknown analysis type: {analysis_type}")
+
 
 def analyze_pcap(
     filepath: str, analysis_type: str = "pcap_summary", options: dict | None = None
 ) -> dict[str, Any]:
     analyzer = PcapAnalyzer(filepath)
     options = options or {}
-    output_dir = options.get("output_dir")
 
     # Configure Tshark if provided
     tshark_path = options.get("tshark_path")
@@ -1249,31 +2175,9 @@ def analyze_pcap(
 
         tshark.set_path(tshark_path)
 
-    result = None
-
-    if analysis_type == "pcap_summary":
-        result_obj = analyzer.analyze_summary()
-        result = result_obj.to_dict()
-    elif analysis_type == "http_analysis":
-        result = analyzer.analyze_http()
-    elif analysis_type == "dns_analysis":
-        result = analyzer.analyze_dns()
-    elif analysis_type == "tls_analysis":
-        result = analyzer.analyze_tls()
-    elif analysis_type == "security_scan":
-        result = analyzer.analyze_security()
-    elif analysis_type == "tcp_sessions":
-        result = analyzer.analyze_tcp_sessions()
-    elif analysis_type == "tshark_http":
-        result = {"tshark_data": analyzer.analyze_details_tshark("http")}
-    elif analysis_type == "tshark_tls":
-        result = {"tshark_data": analyzer.analyze_details_tshark("tls")}
-    elif analysis_type == "tcp_anomalies":
-        result = analyzer.analyze_tcp_anomalies()
-    else:
-        raise ValueError(f"Unknown analysis type: {analysis_type}")
+    result = analyzer.run(analysis_type, options)
 
     if result:
-        analyzer._save_report(result, analysis_type, output_dir)
+        analyzer._save_report(result, analysis_type, options.get("output_dir"))
 
     return result
@@ -0,0 +1,264 @@
+"""
+Cache locations, capture fingerprints and the analysis result cache
+"""
+
+from __future__ import annotations
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import sys
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: only coalesce within the process
+    fcntl = None
+
+# Bytes hashed from the start, middle and end of a capture
+FINGERPRINT_SAMPLE_SIZE = 64 * 1024
+
+# Analysis results kept in the result cache (least recently used evicted)
+MAX_CACHED_RESULTS = 200
+
+# Seconds between lock attempts of coroutines waiting in async_single_flight
+FLIGHT_POLL_SECONDS = 0.05
+
+
+def cache_dir(name: str) -> Path:
+    """Per-user cache directory for one kind of cached data (created on demand)"""
+    base = os.environ.get("NETLENS_CACHE_DIR")
+    if base:
+        root = Path(base)
+    elif sys.platform == "darwin":
+        root = Path.home() / "Library" / "Caches" / "NetLens"
+    else:
+        root = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+        root = root / "netlens"
+
+    path = root / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def fingerprint(filepath: str | Path) -> str:
+    """
+    Content fingerprint of a capture: size + mtime + hash of sampled blocks.
+
+    Sampling keeps this O(1) in the file size while still catching captures
+    that were rewritten in place with the same size and timestamp.
+    """
+    path = Path(filepath)
+    stat = path.stat()
+    h = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(path, "rb") as f:
+        for offset in (0, stat.st_size // 2, stat.st_size - FINGERPRINT_SAMPLE_SIZE):
+            f.seek(max(offset, 0))
+            h.update(f.read(FINGERPRINT_SAMPLE_SIZE))
+    return h.hexdigest()
+
+
+def temp_path(path: Path) -> Path:
+    """Private temporary name to write `path` under before renaming it into place"""
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def prune(directory: Path, keep: int, pattern: str = "*") -> None:
+    """Delete all but the `keep` most recently used files in a cache directory"""
+    try:
+        entries = sorted(
+            directory.glob(pattern), key=lambda p: p.stat().st_mtime, reverse=True
+        )
+        for stale in entries[keep:]:
+            stale.unlink()
+    except OSError:
+        pass
+
+
+@functools.lru_cache(maxsize=None)
+def _code_version() -> str:
+    # Any change to the analysis code invalidates cached results, not just
+    # releases; frozen builds without sources fall back to the version
+    from . import __version__
+
+    h = hashlib.sha1(__version__.encode())
+    for source in sorted(Path(__file__).parent.glob("*.py")):
+        try:
+            h.update(source.read_bytes())
+        except OSError:
+            pass
+    return h.hexdigest()
+
+
+def result_cache_path(
+    filepath: str | Path, analysis_type: str, options: dict[str, Any]
+) -> Path:
+    """
+    Cache file for one analysis result.
+
+    The name is `<entry>_<content>.json`: `entry` identifies the capture path,
+    analysis type and options, `content` the capture fingerprint and a hash of
+    the package sources, so a changed capture or code simply misses.
+    """
+    path = Path(filepath)
+    entry = json.dumps(
+        [str(path.resolve()), analysis_type, options], sort_keys=True, default=str
+    )
+    content = json.dumps([fingerprint(path), _code_version()])
+    return cache_dir("results") / (
+        f"{hashlib.sha1(entry.encode()).hexdigest()[:20]}_"
+        f"{hashlib.sha1(content.encode()).hexdigest()[:20]}.json"
+    )
+
+
+def load_result(path: Path) -> dict[str, Any] | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+        path.touch()
+        return result
+    except (OSError, ValueError):
+        return None
+
+
+def store_result(path: Path, result: dict[str, Any]) -> None:
+    """Write a result and drop the entries it supersedes (older capture contents)"""
+    try:
+        tmp_path = temp_path(path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        entry = path.name.split("_")[0]
+        for stale in path.parent.glob(f"{entry}_*.json"):
+            if stale != path:
+                stale.unlink()
+        prune(path.parent, MAX_CACHED_RESULTS, "*.json")
+        _prune_locks(path.parent, MAX_CACHED_RESULTS)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Error caching result: {e}", file=sys.stderr)
+
+
+def _prune_locks(directory: Path, keep: int) -> None:
+    # Like prune, but only lock files nobody holds: a lock is removed while
+    # we hold it ourselves, and single_flight retries when it got a removed one
+    if fcntl is None:
+        return
+    try:
+        entries = sorted(
+            directory.glob("*.lock"), key=lambda p: p.stat().st_mtime, reverse=True
+        )
+    except OSError:
+        return
+    for stale in entries[keep:]:
+        try:
+            with open(stale, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                stale.unlink()
+        except OSError:
+            pass
+
+
+def _lock_file(lock_path: Path, blocking: bool = True) -> Any:
+    # flock the lock file, unless it was pruned while we waited for it;
+    # None if it is held elsewhere and we may not wait
+    while True:
+        lock_file = open(lock_path, "a")
+        try:
+            fcntl.flock(
+                lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            )
+            if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                return lock_file
+        except FileNotFoundError:
+            pass
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        except OSError:
+            lock_file.close()
+            raise
+        lock_file.close()
+
+
+# Per-entry locks with the number of threads holding or waiting for them
+_flight_locks: dict[str, tuple[threading.Lock, int]] = {}
+_flight_guard = threading.Lock()
+
+
+@contextmanager
+def _flight_lock(entry: str) -> Iterator[threading.Lock]:
+    # The per-entry lock, registered while we hold or wait for it
+    with _flight_guard:
+        lock, holders = _flight_locks.get(entry) or (threading.Lock(), 0)
+        _flight_locks[entry] = (lock, holders + 1)
+    try:
+        yield lock
+    finally:
+        with _flight_guard:
+            lock, holders = _flight_locks[entry]
+            if holders > 1:
+                _flight_locks[entry] = (lock, holders - 1)
+            else:
+                del _flight_locks[entry]
+
+
+@contextmanager
+def single_flight(path: Path) -> Iterator[None]:
+    """
+    Hold the computation lock of a result cache entry.
+
+    Threads of this process queue on a per-entry lock, other processes on an
+    flock of `<entry>.lock`, so identical concurrent requests run one at a
+    time and the later ones find the first one's result in the cache.
+    """
+    entry = path.name.split("_")[0]
+    with _flight_lock(entry) as lock, lock:
+        lock_file = None
+        if fcntl is not None:
+            try:
+                lock_file = _lock_file(path.parent / f"{entry}.lock")
+            except OSError:
+                pass
+        try:
+            yield
+        finally:
+            if lock_file:
+                # Closing the file releases the flock
+                lock_file.close()
+
+
+@asynccontextmanager
+async def async_single_flight(path: Path) -> AsyncIterator[None]:
+    """
+    single_flight for coroutines: waiting polls the locks every
+    FLIGHT_POLL_SECONDS instead of blocking the event loop or a thread.
+    """
+    entry = path.name.split("_")[0]
+    with _flight_lock(entry) as lock:
+        while not lock.acquire(blocking=False):
+            await asyncio.sleep(FLIGHT_POLL_SECONDS)
+        try:
+            lock_file = None
+            if fcntl is not None:
+                while True:
+                    try:
+                        lock_file = _lock_file(
+                            path.parent / f"{entry}.lock", blocking=False
+                        )
+                    except OSError:
+                        break
+                    if lock_file:
+                        break
+                    await asyncio.sleep(FLIGHT_POLL_SECONDS)
+            try:
+                yield
+            finally:
+                if lock_file:
+                    lock_file.close()
+        finally:
+            lock.release()
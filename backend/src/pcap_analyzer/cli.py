@@ -1,15 +1,34 @@
 from __future__ import annotations
+import os
 import sys
 import json
 import argparse
+import multiprocessing
 
 from .analyzer import analyze_pcap
 
 
+def _release_stdout() -> None:
+    """
+    Close our end of stdout while queued reports are still being written,
+    so the caller can take the result without waiting for the process to exit
+    """
+    from .report_writer import report_writer
+
+    if report_writer.pending:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        os.close(devnull)
+
+
 def main() -> int:
+    # Extraction processes re-run the frozen executable, let them through
+    multiprocessing.freeze_support()
     parser = argparse.ArgumentParser(description="PCAP Analyzer CLI")
     parser.add_argument("analysis_type", help="Type of analysis to perform")
-    parser.add_argument("filepath", help="Path to PCAP file")
+    parser.add_argument(
+        "filepath", help='Path to PCAP file ("-" reads stdin for live analysis)'
+    )
     parser.add_argument(
         "--output-dir", help="Directory to save analysis reports", default=None
     )
@@ -22,10 +41,45 @@ def main() -> int:
     parser.add_argument(
         "--file2", help="Second PCAP file for correlation", default=None
     )
+    parser.add_argument(
+        "--files",
+        help="Further PCAP files along the path, in hop order, for correlate_path",
+        nargs="+",
+        default=None,
+    )
     parser.add_argument("--stream", help="Stream ID for TCP packets", default=None)
     parser.add_argument(
         "--page", help="Page number for pagination", type=int, default=1
     )
+    parser.add_argument(
+        "--start-time",
+        help="Only events at or after this epoch time, for correlation_matches",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--end-time",
+        help="Only events before this epoch time, for correlation_matches",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--window",
+        help="Sliding window in seconds for live analysis",
+        type=float,
+        default=60.0,
+    )
+    parser.add_argument(
+        "--interval",
+        help="Seconds between live analysis snapshots",
+        type=float,
+        default=5.0,
+    )
+    parser.add_argument(
+        "--tail",
+        help="Only analyze packets appended since the last --tail run",
+        action="store_true",
+    )
 
     args = parser.parse_args()
 
@@ -35,8 +89,15 @@ def main() -> int:
             options["output_dir"] = args.output_dir
         if args.search:
             options["search_query"] = args.search
+        if args.tail:
+            options["tail"] = True
+
+        if args.analysis_type == "live":
+            # NDJSON snapshots are written as they are produced
+            from .live import run_live
 
-        if args.analysis_type == "packet_details":
+            return run_live(args.filepath, args.window, args.interval)
+        elif args.analysis_type == "packet_details":
             if args.frame is None:
                 print(json.dumps({"error": "Frame number required (--frame)"}))
                 return 1
@@ -52,6 +113,16 @@ def main() -> int:
 
             analyzer = PcapAnalyzer(args.filepath)
             result = analyzer.get_tcp_stream_packets(args.stream, args.page)
+        elif args.analysis_type == "tcp_anomaly_events":
+            if not args.stream:
+                print(json.dumps({"error": "Stream ID required (--stream)"}))
+                return 1
+            from .analyzer import PcapAnalyzer
+
+            analyzer = PcapAnalyzer(args.filepath)
+            result = analyzer.get_tcp_anomaly_events(
+                args.stream, args.page, output_dir=args.output_dir or None
+            )
         elif args.analysis_type == "correlate":
             if not args.file2:
                 print(json.dumps({"error": "Second file required (--file2)"}))
@@ -59,7 +130,47 @@ def main() -> int:
             from .multi_analyzer import MultiPcapAnalyzer
 
             analyzer = MultiPcapAnalyzer()
-            result = analyzer.correlate(args.filepath, args.file2)
+            result = analyzer.correlate(
+                args.filepath, args.file2, output_dir=args.output_dir or None
+            )
+        elif args.analysis_type == "correlation_matches":
+            if not args.file2:
+                print(json.dumps({"error": "Second file required (--file2)"}))
+                return 1
+            from .multi_analyzer import MultiPcapAnalyzer
+
+            # --stream selects one flow, a TCP stream of the first capture
+            analyzer = MultiPcapAnalyzer()
+            result = analyzer.get_correlation_matches(
+                args.filepath,
+                args.file2,
+                flow=args.stream,
+                start_ts=args.start_time,
+                end_ts=args.end_time,
+                page=args.page,
+                output_dir=args.output_dir or None,
+            )
+        elif args.analysis_type == "correlate_path":
+            files = [args.filepath] + (args.files or [f for f in [args.file2] if f])
+            if len(files) < 2:
+                print(json.dumps({"error": "Further files required (--files)"}))
+                return 1
+            from .multi_analyzer import MultiPcapAnalyzer
+
+            analyzer = MultiPcapAnalyzer()
+            result = analyzer.correlate_path(files)
+        elif args.analysis_type == "correlate_stream":
+            if not args.file2:
+                print(json.dumps({"error": "Second file required (--file2)"}))
+                return 1
+            from .multi_analyzer import MultiPcapAnalyzer
+
+            # NDJSON events are written as matches and losses are decided
+            analyzer = MultiPcapAnalyzer()
+            for event in analyzer.correlate_stream(args.filepath, args.file2):
+                sys.stdout.write(json.dumps(event, separators=(",", ":")) + "\n")
+            sys.stdout.flush()
+            return 0
         elif args.analysis_type == "link_trace":
             from .link_tracer import LinkTracer
 
@@ -71,7 +182,8 @@ def main() -> int:
         else:
             result = analyze_pcap(args.filepath, args.analysis_type, options)
 
-        print(json.dumps(result))
+        print(json.dumps(result), flush=True)
+        _release_stdout()
         return 0
     except FileNotFoundError:
         print(json.dumps({"error": f"File not found: {args.filepath}"}))
@@ -0,0 +1,162 @@
+"""
+Event Store - Indexed on-disk storage for analysis events
+
+Analyses that can emit an unbounded number of events (TCP anomalies,
+correlation matches) keep only counters and a bounded sample in memory and
+spill the full event list here. Events are stored in SQLite, keyed by a
+grouping key (stream id, flow, ...) and a timestamp, so the UI can page
+through one group or a time range on demand.
+"""
+
+from __future__ import annotations
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Optional
+
+# Rows buffered in memory before an executemany() round trip
+INSERT_BATCH_SIZE = 5000
+
+
+class EventStoreWriter:
+    """Append-only writer; the store only becomes visible after commit()"""
+
+    def __init__(self, path: str | Path, meta: Optional[dict[str, Any]] = None):
+        self.path = Path(path)
+        self.meta = dict(meta or {})
+        self.count = 0
+        self._tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._pending: list[tuple[str, float, str]] = []
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self._tmp_path.exists():
+            self._tmp_path.unlink()
+
+        self._conn = sqlite3.connect(str(self._tmp_path))
+        # The file is rebuilt from scratch on failure, durability is not needed
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE events (key TEXT NOT NULL, ts REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)")
+
+    def add(self, key: str, ts: float, event: dict[str, Any]) -> None:
+        self._pending.append((key, ts, json.dumps(event, separators=(",", ":"))))
+        self.count += 1
+        if len(self._pending) >= INSERT_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            self._conn.executemany(
+                "INSERT INTO events (key, ts, data) VALUES (?, ?, ?)", self._pending
+            )
+            self._pending = []
+
+    def commit(self) -> Path:
+        self._flush()
+        # Indexes are built once at the end, which is much cheaper than
+        # maintaining them during bulk insertion
+        self._conn.execute("CREATE INDEX idx_events_key ON events (key)")
+        self._conn.execute("CREATE INDEX idx_events_ts ON events (ts)")
+        self.meta["count"] = self.count
+        self._conn.executemany(
+            "INSERT INTO meta (name, value) VALUES (?, ?)",
+            [(k, json.dumps(v)) for k, v in self.meta.items()],
+        )
+        self._conn.commit()
+        self._conn.close()
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        try:
+            self._conn.close()
+        finally:
+            if self._tmp_path.exists():
+                self._tmp_path.unlink()
+
+
+class EventStore:
+    """Read-only view over a committed event store"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"Event store not found: {self.path}")
+        self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> EventStore:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def get_meta(self) -> dict[str, Any]:
+        return {
+            name: json.loads(value)
+            for name, value in self._conn.execute("SELECT name, value FROM meta")
+        }
+
+    def count(self, key: Optional[str] = None) -> int:
+        if key is None:
+            row = self._conn.execute("SELECT COUNT(*) FROM events").fetchone()
+        else:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM events WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def count_range(
+        self, start_ts: float, end_ts: float, key: Optional[str] = None
+    ) -> int:
+        """Number of events get_range() pages through"""
+        if key is None:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM events WHERE ts >= ? AND ts < ?",
+                (start_ts, end_ts),
+            ).fetchone()
+        else:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM events WHERE key = ? AND ts >= ? AND ts < ?",
+                (key, start_ts, end_ts),
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_events(
+        self, key: str, offset: int = 0, limit: int = 50
+    ) -> list[dict[str, Any]]:
+        """Events of one group in insertion order"""
+        cursor = self._conn.execute(
+            "SELECT data FROM events WHERE key = ? ORDER BY rowid LIMIT ? OFFSET ?",
+            (key, limit, offset),
+        )
+        return [json.loads(data) for (data,) in cursor]
+
+    def get_range(
+        self,
+        start_ts: float,
+        end_ts: float,
+        key: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50,
+    ) -> list[dict[str, Any]]:
+        """Events with start_ts <= ts < end_ts, optionally restricted to one group"""
+        if key is None:
+            cursor = self._conn.execute(
+                "SELECT data FROM events WHERE ts >= ? AND ts < ? "
+                "ORDER BY ts LIMIT ? OFFSET ?",
+                (start_ts, end_ts, limit, offset),
+            )
+        else:
+            cursor = self._conn.execute(
+                "SELECT data FROM events WHERE key = ? AND ts >= ? AND ts < ? "
+                "ORDER BY ts LIMIT ? OFFSET ?",
+                (key, start_ts, end_ts, limit, offset),
+            )
+        return [json.loads(data) for (data,) in cursor]
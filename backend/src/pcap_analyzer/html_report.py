@@ -0,0 +1,218 @@
+"""
+HTML Report - Streaming renderer for saved analysis reports
+
+Sections are written straight to a file handle as they are rendered, so
+memory stays bounded and time linear in the number of rows. Tables are cut
+at MAX_REPORT_TABLE_ROWS and split into pages of REPORT_PAGE_SIZE rows with
+anchor links between them; the complete data is in the JSON report.
+"""
+
+from __future__ import annotations
+import datetime
+from html import escape
+from string import Template
+from typing import Any, Iterable, Sequence, TextIO
+
+MAX_REPORT_TABLE_ROWS = 10_000
+REPORT_PAGE_SIZE = 500
+
+HEAD_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>NetLens Analysis Report - $analysis_type</title>
+    <style>
+        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; line-height: 1.6; color: #333; max-width: 1200px; margin: 0 auto; padding: 20px; }
+        h1 { color: #1e40af; border-bottom: 2px solid #e2e8f0; padding-bottom: 10px; }
+        h2 { color: #1e3a8a; margin-top: 30px; }
+        .meta { color: #64748b; font-size: 0.9em; margin-bottom: 30px; }
+        .card { background: #f8fafc; border: 1px solid #e2e8f0; border-radius: 8px; padding: 20px; margin-bottom: 20px; }
+        .stat-grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 20px; }
+        .stat-item { background: white; padding: 15px; border-radius: 6px; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }
+        .stat-label { color: #64748b; font-size: 0.85em; display: block; }
+        .stat-value { color: #0f172a; font-size: 1.5em; font-weight: bold; }
+        table { width: 100%; border-collapse: collapse; margin-top: 10px; background: white; }
+        th, td { padding: 12px; text-align: left; border-bottom: 1px solid #e2e8f0; }
+        th { background: #f1f5f9; color: #475569; font-weight: 600; }
+        tr:hover { background: #f8fafc; }
+        tbody.page-start tr:first-child td { border-top: 2px solid #cbd5e1; }
+        .badge { padding: 2px 8px; border-radius: 4px; font-size: 0.85em; font-weight: 500; }
+        .badge-red { background: #fee2e2; color: #991b1b; }
+        .badge-green { background: #dcfce7; color: #166534; }
+        .badge-blue { background: #dbeafe; color: #1e40af; }
+        .pager { font-size: 0.85em; color: #64748b; }
+        .pager a { margin-right: 6px; }
+        .truncated { color: #64748b; font-size: 0.85em; }
+    </style>
+</head>
+<body>
+    <h1>NetLens Analysis Report</h1>
+    <div class="meta">
+        <p><strong>File:</strong> $filename</p>
+        <p><strong>Type:</strong> $analysis_type</p>
+        <p><strong>Generated:</strong> $timestamp</p>
+    </div>
+""")
+
+TAIL = """</body>
+</html>
+"""
+
+
+def _write_table(
+    out: TextIO,
+    table_id: str,
+    title: str,
+    headers: Sequence[str],
+    rows: Iterable[str],
+    total: int,
+) -> None:
+    """
+    Write a card with a paged table. `rows` yields ready-made <tr> markup
+    and is consumed lazily, only up to the row cap.
+    """
+    shown = min(total, MAX_REPORT_TABLE_ROWS)
+    pages = max(1, -(-shown // REPORT_PAGE_SIZE))
+
+    out.write(f'<div class="card" id="{table_id}">\n<h2>{escape(title)}</h2>\n')
+    if pages > 1:
+        out.write('<div class="pager">Pages: ')
+        for page in range(1, pages + 1):
+            out.write(f'<a href="#{table_id}-p{page}">{page}</a>')
+        out.write("</div>\n")
+
+    out.write("<table>\n<thead><tr>")
+    out.write("".join(f"<th>{escape(h)}</th>" for h in headers))
+    out.write("</tr></thead>\n")
+
+    written = 0
+    for row in rows:
+        if written >= shown:
+            break
+        if written % REPORT_PAGE_SIZE == 0:
+            if written:
+                out.write("</tbody>\n")
+            page = written // REPORT_PAGE_SIZE + 1
+            out.write(f'<tbody id="{table_id}-p{page}" class="page-start">\n')
+        out.write(row)
+        written += 1
+    if written:
+        out.write("</tbody>\n")
+    out.write("</table>\n")
+
+    if total > shown:
+        out.write(
+            f'<p class="truncated">Showing the first {shown:,} of {total:,} rows;'
+            " the JSON report has all of them.</p>\n"
+        )
+    out.write("</div>\n")
+
+
+def _summary(out: TextIO, data: dict[str, Any]) -> None:
+    summary = data.get("summary", {})
+    protocols = data.get("protocols", [])
+
+    out.write(f"""<div class="card">
+    <h2>Summary Overview</h2>
+    <div class="stat-grid">
+        <div class="stat-item">
+            <span class="stat-label">Total Packets</span>
+            <span class="stat-value">{summary.get("total_packets", 0):,}</span>
+        </div>
+        <div class="stat-item">
+            <span class="stat-label">Total Bytes</span>
+            <span class="stat-value">{summary.get("total_bytes", 0):,}</span>
+        </div>
+        <div class="stat-item">
+            <span class="stat-label">Duration</span>
+            <span class="stat-value">{summary.get("duration_seconds", 0)}s</span>
+        </div>
+    </div>
+</div>
+""")
+
+    rows = (
+        f"<tr><td>{escape(str(p.get('name')))}</td><td>{p.get('count')}</td>"
+        f"<td>{p.get('percentage')}%</td></tr>\n"
+        for p in protocols
+    )
+    _write_table(
+        out,
+        "protocols",
+        "Protocol Distribution",
+        ["Protocol", "Count", "Percentage"],
+        rows,
+        len(protocols),
+    )
+
+
+def _security(out: TextIO, data: dict[str, Any]) -> None:
+    alerts = data.get("security_alerts", [])
+
+    def rows() -> Iterable[str]:
+        for alert in alerts:
+            severity = alert.get("severity", "Low")
+            badge_class = "badge-red" if severity == "High" else "badge-blue"
+            yield (
+                f'<tr><td><span class="badge {badge_class}">{escape(severity)}</span></td>'
+                f"<td>{escape(str(alert.get('alert_type')))}</td>"
+                f"<td>{escape(str(alert.get('source_ip')))}</td>"
+                f"<td>{escape(str(alert.get('description')))}</td></tr>\n"
+            )
+
+    _write_table(
+        out,
+        "alerts",
+        f"Security Alerts ({len(alerts)})",
+        ["Severity", "Type", "Source", "Description"],
+        rows(),
+        len(alerts),
+    )
+
+
+def _tcp_anomalies(out: TextIO, data: dict[str, Any]) -> None:
+    sessions = data.get("anomalous_sessions", [])
+
+    def rows() -> Iterable[str]:
+        for s in sessions:
+            issues = ", ".join(
+                f"{k}: {v}" for k, v in s.get("anomaly_summary", {}).items()
+            )
+            yield (
+                f"<tr><td>Stream #{escape(str(s.get('stream_id')))}</td>"
+                f"<td>{escape(str(s.get('src')))}</td>"
+                f"<td>{escape(str(s.get('dst')))}</td>"
+                f'<td><span class="badge badge-red">{escape(issues)}</span></td></tr>\n'
+            )
+
+    _write_table(
+        out,
+        "anomalies",
+        f"TCP Anomalies ({len(sessions)} Sessions)",
+        ["Stream", "Source", "Destination", "Issues"],
+        rows(),
+        len(sessions),
+    )
+
+
+SECTIONS = {
+    "pcap_summary": _summary,
+    "security_scan": _security,
+    "tcp_anomalies": _tcp_anomalies,
+}
+
+
+def write_html_report(
+    out: TextIO, filename: str, analysis_type: str, data: dict[str, Any]
+) -> None:
+    out.write(
+        HEAD_TEMPLATE.substitute(
+            analysis_type=escape(analysis_type),
+            filename=escape(filename),
+            timestamp=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        )
+    )
+    section = SECTIONS.get(analysis_type)
+    if section:
+        section(out, data)
+    out.write(TAIL)
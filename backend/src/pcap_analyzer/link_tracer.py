@@ -10,11 +10,28 @@ Correlates TCP sessions across NAT/Firewall/Load Balancer hops using:
 from __future__ import annotations
 import hashlib
 import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
-from dataclasses import dataclass, field, asdict
-from typing import Any, Optional
+from dataclasses import dataclass, field, fields as dataclass_fields, asdict
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from .parallel import map_processes
 from .tshark import tshark
 
+# Leading packet sizes compared by the size sequence similarity
+SIZE_COMPARE_PACKETS = 10
+
+# Correlation headers looked for in the first data segment of each direction
+CORRELATION_HEADER_RE = re.compile(
+    r"(x-request-id|x-correlation-id|x-trace-id|x-forwarded-for|x-real-ip)"
+    r":\s*([^\r\n]+)",
+    re.IGNORECASE,
+)
+
 
 @dataclass
 class PacketInfo:
@@ -94,6 +111,44 @@ class SessionChain:
     latency_ms: float = 0.0
 
 
+def _stream_set(session_ids: Iterable[str]) -> str:
+    """Display filter set of TCP stream ids, consecutive ids as ranges"""
+    ids = sorted({int(i) for i in session_ids})
+    parts = []
+    start = prev = None
+    for i in ids + [None]:
+        if start is not None and i == prev + 1:
+            prev = i
+            continue
+        if start is not None:
+            parts.append(str(start) if start == prev else f"{start}..{prev}")
+        start = prev = i
+    return "{" + " ".join(parts) + "}"
+
+
+def _pack_sessions(sessions: list[SessionInfo]) -> dict[str, Any]:
+    """Sessions as columns, numeric ones as arrays, to hand them between processes"""
+    columns: dict[str, Any] = {}
+    for f in dataclass_fields(SessionInfo):
+        values = [getattr(s, f.name) for s in sessions]
+        if f.type == "int":
+            values = array("q", values)
+        elif f.type == "float":
+            values = array("d", values)
+        columns[f.name] = values
+    return columns
+
+
+def _unpack_sessions(columns: dict[str, Any]) -> list[SessionInfo]:
+    names = list(columns)
+    return [SessionInfo(**dict(zip(names, row))) for row in zip(*columns.values())]
+
+
+def _extract_session_columns(filepath: str, file_tag: str) -> dict[str, Any]:
+    # Process pool entry point
+    return _pack_sessions(LinkTracer()._extract_sessions(filepath, file_tag))
+
+
 class LinkTracer:
     """
     Correlates multi-hop TCP sessions within PCAP files.
@@ -109,17 +164,25 @@ class LinkTracer:
     TIME_WINDOW = 0.5
     # Minimum confidence threshold
     MIN_CONFIDENCE = 0.6
+    # Headers carrying a request id shared by all hops
+    CORRELATION_HEADERS = ["x-request-id", "x-correlation-id", "x-trace-id"]
 
     def __init__(self):
         self.sessions: dict[str, SessionInfo] = {}
         self.chain_counter = 0
 
     def _extract_sessions(self, filepath: str, file_tag: str = "") -> list[SessionInfo]:
-        """Extract TCP session metadata from PCAP file"""
+        """
+        Extract TCP session metadata from PCAP file.
+
+        A single pass collects the session basics, the payload fingerprint
+        and the correlation headers. Payloads are only decoded until the
+        fingerprint is taken and for the first data segment of each
+        direction, where the headers of a request or response are.
+        """
         if not tshark.is_available():
             return []
 
-        # First pass: Get session basics
         fields = [
             "tcp.stream",
             "ip.src",
@@ -129,9 +192,12 @@ class LinkTracer:
             "frame.time_epoch",
             "frame.len",
             "tcp.payload",
+            "http.x_forwarded_for",
         ]
 
         sessions: dict[str, SessionInfo] = {}
+        # Directions (is_forward) whose first data segment was searched
+        searched: dict[str, set[bool]] = defaultdict(set)
 
         try:
             for row in tshark.stream_fields(filepath, fields, display_filter="tcp"):
@@ -151,6 +217,7 @@ class LinkTracer:
 
                 session = sessions[stream_id]
                 session.packet_count += 1
+                is_forward = row.get("ip.src", "") == session.src_ip
 
                 frame_len = int(row.get("frame.len", 0))
                 session.byte_count += frame_len
@@ -164,9 +231,6 @@ class LinkTracer:
                     if ts > session.end_time:
                         session.end_time = ts
 
-                    pkt_src_ip = row.get("ip.src", "")
-                    is_forward = pkt_src_ip == session.src_ip
-
                     if is_forward:
                         session.forward_packets += 1
                         session.forward_bytes += frame_len
@@ -184,84 +248,40 @@ class LinkTracer:
                 except (ValueError, TypeError):
                     pass
 
-                # Payload fingerprint (hash first N bytes of first packet with payload)
-                if not session.payload_fingerprint:
-                    payload_hex = row.get("tcp.payload", "")
-                    if payload_hex:
-                        try:
-                            payload_bytes = bytes.fromhex(payload_hex.replace(":", ""))
-                            if len(payload_bytes) >= 8:  # Minimum payload size
-                                fingerprint_data = payload_bytes[
-                                    : self.FINGERPRINT_SIZE
-                                ]
-                                session.payload_fingerprint = hashlib.md5(
-                                    fingerprint_data
-                                ).hexdigest()[:16]
-                        except Exception:
-                            pass
-
-        except Exception as e:
-            print(f"Error extracting sessions: {e}")
-
-        # Second pass: Extract HTTP headers for correlation
-        self._extract_http_headers(filepath, sessions)
-
-        return list(sessions.values())
-
-    def _extract_http_headers(
-        self, filepath: str, sessions: dict[str, SessionInfo]
-    ) -> None:
-        """Extract HTTP correlation headers from sessions"""
-        http_fields = [
-            "tcp.stream",
-            "http.request.line",
-            "http.x_forwarded_for",
-        ]
-
-        # Custom headers we look for
-        correlation_headers = [
-            "x-request-id",
-            "x-correlation-id",
-            "x-trace-id",
-            "x-forwarded-for",
-            "x-real-ip",
-        ]
-
-        try:
-            # Use raw packet data to find headers
-            for row in tshark.stream_fields(
-                filepath, http_fields + ["tcp.payload"], display_filter="http"
-            ):
-                stream_id = row.get("tcp.stream")
-                if not stream_id or stream_id not in sessions:
-                    continue
-
-                session = sessions[stream_id]
-
-                # Parse X-Forwarded-For
                 xff = row.get("http.x_forwarded_for")
                 if xff:
-                    session.http_headers["x-forwarded-for"] = xff
+                    session.http_headers.setdefault("x-forwarded-for", xff)
 
-                # Parse payload for other headers
                 payload_hex = row.get("tcp.payload", "")
-                if payload_hex:
-                    try:
-                        payload = bytes.fromhex(payload_hex.replace(":", "")).decode(
-                            "utf-8", errors="ignore"
+                search_headers = is_forward not in searched[stream_id]
+                if not payload_hex or (
+                    session.payload_fingerprint and not search_headers
+                ):
+                    continue
+                try:
+                    payload_bytes = bytes.fromhex(payload_hex.replace(":", ""))
+                except ValueError:
+                    continue
+
+                # Payload fingerprint (hash first N bytes of first packet with payload)
+                if not session.payload_fingerprint and len(payload_bytes) >= 8:
+                    fingerprint_data = payload_bytes[: self.FINGERPRINT_SIZE]
+                    session.payload_fingerprint = hashlib.md5(
+                        fingerprint_data
+                    ).hexdigest()[:16]
+
+                if search_headers:
+                    searched[stream_id].add(is_forward)
+                    payload = payload_bytes.decode("utf-8", errors="ignore")
+                    for match in CORRELATION_HEADER_RE.finditer(payload):
+                        session.http_headers.setdefault(
+                            match.group(1).lower(), match.group(2).strip()
                         )
-                        for header in correlation_headers:
-                            pattern = rf"{header}:\s*([^\r\n]+)"
-                            match = re.search(pattern, payload, re.IGNORECASE)
-                            if match:
-                                session.http_headers[header.lower()] = match.group(
-                                    1
-                                ).strip()
-                    except Exception:
-                        pass
 
         except Exception as e:
-            print(f"Error extracting HTTP headers: {e}")
+            print(f"Error extracting sessions: {e}", file=sys.stderr)
+
+        return list(sessions.values())
 
     def _parse_tcp_flags(self, flags_value: str) -> str:
         """Convert tshark tcp.flags hex value to readable string"""
@@ -296,10 +316,22 @@ class LinkTracer:
         direction: str,
     ) -> list[PacketInfo]:
         """Extract packet details for a specific hop (session + direction)"""
-        if not tshark.is_available():
-            return []
+        packets = self._extract_sessions_packets(filepath, {session_id: src_ip})
+        return packets.get((session_id, direction), [])
+
+    def _extract_sessions_packets(
+        self, filepath: str, sessions: dict[str, str]
+    ) -> dict[tuple[str, str], list[PacketInfo]]:
+        """
+        Packet details of several sessions in a single pass, by (session id,
+        direction). `sessions` maps session ids to their client IP, packets
+        from it are the request direction.
+        """
+        if not tshark.is_available() or not sessions:
+            return {}
 
         fields = [
+            "tcp.stream",
             "frame.number",
             "frame.time_epoch",
             "frame.len",
@@ -317,33 +349,30 @@ class LinkTracer:
             "tcp.analysis.retransmission",
         ]
 
-        packets: list[PacketInfo] = []
-        first_time: float = 0.0
-        seq_counter = 0
+        packets: dict[tuple[str, str], list[PacketInfo]] = defaultdict(list)
+        first_times: dict[tuple[str, str], float] = {}
 
         try:
-            display_filter = f"tcp.stream eq {session_id}"
+            display_filter = f"tcp.stream in {_stream_set(sessions)}"
             for row in tshark.stream_fields(
                 filepath, fields, display_filter=display_filter
             ):
-                pkt_src_ip = row.get("ip.src", "")
-                is_forward = pkt_src_ip == src_ip
-
-                if (direction == "request" and not is_forward) or (
-                    direction == "response" and is_forward
-                ):
+                session_id = row.get("tcp.stream", "")
+                if session_id not in sessions:
                     continue
+                is_forward = row.get("ip.src", "") == sessions[session_id]
+                key = (session_id, "request" if is_forward else "response")
 
-                seq_counter += 1
+                hop_packets = packets[key]
                 time_epoch = float(row.get("frame.time_epoch", 0))
-                if first_time == 0:
-                    first_time = time_epoch
+                if not first_times.get(key):
+                    first_times[key] = time_epoch
 
                 pkt = PacketInfo(
-                    seq=seq_counter,
+                    seq=len(hop_packets) + 1,
                     frame_number=int(row.get("frame.number", 0)),
                     time_epoch=time_epoch,
-                    relative_time_ms=round((time_epoch - first_time) * 1000, 3),
+                    relative_time_ms=round((time_epoch - first_times[key]) * 1000, 3),
                     size=int(row.get("frame.len", 0)),
                     src_port=int(row.get("tcp.srcport", 0)),
                     dst_port=int(row.get("tcp.dstport", 0)),
@@ -357,16 +386,41 @@ class LinkTracer:
                     info=row.get("_ws.col.Info", ""),
                     is_retransmission=row.get("tcp.analysis.retransmission", "") != "",
                 )
-                packets.append(pkt)
+                hop_packets.append(pkt)
         except Exception as e:
-            print(f"Error extracting hop packets: {e}")
+            print(f"Error extracting hop packets: {e}", file=sys.stderr)
 
         return packets
 
+    def _proxy_confidence(self, s1: SessionInfo, s2: SessionInfo) -> float:
+        """Confidence that s2 is the next hop of s1, 0 if the pair doesn't fit"""
+        if s1.src_ip == s2.src_ip and s1.dst_ip == s2.dst_ip:
+            return 0.0
+        is_direct_proxy = s1.dst_ip == s2.src_ip
+        is_port_preserved = s1.src_port == s2.src_port and s1.src_ip != s2.src_ip
+        is_same_vip = s1.dst_ip == s2.dst_ip and s1.src_ip != s2.src_ip
+
+        if is_direct_proxy:
+            return 0.90
+        elif is_port_preserved and is_same_vip:
+            return 0.85
+        elif is_port_preserved or is_same_vip:
+            return 0.75
+        return 0.0
+
     def _match_by_payload_fingerprint(
         self, sessions: list[SessionInfo]
     ) -> list[tuple[SessionInfo, SessionInfo, float]]:
-        """Match sessions by payload fingerprint with proxy pattern validation"""
+        """
+        Match sessions by payload fingerprint with proxy pattern validation.
+
+        Rather than every valid pair of a fingerprint group, only the pairs
+        that join two groups of sessions not connected yet are returned, so
+        the groups stay the same with a linear number of edges. Sessions are
+        taken in start time order and looked up through the keys the
+        patterns compare (previous hop's destination, source port,
+        destination VIP).
+        """
         matches = []
         fingerprint_index: dict[str, list[SessionInfo]] = defaultdict(list)
 
@@ -374,39 +428,145 @@ class LinkTracer:
             if session.payload_fingerprint:
                 fingerprint_index[session.payload_fingerprint].append(session)
 
-        for fingerprint, group in fingerprint_index.items():
-            if len(group) >= 2:
-                group.sort(key=lambda s: s.start_time)
-                for i in range(len(group) - 1):
-                    for j in range(i + 1, len(group)):
-                        s1, s2 = group[i], group[j]
+        # A pattern only pairs sessions differing in `part`
+        def source(s: SessionInfo) -> str:
+            return s.src_ip
+
+        def endpoints(s: SessionInfo) -> tuple[str, str]:
+            return s.src_ip, s.dst_ip
+
+        for group in fingerprint_index.values():
+            if len(group) < 2:
+                continue
+            group.sort(key=lambda s: s.start_time)
+            parent = list(range(len(group)))
+
+            def find(i: int) -> int:
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+
+            # Per key, the connected sessions seen so far as [latest, latest
+            # one differing from it in `part` or None]: whether a group has
+            # a member differing from a new session within the time window
+            # only depends on these two. Entries without the second one are
+            # kept by part, so sessions that can't pair don't rescan them.
+            Entry = tuple[int, Optional[int]]
+            Slot = tuple[list[Entry], dict[Any, list[Entry]]]
+
+            def combine(a: Entry | None, b: Entry, part) -> Entry:
+                if a is None:
+                    return b
+                latest = max(a[0], b[0])
+                differing = [
+                    i
+                    for i in a + b
+                    if i is not None and part(group[i]) != part(group[latest])
+                ]
+                return latest, max(differing, default=None)
+
+            def add(slot: Slot, entry: Entry, part) -> None:
+                if entry[1] is None:
+                    slot[1].setdefault(part(group[entry[0]]), []).append(entry)
+                else:
+                    slot[0].append(entry)
+
+            indexes: list[dict[Any, Slot]] = [{}, {}, {}]
+            patterns = [
+                # Previous hop sent to this session's source
+                (lambda s: s.src_ip, lambda s: s.dst_ip, endpoints),
+                (lambda s: s.src_port, lambda s: s.src_port, source),
+                (lambda s: s.dst_ip, lambda s: s.dst_ip, source),
+            ]
 
-                        if s1.src_ip == s2.src_ip and s1.dst_ip == s2.dst_ip:
-                            continue
+            for j, session in enumerate(group):
 
-                        time_diff = abs(s2.start_time - s1.start_time)
-                        if time_diff > self.TIME_WINDOW * 2:
-                            continue
+                def stale(i: int) -> bool:
+                    return (
+                        session.start_time - group[i].start_time > self.TIME_WINDOW * 2
+                    )
 
-                        is_direct_proxy = s1.dst_ip == s2.src_ip
-                        is_port_preserved = (
-                            s1.src_port == s2.src_port and s1.src_ip != s2.src_ip
+                for index, (lookup, remember, part) in zip(indexes, patterns):
+                    own = part(session)
+                    linked: Entry | None = None
+                    slot = index.get(lookup(session))
+                    if slot:
+                        mixed, single = slot
+                        entries = mixed + [
+                            entry
+                            for key in [k for k in single if k != own]
+                            for entry in single.pop(key)
+                        ]
+                        mixed.clear()
+                        for latest, differing in entries:
+                            if stale(latest):
+                                continue
+                            other = latest if part(group[latest]) != own else differing
+                            if other is None or stale(other):
+                                # Only members like this session are left
+                                add(slot, (latest, None), part)
+                                continue
+                            linked = combine(linked, (latest, differing), part)
+                            a, b = find(other), find(j)
+                            if a != b:
+                                parent[a] = b
+                                matches.append(
+                                    (
+                                        group[other],
+                                        session,
+                                        self._proxy_confidence(group[other], session),
+                                    )
+                                )
+
+                    key = remember(session)
+                    if key == lookup(session):
+                        add(
+                            index.setdefault(key, ([], {})),
+                            combine(linked, (j, None), part),
+                            part,
                         )
-                        is_same_vip = s1.dst_ip == s2.dst_ip and s1.src_ip != s2.src_ip
+                    else:
+                        if linked is not None:
+                            add(slot, linked, part)
+                        add(index.setdefault(key, ([], {})), (j, None), part)
 
-                        if is_direct_proxy:
-                            matches.append((s1, s2, 0.90))
-                        elif is_port_preserved and is_same_vip:
-                            matches.append((s1, s2, 0.85))
-                        elif is_port_preserved or is_same_vip:
-                            matches.append((s1, s2, 0.75))
+        return matches
 
+    def _spanned_pair_matches(
+        self, s1: SessionInfo, s2: SessionInfo
+    ) -> list[tuple[float, str]]:
+        """
+        Matches of a pair of sessions (s1 first) by the fingerprint and header
+        matchers, which only return the pairs connecting their groups
+        """
+        if s1.file_source != s2.file_source or s1.session_id == s2.session_id:
+            return []
+        matches = []
+        if (
+            s1.payload_fingerprint
+            and s1.payload_fingerprint == s2.payload_fingerprint
+            and (s1.src_ip, s1.dst_ip) != (s2.src_ip, s2.dst_ip)
+            and abs(s2.start_time - s1.start_time) <= self.TIME_WINDOW * 2
+        ):
+            confidence = self._proxy_confidence(s1, s2)
+            if confidence:
+                matches.append((confidence, "payload_fingerprint"))
+        if any(
+            s1.http_headers.get(header)
+            and s1.http_headers.get(header) == s2.http_headers.get(header)
+            for header in self.CORRELATION_HEADERS
+        ):
+            matches.append((0.95, "http_header"))
         return matches
 
     def _match_by_http_headers(
         self, sessions: list[SessionInfo]
     ) -> list[tuple[SessionInfo, SessionInfo, float]]:
-        """Match sessions by HTTP correlation headers"""
+        """
+        Match sessions by HTTP correlation headers. Sessions sharing a header
+        value are linked in start time order, one edge per session.
+        """
         matches = []
 
         # Index by each correlation header
@@ -416,11 +576,7 @@ class LinkTracer:
 
         for session in sessions:
             for header, value in session.http_headers.items():
-                if value and header in [
-                    "x-request-id",
-                    "x-correlation-id",
-                    "x-trace-id",
-                ]:
+                if value and header in self.CORRELATION_HEADERS:
                     header_indices[header][value].append(session)
 
         # Find matches
@@ -428,109 +584,159 @@ class LinkTracer:
             for value, group in value_index.items():
                 if len(group) >= 2:
                     group.sort(key=lambda s: s.start_time)
-                    for i in range(len(group) - 1):
-                        for j in range(i + 1, len(group)):
-                            if group[i].session_id != group[j].session_id:
-                                matches.append((group[i], group[j], 0.95))
+                    for s1, s2 in zip(group, group[1:]):
+                        if s1.session_id != s2.session_id:
+                            matches.append((s1, s2, 0.95))
 
         # Match by X-Forwarded-For (Client IP appears in downstream request)
+        by_source: dict[str, list[tuple[float, int]]] = defaultdict(list)
+        for i, session in enumerate(sessions):
+            by_source[session.src_ip].append((session.start_time, i))
+        for entries in by_source.values():
+            entries.sort()
+        slack = self.TIME_WINDOW + 1e-6
+
         for session in sessions:
             xff = session.http_headers.get("x-forwarded-for", "")
             if xff:
-                client_ips = [ip.strip() for ip in xff.split(",")]
-                for other in sessions:
+                client_ips = {ip.strip() for ip in xff.split(",")}
+                # Sessions from a client IP around this one, the exact
+                # time check below decides
+                candidates = []
+                for ip in client_ips:
+                    entries = by_source.get(ip, [])
+                    lo = bisect_left(entries, (session.start_time - slack,))
+                    hi = bisect_right(
+                        entries, (session.start_time + slack, len(sessions))
+                    )
+                    candidates.extend(i for _, i in entries[lo:hi])
+
+                for i in sorted(candidates):
+                    other = sessions[i]
                     if other.session_id != session.session_id:
-                        if other.src_ip in client_ips:
-                            # Time check: other session should be slightly before this one
-                            if (
-                                abs(other.start_time - session.start_time)
-                                < self.TIME_WINDOW
-                            ):
-                                matches.append((other, session, 0.90))
+                        # Time check: other session should be slightly before this one
+                        if (
+                            abs(other.start_time - session.start_time)
+                            < self.TIME_WINDOW
+                        ):
+                            matches.append((other, session, 0.90))
 
         return matches
 
     def _match_by_timing_and_size(
         self, sessions: list[SessionInfo]
     ) -> list[tuple[SessionInfo, SessionInfo, float]]:
-        """Match sessions by timing proximity and packet size patterns"""
+        """
+        Match sessions by timing proximity and packet size patterns.
+
+        A session s2 starting within TIME_WINDOW after s1 can be its next hop
+        when s1 sent to s2's source (direct proxy) or when both share source
+        port and destination from different sources (SNAT, port preserving
+        proxy). Candidates are looked up by exactly these keys and their
+        size sequences compared in one batch per session.
+        """
         matches = []
 
         # Sort by start time
         sorted_sessions = sorted(sessions, key=lambda s: s.start_time)
+        starts = [s.start_time for s in sorted_sessions]
 
-        for i, s1 in enumerate(sorted_sessions):
-            for j in range(i + 1, len(sorted_sessions)):
-                s2 = sorted_sessions[j]
+        # Positions of sessions with sizes by destination, and by source
+        # port and destination, in start time order
+        by_dst: dict[str, list[int]] = defaultdict(list)
+        by_port_dst: dict[tuple[int, str], list[int]] = defaultdict(list)
+        for pos, s in enumerate(sorted_sessions):
+            if s.packet_sizes:
+                by_dst[s.dst_ip].append(pos)
+                by_port_dst[(s.src_port, s.dst_ip)].append(pos)
 
-                # Time window check
-                time_diff = s2.start_time - s1.start_time
-                if time_diff > self.TIME_WINDOW:
-                    break  # No more candidates in time window
+        def in_range(positions: list[int], lo: int, hi: int) -> list[int]:
+            return positions[bisect_left(positions, lo) : bisect_left(positions, hi)]
 
-                if time_diff < 0.001:  # Too close, likely same session
-                    continue
+        packed = self._pack_packet_sizes(sorted_sessions)
+        found: list[tuple[int, int, float]] = []
+
+        for j, s2 in enumerate(sorted_sessions):
+            if not s2.packet_sizes:
+                continue
+            # Window widened a little, the exact check below decides
+            lo = bisect_left(starts, s2.start_time - self.TIME_WINDOW - 1e-6)
+            hi = bisect_right(starts, s2.start_time - 0.001 + 1e-6)
+            if lo >= hi:
+                continue
+
+            candidates = set(in_range(by_dst.get(s2.src_ip, []), lo, hi))
+            candidates.update(
+                i
+                for i in in_range(by_port_dst.get((s2.src_port, s2.dst_ip), []), lo, hi)
+                if sorted_sessions[i].src_ip != s2.src_ip
+            )
 
+            selected = []
+            for i in candidates:
+                s1 = sorted_sessions[i]
+                time_diff = s2.start_time - s1.start_time
+                if time_diff > self.TIME_WINDOW or time_diff < 0.001:
+                    continue
                 # Skip if same endpoints
                 if s1.src_ip == s2.src_ip and s1.dst_ip == s2.dst_ip:
                     continue
+                selected.append(i)
+            if not selected:
+                continue
 
-                # Check if IPs/ports suggest a valid proxy relationship
-                # Scenario 1: Direct proxy chain (s1.dst_ip == s2.src_ip)
-                # Scenario 2: F5/NAT SNAT pattern - source port preserved across hops
-                #   e.g., Client:21238 -> VIP, then SNAT:21238 -> Backend
-                # Scenario 3: Shared VIP - s1.dst_ip == s2.dst_ip (same destination VIP)
-                #   with source port preserved (strong indicator of same flow)
-
-                is_direct_proxy = s1.dst_ip == s2.src_ip
-
-                # F5 SNAT typically preserves source port
-                # If both sessions have same source port AND go to same VIP, likely related
-                is_snat_pattern = (
-                    s1.src_port == s2.src_port  # Same source port (SNAT preserved)
-                    and s1.dst_ip == s2.dst_ip  # Same destination VIP
-                    and s1.src_ip
-                    != s2.src_ip  # Different source IPs (client vs SNAT IP)
-                )
-
-                # Relaxed SNAT: same source port, different source IPs,
-                # and s2.src could be a known SNAT range
-                is_port_preserved_proxy = (
-                    s1.src_port == s2.src_port  # Source port preserved
-                    and s1.src_ip != s2.src_ip  # Different sources
-                    and (
-                        s1.dst_ip == s2.dst_ip  # Same VIP
-                        or s1.dst_ip == s2.src_ip  # Direct chain
-                    )
-                )
-
-                is_proxy_pattern = (
-                    is_direct_proxy or is_snat_pattern or is_port_preserved_proxy
-                )
-
-                if not is_proxy_pattern:
-                    continue
+            # Compare packet size sequences
+            similarities = self._batch_size_similarity(packed, selected, j)
+            for i, similarity in zip(selected, similarities):
+                if similarity > 0.6:
+                    confidence = 0.5 + (
+                        similarity * 0.3
+                    )  # Base 0.5 + up to 0.3 for similarity
+                    found.append((i, j, confidence))
 
-                # Compare packet size sequences
-                if s1.packet_sizes and s2.packet_sizes:
-                    similarity = self._size_sequence_similarity(
-                        s1.packet_sizes, s2.packet_sizes
-                    )
-                    if similarity > 0.6:
-                        confidence = 0.5 + (
-                            similarity * 0.3
-                        )  # Base 0.5 + up to 0.3 for similarity
-                        matches.append((s1, s2, confidence))
+        # In order of s1, then s2
+        found.sort()
+        for i, j, confidence in found:
+            matches.append((sorted_sessions[i], sorted_sessions[j], confidence))
 
         return matches
 
+    @staticmethod
+    def _pack_packet_sizes(sessions: list[SessionInfo]) -> tuple[Any, Any]:
+        """Leading packet sizes as a fixed width matrix, and their counts"""
+        sizes = np.zeros((len(sessions), SIZE_COMPARE_PACKETS), dtype=np.int64)
+        counts = np.zeros(len(sessions), dtype=np.int64)
+        for pos, s in enumerate(sessions):
+            head = s.packet_sizes[:SIZE_COMPARE_PACKETS]
+            sizes[pos, : len(head)] = head
+            counts[pos] = len(head)
+        return sizes, counts
+
+    @staticmethod
+    def _batch_size_similarity(
+        packed: tuple[Any, Any], positions: list[int], pos: int
+    ) -> list[float]:
+        """_size_sequence_similarity of the session at pos with several others"""
+        sizes, counts = packed
+        others = np.asarray(positions)
+        a, b = sizes[others], sizes[pos]
+        n = np.minimum(counts[others], counts[pos])
+        # Allow 20% size difference or 100 bytes (header rewriting)
+        close = np.abs(a - b) <= np.maximum(100, 0.2 * np.maximum(a, b))
+        close &= np.arange(SIZE_COMPARE_PACKETS) < n[:, None]
+        matched = close.sum(axis=1)
+        return [
+            int(m) / int(k) if k >= 3 else 0.0
+            for m, k in zip(matched.tolist(), n.tolist())
+        ]
+
     def _size_sequence_similarity(self, sizes1: list[int], sizes2: list[int]) -> float:
         """Calculate similarity between two packet size sequences"""
         if not sizes1 or not sizes2:
             return 0.0
 
         # Compare first N packets
-        n = min(len(sizes1), len(sizes2), 10)
+        n = min(len(sizes1), len(sizes2), SIZE_COMPARE_PACKETS)
         if n < 3:
             return 0.0
 
@@ -560,7 +766,7 @@ class LinkTracer:
         if len(group_keys) <= 1:
             return [group_keys]
 
-        sorted_keys = sorted(group_keys, key=lambda k: session_map[k].start_time)
+        sorted_keys = sorted(group_keys, key=lambda k: (session_map[k].start_time, k))
         valid_chains: list[list[str]] = []
         current_chain: list[str] = [sorted_keys[0]]
 
@@ -618,147 +824,151 @@ class LinkTracer:
             union(key1, key2)
             match_info[(key1, key2)] = (confidence, method)
 
-        # Build groups
+        # Build groups, independent of the order of the matches
         groups: dict[str, list[str]] = defaultdict(list)
-        for key in session_map:
+        for key in sorted(session_map):
             groups[find(key)].append(key)
 
-        # Create chains - split invalid groups into valid sub-chains
-        chains = []
-        for group_keys in groups.values():
-            if len(group_keys) < 2:
-                continue
-
-            valid_sub_chains = self._split_invalid_chains(group_keys, session_map)
-
-            for sorted_keys in valid_sub_chains:
-                if len(sorted_keys) < 2:
-                    continue
-
-                total_conf = 0
-                methods_used = []
-                for i in range(len(sorted_keys) - 1):
-                    k1, k2 = sorted_keys[i], sorted_keys[i + 1]
-                    if (k1, k2) in match_info:
-                        conf, method = match_info[(k1, k2)]
-                    elif (k2, k1) in match_info:
-                        conf, method = match_info[(k2, k1)]
-                    else:
-                        conf, method = 0.5, "inferred"
-                    total_conf += conf
-                    methods_used.append(method)
-
-                avg_confidence = (
-                    total_conf / (len(sorted_keys) - 1) if len(sorted_keys) > 1 else 0.5
-                )
-                primary_method = (
-                    max(set(methods_used), key=methods_used.count)
-                    if methods_used
-                    else "unknown"
-                )
-
-                directional_hops: list[ChainHop] = []
+        def packets_file(s: SessionInfo) -> str:
+            if filepath:
+                return filepath
+            return file_mapping.get(s.file_source, "") if file_mapping else ""
+
+        # Split invalid groups into valid sub-chains
+        chain_keys = [
+            sorted_keys
+            for group_keys in groups.values()
+            if len(group_keys) >= 2
+            for sorted_keys in self._split_invalid_chains(group_keys, session_map)
+            if len(sorted_keys) >= 2
+        ]
 
+        # Packets of all chained sessions, one pass per file
+        hop_packets: dict[str, dict[tuple[str, str], list[PacketInfo]]] = {}
+        if include_packets:
+            wanted: dict[str, dict[str, str]] = defaultdict(dict)
+            for sorted_keys in chain_keys:
                 for key in sorted_keys:
                     s = session_map[key]
-                    file_path_for_packets = (
-                        filepath
-                        if filepath
-                        else (
-                            file_mapping.get(s.file_source, "") if file_mapping else ""
-                        )
-                    )
-
-                    forward_packets: list = []
-                    if (
-                        include_packets
-                        and file_path_for_packets
-                        and s.forward_packets > 0
-                    ):
-                        forward_packets = [
-                            asdict(p)
-                            for p in self._extract_hop_packets(
-                                file_path_for_packets, s.session_id, s.src_ip, "request"
-                            )
-                        ]
+                    if packets_file(s):
+                        wanted[packets_file(s)][s.session_id] = s.src_ip
+            hop_packets = {
+                path: self._extract_sessions_packets(path, sessions)
+                for path, sessions in wanted.items()
+            }
 
-                    forward_hop = ChainHop(
-                        session_id=s.session_id,
-                        src=f"{s.src_ip}:{s.src_port}",
-                        dst=f"{s.dst_ip}:{s.dst_port}",
-                        packet_count=s.forward_packets,
-                        byte_count=s.forward_bytes,
-                        duration=round(s.forward_end - s.forward_start, 3)
-                        if s.forward_packets > 0
-                        else 0.0,
-                        file=s.file_source,
-                        direction="request",
-                        start_time=s.forward_start,
-                        missing=s.forward_packets == 0,
-                        packets=forward_packets,
-                        total_packets=len(forward_packets),
-                    )
-                    directional_hops.append(forward_hop)
-
-                    backward_packets: list = []
-                    if (
-                        include_packets
-                        and file_path_for_packets
-                        and s.backward_packets > 0
-                    ):
-                        backward_packets = [
-                            asdict(p)
-                            for p in self._extract_hop_packets(
-                                file_path_for_packets,
-                                s.session_id,
-                                s.src_ip,
-                                "response",
-                            )
-                        ]
+        # Create chains
+        chains = []
+        for sorted_keys in chain_keys:
+            total_conf = 0
+            methods_used = []
+            for i in range(len(sorted_keys) - 1):
+                k1, k2 = sorted_keys[i], sorted_keys[i + 1]
+                # Hops of one group may not have been returned as a pair
+                candidates = self._spanned_pair_matches(
+                    session_map[k1], session_map[k2]
+                )
+                info = match_info.get((k1, k2)) or match_info.get((k2, k1))
+                if info:
+                    candidates.append(info)
+                conf, method = (
+                    max(candidates, key=lambda c: c[0])
+                    if candidates
+                    else (0.5, "inferred")
+                )
+                total_conf += conf
+                methods_used.append(method)
 
-                    backward_hop = ChainHop(
-                        session_id=s.session_id,
-                        src=f"{s.dst_ip}:{s.dst_port}",
-                        dst=f"{s.src_ip}:{s.src_port}",
-                        packet_count=s.backward_packets,
-                        byte_count=s.backward_bytes,
-                        duration=round(s.backward_end - s.backward_start, 3)
-                        if s.backward_packets > 0
-                        else 0.0,
-                        file=s.file_source,
-                        direction="response",
-                        start_time=s.backward_start,
-                        missing=s.backward_packets == 0,
-                        packets=backward_packets,
-                        total_packets=len(backward_packets),
-                    )
-                    directional_hops.append(backward_hop)
+            avg_confidence = (
+                total_conf / (len(sorted_keys) - 1) if len(sorted_keys) > 1 else 0.5
+            )
+            primary_method = (
+                max(set(methods_used), key=methods_used.count)
+                if methods_used
+                else "unknown"
+            )
 
-                directional_hops.sort(
-                    key=lambda h: (h.start_time if h.start_time > 0 else float("inf"))
+            directional_hops: list[ChainHop] = []
+
+            for key in sorted_keys:
+                s = session_map[key]
+                session_packets = hop_packets.get(packets_file(s), {})
+
+                forward_packets: list = []
+                if s.forward_packets > 0:
+                    forward_packets = [
+                        asdict(p)
+                        for p in session_packets.get((s.session_id, "request"), [])
+                    ]
+
+                forward_hop = ChainHop(
+                    session_id=s.session_id,
+                    src=f"{s.src_ip}:{s.src_port}",
+                    dst=f"{s.dst_ip}:{s.dst_port}",
+                    packet_count=s.forward_packets,
+                    byte_count=s.forward_bytes,
+                    duration=round(s.forward_end - s.forward_start, 3)
+                    if s.forward_packets > 0
+                    else 0.0,
+                    file=s.file_source,
+                    direction="request",
+                    start_time=s.forward_start,
+                    missing=s.forward_packets == 0,
+                    packets=forward_packets,
+                    total_packets=len(forward_packets),
+                )
+                directional_hops.append(forward_hop)
+
+                backward_packets: list = []
+                if s.backward_packets > 0:
+                    backward_packets = [
+                        asdict(p)
+                        for p in session_packets.get((s.session_id, "response"), [])
+                    ]
+
+                backward_hop = ChainHop(
+                    session_id=s.session_id,
+                    src=f"{s.dst_ip}:{s.dst_port}",
+                    dst=f"{s.src_ip}:{s.src_port}",
+                    packet_count=s.backward_packets,
+                    byte_count=s.backward_bytes,
+                    duration=round(s.backward_end - s.backward_start, 3)
+                    if s.backward_packets > 0
+                    else 0.0,
+                    file=s.file_source,
+                    direction="response",
+                    start_time=s.backward_start,
+                    missing=s.backward_packets == 0,
+                    packets=backward_packets,
+                    total_packets=len(backward_packets),
                 )
+                directional_hops.append(backward_hop)
 
-                hops = directional_hops
+            directional_hops.sort(
+                key=lambda h: h.start_time if h.start_time > 0 else float("inf")
+            )
 
-                if len(sorted_keys) >= 2:
-                    first_session = session_map[sorted_keys[0]]
-                    last_session = session_map[sorted_keys[-1]]
-                    first_time = first_session.forward_start or first_session.start_time
-                    last_time = last_session.backward_end or last_session.end_time
-                    latency_ms = (last_time - first_time) * 1000
-                else:
-                    latency_ms = 0
-
-                self.chain_counter += 1
-                chains.append(
-                    SessionChain(
-                        chain_id=f"chain_{self.chain_counter:03d}",
-                        confidence=round(avg_confidence, 2),
-                        method=primary_method,
-                        hops=hops,
-                        latency_ms=round(latency_ms, 2),
-                    )
+            hops = directional_hops
+
+            if len(sorted_keys) >= 2:
+                first_session = session_map[sorted_keys[0]]
+                last_session = session_map[sorted_keys[-1]]
+                first_time = first_session.forward_start or first_session.start_time
+                last_time = last_session.backward_end or last_session.end_time
+                latency_ms = (last_time - first_time) * 1000
+            else:
+                latency_ms = 0
+
+            self.chain_counter += 1
+            chains.append(
+                SessionChain(
+                    chain_id=f"chain_{self.chain_counter:03d}",
+                    confidence=round(avg_confidence, 2),
+                    method=primary_method,
+                    hops=hops,
+                    latency_ms=round(latency_ms, 2),
                 )
+            )
 
         # Sort by confidence
         chains.sort(key=lambda c: c.confidence, reverse=True)
@@ -841,44 +1051,62 @@ class LinkTracer:
             },
         }
 
-    def trace_multi_file(self, file1: str, file2: str) -> dict[str, Any]:
-        """
-        Correlate sessions across two PCAP files.
-        Finds matching flows between source and destination captures.
+    def _match_cross_file(
+        self, sessions1: list[SessionInfo], sessions2: list[SessionInfo]
+    ) -> list[tuple[SessionInfo, SessionInfo, float, str]]:
         """
-        self.chain_counter = 0
-
-        sessions1 = self._extract_sessions(file1, "file1")
-        sessions2 = self._extract_sessions(file2, "file2")
+        Match sessions of the first capture against the second one.
 
-        all_sessions = sessions1 + sessions2
-
-        if not all_sessions:
-            return {
-                "chains": [],
-                "unmatched_sessions": [],
-                "stats": {"total_sessions": 0, "matched_chains": 0, "methods_used": {}},
-            }
+        Only pairs sharing a payload fingerprint or a correlation header
+        value, or starting within TIME_WINDOW of each other, are compared;
+        the matches come in capture order of s1, then s2.
+        """
+        matches = []
 
-        # Run matching (cross-file prioritized)
-        all_matches = []
+        by_fingerprint: dict[str, list[int]] = defaultdict(list)
+        by_header: dict[tuple[str, str], list[int]] = defaultdict(list)
+        for j, s2 in enumerate(sessions2):
+            if s2.payload_fingerprint:
+                by_fingerprint[s2.payload_fingerprint].append(j)
+            for header in self.CORRELATION_HEADERS:
+                value = s2.http_headers.get(header)
+                if value:
+                    by_header[(header, value)].append(j)
+
+        # Sessions with sizes by start time, for the timing sweep. The window
+        # is widened a little, the exact check below decides
+        timed = sorted(
+            (s2.start_time, j) for j, s2 in enumerate(sessions2) if s2.packet_sizes
+        )
+        timed_starts = [start for start, _ in timed]
+        slack = self.TIME_WINDOW + 1e-6
 
-        # Cross-file matching
         for s1 in sessions1:
-            for s2 in sessions2:
+            candidates = set(by_fingerprint.get(s1.payload_fingerprint, ()))
+            for header in self.CORRELATION_HEADERS:
+                value = s1.http_headers.get(header)
+                if value:
+                    candidates.update(by_header.get((header, value), ()))
+            if s1.packet_sizes:
+                lo = bisect_left(timed_starts, s1.start_time - slack)
+                hi = bisect_right(timed_starts, s1.start_time + slack)
+                candidates.update(j for _, j in timed[lo:hi])
+
+            for j in sorted(candidates):
+                s2 = sessions2[j]
                 # Payload fingerprint
                 if (
                     s1.payload_fingerprint
                     and s1.payload_fingerprint == s2.payload_fingerprint
                 ):
-                    all_matches.append((s1, s2, 0.90, "payload_fingerprint"))
+                    matches.append((s1, s2, 0.90, "payload_fingerprint"))
 
                 # HTTP header matching
-                for header in ["x-request-id", "x-correlation-id", "x-trace-id"]:
+                for header in self.CORRELATION_HEADERS:
                     v1 = s1.http_headers.get(header)
                     v2 = s2.http_headers.get(header)
                     if v1 and v1 == v2:
-                        all_matches.append((s1, s2, 0.95, f"http_header:{header}"))
+                        matches.append((s1, s2, 0.95, f"http_header:{header}"))
 
                 # Timing correlation
                 time_diff = abs(s1.start_time - s2.start_time)
@@ -890,7 +1118,39 @@ class LinkTracer:
                         )
                         if sim > 0.5:
                             conf = 0.5 + (sim * 0.3)
-                            all_matches.append((s1, s2, conf, "timing_size"))
+                            matches.append((s1, s2, conf, "timing_size"))
+
+        return matches
+
+    def trace_multi_file(self, file1: str, file2: str) -> dict[str, Any]:
+        """
+        Correlate sessions across two PCAP files.
+        Finds matching flows between source and destination captures.
+        """
+        self.chain_counter = 0
+
+        # Extract both captures at once
+        sessions1, sessions2 = (
+            _unpack_sessions(columns)
+            for columns in map_processes(
+                _extract_session_columns, [(file1, "file1"), (file2, "file2")]
+            )
+        )
+
+        all_sessions = sessions1 + sessions2
+
+        if not all_sessions:
+            return {
+                "chains": [],
+                "unmatched_sessions": [],
+                "stats": {"total_sessions": 0, "matched_chains": 0, "methods_used": {}},
+            }
+
+        # Run matching (cross-file prioritized)
+        all_matches = []
+
+        # Cross-file matching
+        all_matches.extend(self._match_cross_file(sessions1, sessions2))
 
         # Also run intra-file matching
         intra_matches = []
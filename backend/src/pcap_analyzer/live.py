@@ -0,0 +1,156 @@
+"""
+Live Analysis - Sliding-window aggregates over a capture read from a pipe
+
+Packets are read from stdin (`dumpcap -w - | pcap-analyzer live -`) or any
+capture path by a single tshark process. The window is kept as a ring of
+fixed-length slices, each with its own aggregators, so memory is bounded by
+the window and expired slices are dropped whole. A snapshot of the merged
+window is emitted every time packet time crosses into a new slice.
+"""
+
+from __future__ import annotations
+import json
+import sys
+from collections import deque
+from typing import Any, Iterator, TextIO
+
+from .analyzer import (
+    MAX_TCP_SESSIONS_OUTPUT,
+    SecurityAggregator,
+    SummaryAggregator,
+    TcpAnomalyAggregator,
+)
+
+LIVE_WINDOW_SECONDS = 60.0
+LIVE_SNAPSHOT_INTERVAL = 5.0
+
+# Snapshot section -> aggregator, all fed from the same unfiltered pass
+LIVE_AGGREGATORS: dict[str, type] = {
+    "summary": SummaryAggregator,
+    "security": SecurityAggregator,
+    "tcp_anomalies": TcpAnomalyAggregator,
+}
+
+
+class SlidingWindow:
+    """Aggregates over the last `window` seconds of packet time"""
+
+    def __init__(
+        self,
+        window: float = LIVE_WINDOW_SECONDS,
+        interval: float = LIVE_SNAPSHOT_INTERVAL,
+    ):
+        if interval <= 0 or window < interval:
+            raise ValueError("Window must be at least one snapshot interval")
+        self.window = window
+        self.interval = interval
+        self.max_slices = max(1, round(window / interval))
+        # (slice index, {section: aggregator}), oldest first
+        self.slices: deque[tuple[int, dict[str, Any]]] = deque()
+        self.packets = 0
+
+    def add(self, ts: float, row: dict[str, str]) -> bool:
+        """Add one packet; returns True when it opened a new slice"""
+        index = int(ts // self.interval)
+        opened = False
+        if not self.slices or index > self.slices[-1][0]:
+            self.slices.append(
+                (index, {name: cls() for name, cls in LIVE_AGGREGATORS.items()})
+            )
+            opened = True
+            # One slice beyond the window, since the newest is still filling
+            while self.slices[0][0] < index - self.max_slices:
+                self.slices.popleft()
+
+        # Late packets count towards the newest slice
+        aggregators = self.slices[-1][1]
+        for aggregator in aggregators.values():
+            aggregator.update(row)
+        self.packets += 1
+        return opened
+
+    def snapshot(self, complete_only: bool = False) -> dict[str, Any]:
+        """
+        Merged results of the slices in the window. With complete_only the
+        newest, still filling slice is left out.
+        """
+        slices = list(self.slices)
+        if complete_only:
+            slices = slices[:-1]
+        if slices:
+            newest = slices[-1][0]
+            slices = [s for s in slices if s[0] > newest - self.max_slices]
+
+        merged = {name: cls() for name, cls in LIVE_AGGREGATORS.items()}
+        for _, aggregators in slices:
+            for name, aggregator in aggregators.items():
+                merged[name].merge(aggregator)
+
+        snapshot: dict[str, Any] = {
+            "type": "snapshot",
+            "window_start": slices[0][0] * self.interval if slices else None,
+            "window_end": (slices[-1][0] + 1) * self.interval if slices else None,
+            "window_seconds": self.window,
+            "packets_seen": self.packets,
+        }
+        for name, aggregator in merged.items():
+            result = aggregator.result()
+            snapshot[name] = result if isinstance(result, dict) else result.to_dict()
+
+        anomalies = snapshot["tcp_anomalies"]
+        anomalies["anomalous_sessions"] = anomalies["anomalous_sessions"][
+            :MAX_TCP_SESSIONS_OUTPUT
+        ]
+        return snapshot
+
+
+def stream_live(
+    source: str = "-",
+    window: float = LIVE_WINDOW_SECONDS,
+    interval: float = LIVE_SNAPSHOT_INTERVAL,
+) -> Iterator[dict[str, Any]]:
+    """
+    Yield a snapshot of the window after every completed slice, and a final
+    one (including the partial slice) when the capture ends.
+    """
+    from .tshark import tshark
+
+    if not tshark.is_available():
+        yield {"error": "Tshark not available. Please install Wireshark."}
+        return
+
+    fields = list(
+        dict.fromkeys(
+            ["frame.time_epoch"]
+            + [f for cls in LIVE_AGGREGATORS.values() for f in cls.FIELDS]
+        )
+    )
+    sliding = SlidingWindow(window, interval)
+
+    for row in tshark.stream_fields(source, fields):
+        try:
+            ts = float(row.get("frame.time_epoch") or "")
+        except ValueError:
+            continue
+        if sliding.add(ts, row) and len(sliding.slices) > 1:
+            yield sliding.snapshot(complete_only=True)
+
+    final = sliding.snapshot()
+    final["type"] = "final"
+    yield final
+
+
+def run_live(
+    source: str = "-",
+    window: float = LIVE_WINDOW_SECONDS,
+    interval: float = LIVE_SNAPSHOT_INTERVAL,
+    out: TextIO | None = None,
+) -> int:
+    """Write snapshots as NDJSON, one line per snapshot"""
+    out = out or sys.stdout
+    for snapshot in stream_live(source, window, interval):
+        out.write(json.dumps(snapshot, separators=(",", ":")) + "\n")
+        out.flush()
+        if "error" in snapshot:
+            return 1
+    return 0
@@ -1,101 +1,403 @@
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 from pcap_analyzer.analyzer import PcapAnalyzer
+from pcap_analyzer.cache import result_cache_path
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
 import json
+import os
 
 mcp = FastMCP("PCAP Analyzer")
 
+# Analyses mostly wait on their own tshark process, so a few threads are
+# enough to run independent tool calls side by side
+MAX_WORKERS = int(os.environ.get("NETLENS_MCP_WORKERS") or 4)
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="analysis")
+
+# Page size and response size budget used when the caller doesn't pass any
+DEFAULT_PAGE_LIMIT = 50
+DEFAULT_MAX_BYTES = 40_000
+
+# Result fields adding up to the real length of lists the analyzer caps or
+# samples, per paged list
+LIST_TOTALS = {
+    "tcp_sessions": ("total_sessions",),
+    "requests": ("total_requests", "total_responses"),
+    "queries": ("sampled_from",),
+}
+
+
+def progress_reporter(ctx: Context, loop: asyncio.AbstractEventLoop):
+    """
+    Analyzer progress callback sending MCP progress notifications. It runs
+    on the server loop or a worker thread, the notification is sent from the
+    server loop.
+    """
+    last = 0
+
+    def report(data: dict) -> None:
+        nonlocal last
+        if "bytes" in data:
+            progress, total = data["bytes"], data["total_bytes"]
+        else:
+            progress, total = data["count"], None
+        # Progress must not go backwards, e.g. when a second pass starts
+        progress = last = max(progress, last)
+
+        message = f"{data['message'] or 'Reading capture...'} {data['count']:,} packets"
+        if total:
+            message += f", {100 * data['bytes'] // total}% of capture"
+        if "eta_seconds" in data:
+            message += f", ETA {data['eta_seconds']:.0f}s"
+        asyncio.run_coroutine_threadsafe(
+            ctx.report_progress(progress, total, message), loop
+        )
+
+    return report
+
+
+async def run_analysis(
+    filepath: str,
+    analysis_type: str,
+    options: dict | None = None,
+    ctx: Context | None = None,
+) -> dict:
+    """
+    Run an analysis with tshark driven by the server loop, so concurrent
+    calls don't tie up a thread each; file I/O runs on the worker pool.
+    """
+    loop = asyncio.get_running_loop()
+    analyzer = PcapAnalyzer(filepath, progress_reporter(ctx, loop) if ctx else None)
+    return await analyzer.arun(analysis_type, options, executor)
+
+
+def scope_options(
+    display_filter: str | None,
+    start_time: float | None,
+    end_time: float | None,
+    host: str | None,
+) -> dict:
+    """Analyzer options for the scope parameters that were given"""
+    options = {
+        "display_filter": display_filter,
+        "start_time": start_time,
+        "end_time": end_time,
+        "host": host,
+    }
+    return {k: v for k, v in options.items() if v not in (None, "")}
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+async def _result_version(filepath: str, analysis_type: str, options: dict) -> str:
+    # Name of the result cache entry, it changes with the capture and scope.
+    # Fingerprinting reads the capture, so it runs on the worker pool.
+    loop = asyncio.get_running_loop()
+    path = await loop.run_in_executor(
+        executor, result_cache_path, filepath, analysis_type, options
+    )
+    return path.stem
+
+
+def _encode_cursor(filepath: str, analysis_type: str, version: str, offset: int) -> str:
+    cursor = {"f": filepath, "t": analysis_type, "v": version, "o": offset}
+    return base64.urlsafe_b64encode(_dumps(cursor).encode()).decode()
+
+
+def _decode_cursor(cursor: str, filepath: str, analysis_type: str, version: str) -> int:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = int(data["o"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if data.get("f") != filepath or data.get("t") != analysis_type:
+        raise ValueError("Cursor belongs to a different file or tool")
+    if data.get("v") != version:
+        raise ValueError(
+            "Cursor expired, the capture or scope changed. Start without a cursor"
+        )
+    return max(0, offset)
+
+
+async def paged_analysis(
+    filepath: str,
+    analysis_type: str,
+    list_key: str,
+    limit: int,
+    cursor: str | None,
+    max_bytes: int,
+    options: dict,
+    ctx: Context | None = None,
+) -> str:
+    """
+    Compact JSON page of an analysis result.
+
+    `list_key` is paged: at most `limit` items and, past the first one, only
+    as many as fit in `max_bytes`. The other fields come with the first page
+    only. Follow-up pages are served from the result cache. Lists the
+    analyzer caps or samples report their real length as `total_in_capture`
+    and are marked `truncated`.
+    """
+    offset = 0
+    if cursor:
+        version = await _result_version(filepath, analysis_type, options)
+        offset = _decode_cursor(cursor, filepath, analysis_type, version)
+    result = await run_analysis(filepath, analysis_type, options, ctx)
+    if "error" in result:
+        return _dumps(result)
+
+    items = result.get(list_key) or []
+    page = {} if cursor else {k: v for k, v in result.items() if k != list_key}
+    # Leave room for the page envelope
+    budget = max_bytes - len(_dumps(page).encode()) - 512
+
+    selected = []
+    for item in items[offset : offset + max(1, limit)]:
+        size = len(_dumps(item).encode()) + 1
+        if selected and size > budget:
+            break
+        selected.append(item)
+        budget -= size
+
+    end = offset + len(selected)
+    page[list_key] = selected
+    page["page"] = {
+        "offset": offset,
+        "returned": len(selected),
+        "total": len(items),
+        "next_cursor": None,
+    }
+    if list_key in LIST_TOTALS:
+        total = sum(result.get(k) or 0 for k in LIST_TOTALS[list_key])
+        page["page"]["total_in_capture"] = max(total, len(items))
+        page["page"]["truncated"] = total > len(items)
+    if end < len(items):
+        version = await _result_version(filepath, analysis_type, options)
+        page["page"]["next_cursor"] = _encode_cursor(
+            filepath, analysis_type, version, end
+        )
+    return _dumps(page)
+
 
 @mcp.tool()
-def get_pcap_summary(filepath: str) -> str:
+async def get_pcap_summary(
+    filepath: str,
+    ctx: Context,
+    limit: int = DEFAULT_PAGE_LIMIT,
+    cursor: str | None = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    display_filter: str | None = None,
+    start_time: float | None = None,
+    end_time: float | None = None,
+    host: str | None = None,
+) -> str:
     """
     Get a high-level summary of a PCAP file.
 
     Args:
         filepath: Absolute path to the .pcap or .pcapng file.
+        limit: Maximum number of timeline points to return.
+        cursor: next_cursor of the previous page, to continue the timeline.
+        max_bytes: Approximate size budget of the response.
+        display_filter: Wireshark display filter limiting the packets analyzed.
+        start_time: Only analyze packets from this many seconds into the capture.
+        end_time: Only analyze packets up to this many seconds into the capture.
+        host: Only analyze packets to or from this IP address or network.
 
     Returns:
         JSON string containing total packets, duration, protocol distribution, and top talkers.
     """
     try:
-        analyzer = PcapAnalyzer(filepath)
-        result = analyzer.analyze_summary()
-        return json.dumps(result.to_dict(), indent=2)
+        return await paged_analysis(
+            filepath,
+            "pcap_summary",
+            "timeline",
+            limit,
+            cursor,
+            max_bytes,
+            scope_options(display_filter, start_time, end_time, host),
+            ctx,
+        )
     except Exception as e:
         return f"Error analyzing file: {str(e)}"
 
 
 @mcp.tool()
-def scan_security_threats(filepath: str) -> str:
+async def scan_security_threats(
+    filepath: str,
+    ctx: Context,
+    limit: int = DEFAULT_PAGE_LIMIT,
+    cursor: str | None = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    display_filter: str | None = None,
+    start_time: float | None = None,
+    end_time: float | None = None,
+    host: str | None = None,
+) -> str:
     """
     Scan a PCAP file for security threats like SQL injection, XSS, plaintext credentials, and port scans.
 
     Args:
         filepath: Absolute path to the .pcap or .pcapng file.
+        limit: Maximum number of alerts to return.
+        cursor: next_cursor of the previous page, to continue the alerts.
+        max_bytes: Approximate size budget of the response.
+        display_filter: Wireshark display filter limiting the packets analyzed.
+        start_time: Only analyze packets from this many seconds into the capture.
+        end_time: Only analyze packets up to this many seconds into the capture.
+        host: Only analyze packets to or from this IP address or network.
 
     Returns:
         JSON string containing a list of detected alerts with severity and description.
     """
     try:
-        analyzer = PcapAnalyzer(filepath)
-        result = analyzer.analyze_security()
-        return json.dumps(result, indent=2)
+        return await paged_analysis(
+            filepath,
+            "security_scan",
+            "security_alerts",
+            limit,
+            cursor,
+            max_bytes,
+            scope_options(display_filter, start_time, end_time, host),
+            ctx,
+        )
     except Exception as e:
         return f"Error scanning file: {str(e)}"
 
 
 @mcp.tool()
-def analyze_http_traffic(filepath: str) -> str:
+async def analyze_http_traffic(
+    filepath: str,
+    ctx: Context,
+    limit: int = DEFAULT_PAGE_LIMIT,
+    cursor: str | None = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    display_filter: str | None = None,
+    start_time: float | None = None,
+    end_time: float | None = None,
+    host: str | None = None,
+) -> str:
     """
     Analyze HTTP traffic in a PCAP file.
 
     Args:
         filepath: Absolute path to the .pcap or .pcapng file.
+        limit: Maximum number of requests to return.
+        cursor: next_cursor of the previous page, to continue the requests.
+        max_bytes: Approximate size budget of the response.
+        display_filter: Wireshark display filter limiting the packets analyzed.
+        start_time: Only analyze packets from this many seconds into the capture.
+        end_time: Only analyze packets up to this many seconds into the capture.
+        host: Only analyze packets to or from this IP address or network.
 
     Returns:
         JSON string containing HTTP requests, responses, and top hosts.
+        page.truncated is set when the analysis kept only page.total of
+        page.total_in_capture items.
     """
     try:
-        analyzer = PcapAnalyzer(filepath)
-        result = analyzer.analyze_http()
-        return json.dumps(result, indent=2)
+        return await paged_analysis(
+            filepath,
+            "http_analysis",
+            "requests",
+            limit,
+            cursor,
+            max_bytes,
+            scope_options(display_filter, start_time, end_time, host),
+            ctx,
+        )
     except Exception as e:
         return f"Error analyzing HTTP: {str(e)}"
 
 
 @mcp.tool()
-def analyze_dns_queries(filepath: str) -> str:
+async def analyze_dns_queries(
+    filepath: str,
+    ctx: Context,
+    limit: int = DEFAULT_PAGE_LIMIT,
+    cursor: str | None = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    display_filter: str | None = None,
+    start_time: float | None = None,
+    end_time: float | None = None,
+    host: str | None = None,
+) -> str:
     """
     Analyze DNS queries in a PCAP file.
 
     Args:
         filepath: Absolute path to the .pcap or .pcapng file.
+        limit: Maximum number of queries to return.
+        cursor: next_cursor of the previous page, to continue the queries.
+        max_bytes: Approximate size budget of the response.
+        display_filter: Wireshark display filter limiting the packets analyzed.
+        start_time: Only analyze packets from this many seconds into the capture.
+        end_time: Only analyze packets up to this many seconds into the capture.
+        host: Only analyze packets to or from this IP address or network.
 
     Returns:
         JSON string containing DNS queries, responses, and top domains.
+        page.truncated is set when the analysis kept only page.total of
+        page.total_in_capture items.
     """
     try:
-        analyzer = PcapAnalyzer(filepath)
-        result = analyzer.analyze_dns()
-        return json.dumps(result, indent=2)
+        return await paged_analysis(
+            filepath,
+            "dns_analysis",
+            "queries",
+            limit,
+            cursor,
+            max_bytes,
+            scope_options(display_filter, start_time, end_time, host),
+            ctx,
+        )
     except Exception as e:
         return f"Error analyzing DNS: {str(e)}"
 
 
 @mcp.tool()
-def list_tcp_sessions(filepath: str) -> str:
+async def list_tcp_sessions(
+    filepath: str,
+    ctx: Context,
+    limit: int = DEFAULT_PAGE_LIMIT,
+    cursor: str | None = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    display_filter: str | None = None,
+    start_time: float | None = None,
+    end_time: float | None = None,
+    host: str | None = None,
+) -> str:
     """
     List TCP sessions with payload previews.
 
     Args:
         filepath: Absolute path to the .pcap or .pcapng file.
+        limit: Maximum number of sessions to return.
+        cursor: next_cursor of the previous page, to continue the sessions.
+        max_bytes: Approximate size budget of the response.
+        display_filter: Wireshark display filter limiting the packets analyzed.
+        start_time: Only analyze packets from this many seconds into the capture.
+        end_time: Only analyze packets up to this many seconds into the capture.
+        host: Only analyze packets to or from this IP address or network.
 
     Returns:
         JSON string containing a list of TCP sessions with source/dest IPs, ports, and payload previews.
+        page.truncated is set when the analysis kept only page.total of
+        page.total_in_capture items.
     """
     try:
-        analyzer = PcapAnalyzer(filepath)
-        result = analyzer.analyze_tcp_sessions()
-        return json.dumps(result, indent=2)
+        return await paged_analysis(
+            filepath,
+            "tcp_sessions",
+            "tcp_sessions",
+            limit,
+            cursor,
+            max_bytes,
+            scope_options(display_filter, start_time, end_time, host),
+            ctx,
+        )
     except Exception as e:
         return f"Error analyzing TCP sessions: {str(e)}"
 
@@ -1,131 +1,643 @@
+from __future__ import annotations
+from .parallel import map_processes
 from .tshark import tshark
-from collections import defaultdict
-import math
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+from itertools import chain, islice
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
 import os
+import sqlite3
+import sys
+
+# Max clock-adjusted time difference between two copies of a packet
+CORRELATION_WINDOW = 2.0
+# Packets of file A tried, and matches used, for the clock offset estimate
+OFFSET_SAMPLE_PACKETS = 100
+OFFSET_SAMPLE_MATCHES = 10
+MAX_LOST_FRAMES_OUTPUT = 100
+# correlate() returns a sample of the matches, all of them go to the match store
+MAX_MATCHES_OUTPUT = 100
+MAX_FLOWS_OUTPUT = 20
+# Time buckets of the loss timeline, at least LOSS_TIMELINE_MIN_SECONDS wide
+LOSS_TIMELINE_BUCKETS = 60
+LOSS_TIMELINE_MIN_SECONDS = 1.0
+MATCHES_PAGE_SIZE = 100
+# Leading packets of file B searched for the offset estimate when streaming
+STREAM_OFFSET_SCAN_PACKETS = 20_000
+
+SIGNATURE_FIELDS = [
+    "frame.time_epoch",
+    "tcp.seq",
+    "tcp.ack",
+    "tcp.len",
+    "tcp.dstport",
+    "frame.number",
+    "tcp.stream",
+    "ip.src",
+    "ipv6.src",
+    "tcp.srcport",
+    "ip.dst",
+    "ipv6.dst",
+]
+
+
+def _int(value: Optional[str]) -> int:
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+
+def _signature(row: dict[str, str]) -> tuple[float, int, int, int, int] | None:
+    """(ts, seq_ack, len_port, frame, stream) of a row, see SignatureTable"""
+    try:
+        ts = float(row.get("frame.time_epoch") or "")
+    except ValueError:
+        return None
+    seq = _int(row.get("tcp.seq")) & 0xFFFFFFFF
+    ack = _int(row.get("tcp.ack")) & 0xFFFFFFFF
+    len_port = _int(row.get("tcp.len")) << 16 | _int(row.get("tcp.dstport")) & 0xFFFF
+    return (
+        ts,
+        seq << 32 | ack,
+        len_port,
+        _int(row.get("frame.number")),
+        _int(row.get("tcp.stream")),
+    )
+
+
+def _flow_label(row: dict[str, str]) -> str:
+    src = row.get("ip.src") or row.get("ipv6.src") or "?"
+    dst = row.get("ip.dst") or row.get("ipv6.dst") or "?"
+    return f"{src}:{row.get('tcp.srcport') or '?'} -> {dst}:{row.get('tcp.dstport') or '?'}"
+
+
+class SignatureTable:
+    """
+    TCP packet signatures of one capture as packed columns.
+
+    A packet is matched across captures by (seq, ack, len, dst port); the
+    pairs are also kept combined as seq_ack = seq << 32 | ack and
+    len_port = len << 16 | port, which is what the index sorts on. `stream`
+    is the TCP stream of the packet in this capture, `flows` labels each one.
+    """
+
+    def __init__(self):
+        self.ts = array("d")
+        self.seq_ack = array("Q")
+        self.len_port = array("Q")
+        self.frame = array("I")
+        self.stream = array("I")
+        self.flows: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def append(self, row: dict[str, str]) -> None:
+        signature = _signature(row)
+        if signature is not None:
+            self.add(signature)
+            if signature[4] not in self.flows:
+                self.flows[signature[4]] = _flow_label(row)
+
+    def add(self, signature: tuple[float, int, int, int, int]) -> None:
+        self.ts.append(signature[0])
+        self.seq_ack.append(signature[1])
+        self.len_port.append(signature[2])
+        self.frame.append(signature[3])
+        self.stream.append(signature[4])
+
+    @classmethod
+    def from_signatures(
+        cls, signatures: Iterable[tuple[float, int, int, int, int]]
+    ) -> SignatureTable:
+        table = cls()
+        for signature in signatures:
+            table.add(signature)
+        return table
+
+
+class SignatureIndex:
+    """
+    A SignatureTable sorted by (seq_ack, len_port, ts), so the copies of a
+    signature are one contiguous, time-sorted run found by bisection.
+    Matched packets are marked rather than removed; `_left`/`_right` skip
+    over consumed positions (path-compressed), so dense runs stay cheap.
+    """
+
+    def __init__(self, table: SignatureTable):
+        seq_ack, len_port, ts = table.seq_ack, table.len_port, table.ts
+        n = len(table)
+        if all(ts[i] <= ts[i + 1] for i in range(n - 1)):
+            # Captures are normally in time order, so the packet number
+            # breaks ties and one packed int per packet is enough as key
+            order = sorted(
+                range(n), key=lambda i: (seq_ack[i] << 48 | len_port[i]) << 32 | i
+            )
+        else:
+            order = sorted(range(n), key=lambda i: (seq_ack[i], len_port[i], ts[i]))
+
+        self.seq_ack = array("Q", (seq_ack[i] for i in order))
+        self.len_port = array("Q", (len_port[i] for i in order))
+        self.ts = array("d", (ts[i] for i in order))
+        self.frame = array("I", (table.frame[i] for i in order))
+        self.used = bytearray(n)
+        self._left = array("i", range(n))
+        self._right = array("i", range(n + 1))
+
+    def run(self, seq_ack: int, len_port: int) -> tuple[int, int]:
+        """Positions [lo, hi) holding the given signature"""
+        lo = bisect_left(self.seq_ack, seq_ack)
+        hi = bisect_right(self.seq_ack, seq_ack, lo)
+        if lo == hi:
+            return lo, lo
+        return (
+            bisect_left(self.len_port, len_port, lo, hi),
+            bisect_right(self.len_port, len_port, lo, hi),
+        )
+
+    def consume(self, pos: int) -> None:
+        self.used[pos] = 1
+        self._left[pos] = pos - 1
+        self._right[pos] = pos + 1
+
+    @staticmethod
+    def _find(links: array, pos: int) -> int:
+        # Nearest unused position from pos on, in the direction of links
+        root = pos
+        while 0 <= root < len(links) and links[root] != root:
+            root = links[root]
+        while pos != root:
+            links[pos], pos = root, links[pos]
+        return root
+
+    def first_unused(self, lo: int, hi: int, skip: set[int]) -> int | None:
+        for pos in range(lo, hi):
+            if not self.used[pos] and pos not in skip:
+                return pos
+        return None
+
+    def closest(
+        self, lo: int, hi: int, ts: float, window: float = CORRELATION_WINDOW
+    ) -> int | None:
+        """Unused position in [lo, hi) closest in time to ts, within the window"""
+        mid = bisect_left(self.ts, ts, lo, hi)
+        best, best_diff = None, window
+
+        pos = self._find(self._left, mid - 1) if mid > lo else -1
+        if pos >= lo and ts - self.ts[pos] < best_diff:
+            # Of several copies with the same time, the first one
+            while pos > lo:
+                prev = self._find(self._left, pos - 1)
+                if prev < lo or self.ts[prev] != self.ts[pos]:
+                    break
+                pos = prev
+            best, best_diff = pos, ts - self.ts[pos]
+
+        pos = self._find(self._right, mid) if mid < hi else hi
+        if pos < hi and self.ts[pos] - ts < best_diff:
+            best = pos
+        return best
+
+
+def _drain(items: deque) -> Iterator:
+    # Replay buffered items, releasing each as it is consumed
+    while items:
+        yield items.popleft()
+
+
+def estimate_offset(sigs_a: SignatureTable, index_b: SignatureIndex) -> float:
+    """
+    Clock offset of B relative to A: median over the first matches, each
+    taking the earliest copy in B
+    """
+    offsets = []
+    taken: set[int] = set()
+    for i in range(min(len(sigs_a), OFFSET_SAMPLE_PACKETS)):
+        lo, hi = index_b.run(sigs_a.seq_ack[i], sigs_a.len_port[i])
+        pos = index_b.first_unused(lo, hi, taken)
+        if pos is not None:
+            taken.add(pos)
+            offsets.append(index_b.ts[pos] - sigs_a.ts[i])
+            if len(offsets) > OFFSET_SAMPLE_MATCHES:
+                break
+
+    if not offsets:
+        return 0.0
+    offsets.sort()
+    return offsets[len(offsets) // 2]  # Median
+
+
+def _extract_signatures(filepath: str) -> SignatureTable:
+    # Process pool entry point, the table pickles as its packed arrays
+    return MultiPcapAnalyzer().extract_signatures(filepath)
 
 
 class MultiPcapAnalyzer:
     def __init__(self):
         pass
 
-    def extract_signatures(self, filepath: str):
+    def _signature_rows(self, filepath: str) -> Iterator[dict[str, str]]:
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"File not found: {filepath}")
 
         # Extract Seq, Ack, Len, DstPort, Time
         # Only TCP packets with payload are reliable for correlation (SYN/ACKs might be generated by middleboxes)
         # But let's include all TCP for completeness.
-        fields = [
-            "frame.time_epoch",
-            "tcp.seq",
-            "tcp.ack",
-            "tcp.len",
-            "tcp.dstport",
-            "ip.dst",
-            "frame.number",
-        ]
+        return tshark.stream_fields(filepath, SIGNATURE_FIELDS, display_filter="tcp")
 
-        signatures = []
+    def extract_signatures(self, filepath: str) -> SignatureTable:
+        rows = self._signature_rows(filepath)
+        signatures = SignatureTable()
         try:
-            for row in tshark.stream_fields(filepath, fields, display_filter="tcp"):
-                signatures.append(
-                    {
-                        "ts": float(row.get("frame.time_epoch", 0)),
-                        "seq": row.get("tcp.seq"),
-                        "ack": row.get("tcp.ack"),
-                        "len": row.get("tcp.len", "0"),
-                        "dst_port": row.get("tcp.dstport"),
-                        "dst_ip": row.get("ip.dst"),
-                        "frame": row.get("frame.number"),
-                    }
-                )
+            for row in rows:
+                signatures.append(row)
         except Exception as e:
-            print(f"Error extracting signatures from {filepath}: {e}")
+            print(f"Error extracting signatures from {filepath}: {e}", file=sys.stderr)
 
         return signatures
 
-    def correlate(self, file_a: str, file_b: str):
-        # 1. Extract
-        sigs_a = self.extract_signatures(file_a)
-        sigs_b = self.extract_signatures(file_b)
+    def _match_store_path(
+        self, file_a: str, file_b: str, output_dir: str | None = None
+    ) -> Path:
+        path_a = Path(file_a)
+        report_dir = (
+            Path(output_dir) if output_dir else path_a.parent / "analysis_reports"
+        )
+        return report_dir / f"correlation_{path_a.name}_{Path(file_b).name}.events.db"
+
+    def _match_store_meta(self, file_a: str, file_b: str) -> dict[str, Any]:
+        stat_a, stat_b = os.stat(file_a), os.stat(file_b)
+        return {
+            "file_a": os.path.abspath(file_a),
+            "file_b": os.path.abspath(file_b),
+            "source_a_size": stat_a.st_size,
+            "source_a_mtime": stat_a.st_mtime,
+            "source_b_size": stat_b.st_size,
+            "source_b_mtime": stat_b.st_mtime,
+        }
+
+    def correlate(self, file_a: str, file_b: str, output_dir: str | None = None):
+        """
+        Match the TCP packets of capture A in capture B.
+
+        Returns latency statistics, loss by flow (TCP stream of A) and over
+        time, and a sample of the matches. Every match and loss is written
+        to an on-disk store in output_dir (default: analysis_reports next to
+        capture A), see get_correlation_matches().
+        """
+        from .event_store import EventStoreWriter
+        from .stats import LatencyHistogram
+
+        # 1. Extract, both captures at once
+        sigs_a, sigs_b = map_processes(_extract_signatures, [(file_a,), (file_b,)])
 
         # 2. Index File B
-        # Key = (Seq, Ack, Len, DstPort) -> List of packets (sorted by time)
+        # Key = (Seq, Ack, Len, DstPort), copies sorted by time
         # We include DstPort to disambiguate flows, assuming NAT preserves Dest Port (usually true for outgoing).
         # DstIP might change (DNAT), SrcIP matches definitely change (SNAT).
-        index_b = defaultdict(list)
-        for p in sigs_b:
-            key = (p["seq"], p["ack"], p["len"], p["dst_port"])
-            index_b[key].append(p)
+        index_b = SignatureIndex(sigs_b)
+
+        store: EventStoreWriter | None
+        try:
+            store = EventStoreWriter(
+                self._match_store_path(file_a, file_b, output_dir),
+                self._match_store_meta(file_a, file_b),
+            )
+        except (OSError, sqlite3.Error) as e:
+            print(f"Match store disabled: {e}", file=sys.stderr)
+            store = None
 
         # 3. Match
         matches = []
+        matched_count = 0
         lost_a = []
+        lost_count = 0
+        latency = LatencyHistogram()
+        lost_by_flow: Counter[int] = Counter()
 
-        # Time Offset Calculation
-        # We use a sliding window or RANSAC to find best offset, but here we use simple median of first 10 matches
-        offsets = []
-
-        # Temporary match to find offset
-        temp_index = {k: list(v) for k, v in index_b.items()}
-        for p_a in sigs_a[:100]:  # Look at first 100 packets
-            key = (p_a["seq"], p_a["ack"], p_a["len"], p_a["dst_port"])
-            candidates = temp_index.get(key)
-            if candidates:
-                # Assume the first one is the match for offset calculation
-                p_b = candidates.pop(0)
-                offsets.append(p_b["ts"] - p_a["ts"])
-                if len(offsets) > 10:
-                    break
+        start = min(sigs_a.ts) if sigs_a.ts else 0.0
+        span = max(sigs_a.ts) - start if sigs_a.ts else 0.0
+        bucket_seconds = max(span / LOSS_TIMELINE_BUCKETS, LOSS_TIMELINE_MIN_SECONDS)
+        last_bucket = min(int(span / bucket_seconds), LOSS_TIMELINE_BUCKETS - 1)
+        sent_over_time = [0] * (last_bucket + 1)
+        lost_over_time = [0] * len(sent_over_time)
 
-        if offsets:
-            offsets.sort()
-            time_offset = offsets[len(offsets) // 2]  # Median
-        else:
-            time_offset = 0.0
+        # Time Offset Calculation
+        time_offset = estimate_offset(sigs_a, index_b)
 
         # Real Matching
-        for p_a in sigs_a:
-            key = (p_a["seq"], p_a["ack"], p_a["len"], p_a["dst_port"])
-            candidates = index_b.get(key)
-
-            if candidates:
-                # Find the candidate closest in time (accounting for offset)
-                # Filter candidates that are plausible (e.g. +/- 5 seconds)
-                best_match = None
-                best_idx = -1
-                min_diff = float("inf")
-
-                for idx, p_b in enumerate(candidates):
-                    diff = abs(p_b["ts"] - (p_a["ts"] + time_offset))
-                    if diff < min_diff and diff < 2.0:  # 2 second window
-                        min_diff = diff
-                        best_match = p_b
-                        best_idx = idx
-
-                if best_match:
-                    matches.append(
-                        {
-                            "frame_a": p_a["frame"],
-                            "frame_b": best_match["frame"],
-                            "ts_a": p_a["ts"],
-                            "ts_b": best_match["ts"],
-                            "latency": best_match["ts"]
-                            - p_a["ts"],  # Absolute latency (clock diff included)
-                        }
-                    )
-                    # Consume the match
-                    candidates.pop(best_idx)
-                else:
-                    lost_a.append(p_a["frame"])
+        for i in range(len(sigs_a)):
+            ts_a = sigs_a.ts[i]
+            bucket = min(int((ts_a - start) / bucket_seconds), last_bucket)
+            sent_over_time[bucket] += 1
+            lo, hi = index_b.run(sigs_a.seq_ack[i], sigs_a.len_port[i])
+            # Candidate closest in time (accounting for offset) within the window
+            pos = index_b.closest(lo, hi, ts_a + time_offset) if lo < hi else None
+
+            if pos is not None:
+                # Consume the match
+                index_b.consume(pos)
+                ts_b = index_b.ts[pos]
+                matched_count += 1
+                # Absolute latency (clock diff included)
+                latency.record(ts_b - ts_a)
+                match = {
+                    "frame_a": str(sigs_a.frame[i]),
+                    "frame_b": str(index_b.frame[pos]),
+                    "ts_a": ts_a,
+                    "ts_b": ts_b,
+                    "latency": ts_b - ts_a,
+                }
+                if len(matches) < MAX_MATCHES_OUTPUT:
+                    matches.append(match)
+                if store:
+                    store.add(str(sigs_a.stream[i]), ts_a, {"type": "match", **match})
             else:
-                lost_a.append(p_a["frame"])
+                lost_count += 1
+                lost_by_flow[sigs_a.stream[i]] += 1
+                lost_over_time[bucket] += 1
+                if len(lost_a) < MAX_LOST_FRAMES_OUTPUT:
+                    lost_a.append(str(sigs_a.frame[i]))
+                if store:
+                    store.add(
+                        str(sigs_a.stream[i]),
+                        ts_a,
+                        {"type": "lost", "frame_a": str(sigs_a.frame[i]), "ts_a": ts_a},
+                    )
+
+        matches_store = None
+        if store:
+            try:
+                matches_store = str(store.commit())
+            except (OSError, sqlite3.Error) as e:
+                store.abort()
+                print(f"Error saving correlation matches: {e}", file=sys.stderr)
+
+        sent_by_flow = Counter(sigs_a.stream)
+        loss_by_flow = [
+            {
+                "flow": str(stream),
+                "label": sigs_a.flows.get(stream, ""),
+                "sent": sent_by_flow[stream],
+                "lost": lost,
+                "loss_rate": round(lost / sent_by_flow[stream], 4),
+            }
+            for stream, lost in lost_by_flow.most_common(MAX_FLOWS_OUTPUT)
+        ]
 
         return {
-            "matches": matches,
-            "lost_in_b_count": len(lost_a),
-            "lost_frames_a": lost_a[:100],  # Limit output
+            "matched_count": matched_count,
+            "matches": matches,  # Sample, see matches_store
+            "lost_in_b_count": lost_count,
+            "lost_frames_a": lost_a,  # Limit output
             "total_a": len(sigs_a),
             "total_b": len(sigs_b),
             "estimated_time_offset": time_offset,
+            "latency": {**latency.to_dict(), "histogram": latency.bins()},
+            "flows": len(sent_by_flow),
+            "flows_with_loss": len(lost_by_flow),
+            "loss_by_flow": loss_by_flow,
+            "loss_over_time": {
+                "bucket_seconds": bucket_seconds,
+                "buckets": [
+                    {"start": start + k * bucket_seconds, "sent": sent, "lost": lost}
+                    for k, (sent, lost) in enumerate(
+                        zip(sent_over_time, lost_over_time)
+                    )
+                ],
+            },
+            "matches_store": matches_store,
+        }
+
+    def get_correlation_matches(
+        self,
+        file_a: str,
+        file_b: str,
+        flow: str | None = None,
+        start_ts: float | None = None,
+        end_ts: float | None = None,
+        page: int = 1,
+        page_size: int = MATCHES_PAGE_SIZE,
+        output_dir: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        Page through the stored matches and losses of correlate(), optionally
+        of one flow and/or within start_ts <= ts_a < end_ts (epoch seconds).
+        The store is rebuilt if it is missing or a capture changed since.
+        """
+        from .event_store import EventStore
+
+        store_path = self._match_store_path(file_a, file_b, output_dir)
+
+        def is_fresh() -> bool:
+            try:
+                with EventStore(store_path) as store:
+                    meta = store.get_meta()
+            except (OSError, sqlite3.Error):
+                return False
+            expected = self._match_store_meta(file_a, file_b)
+            return all(meta.get(k) == v for k, v in expected.items())
+
+        if not is_fresh():
+            result = self.correlate(file_a, file_b, output_dir)
+            if not result.get("matches_store"):
+                return {"error": "Correlation match store unavailable"}
+
+        offset = (page - 1) * page_size
+        try:
+            with EventStore(store_path) as store:
+                if start_ts is None and end_ts is None:
+                    total = store.count(flow)
+                    if flow is None:
+                        events = store.get_range(
+                            float("-inf"), float("inf"), offset=offset, limit=page_size
+                        )
+                    else:
+                        events = store.get_events(flow, offset=offset, limit=page_size)
+                else:
+                    start = float("-inf") if start_ts is None else start_ts
+                    end = float("inf") if end_ts is None else end_ts
+                    total = store.count_range(start, end, key=flow)
+                    events = store.get_range(
+                        start, end, key=flow, offset=offset, limit=page_size
+                    )
+        except (OSError, sqlite3.Error) as e:
+            return {"error": str(e)}
+
+        return {
+            "flow": flow,
+            "start_ts": start_ts,
+            "end_ts": end_ts,
+            "page": page,
+            "page_size": page_size,
+            "total_events": total,
+            "events": events,
+        }
+
+    def correlate_path(self, files: list[str]) -> dict[str, Any]:
+        """
+        Follow the packets of the first capture through the following ones,
+        e.g. client -> LB -> firewall -> server.
+
+        Every capture is extracted and indexed once and each hop gets its own
+        clock offset estimate. A packet is looked up hop by hop and counted
+        as lost at the first capture it is missing from. Latencies include
+        the clock difference between capture points, as in correlate().
+        """
+        from .stats import LatencyHistogram
+
+        if len(files) < 2:
+            raise ValueError("At least two captures are required")
+
+        tables = map_processes(_extract_signatures, [(f,) for f in files])
+        indexes = [SignatureIndex(t) for t in tables[1:]]
+        offsets = [estimate_offset(tables[k], indexes[k]) for k in range(len(indexes))]
+
+        hops = [
+            {
+                "from": files[k],
+                "to": files[k + 1],
+                "estimated_time_offset": offsets[k],
+                "matched": 0,
+                "lost": 0,
+                "lost_frames": [],
+            }
+            for k in range(len(indexes))
+        ]
+        latencies = [LatencyHistogram() for _ in indexes]
+        end_to_end = LatencyHistogram()
+
+        first = tables[0]
+        for i in range(len(first)):
+            key = (first.seq_ack[i], first.len_port[i])
+            ts = first.ts[i]
+            for k, index in enumerate(indexes):
+                lo, hi = index.run(*key)
+                pos = index.closest(lo, hi, ts + offsets[k]) if lo < hi else None
+                hop = hops[k]
+                if pos is None:
+                    hop["lost"] += 1
+                    if len(hop["lost_frames"]) < MAX_LOST_FRAMES_OUTPUT:
+                        hop["lost_frames"].append(str(first.frame[i]))
+                    break
+                index.consume(pos)
+                hop["matched"] += 1
+                latencies[k].record(index.ts[pos] - ts)
+                ts = index.ts[pos]
+            else:
+                end_to_end.record(ts - first.ts[i])
+
+        for hop, latency in zip(hops, latencies):
+            hop["latency"] = latency.to_dict()
+
+        return {
+            "captures": files,
+            "total_packets": [len(t) for t in tables],
+            "delivered": end_to_end.count,
+            "lost": len(first) - end_to_end.count,
+            "end_to_end_latency": end_to_end.to_dict(),
+            "hops": hops,
+        }
+
+    def correlate_stream(self, file_a: str, file_b: str) -> Iterator[dict[str, Any]]:
+        """
+        Streaming counterpart of correlate() for captures larger than RAM.
+
+        Both captures are read in timestamp order at the same time, keeping
+        only the unmatched B packets within CORRELATION_WINDOW of the current
+        A packet. Yields {"type": "match"} and {"type": "lost"} events as
+        they are decided and a final {"type": "summary"}. The clock offset
+        is estimated from the first STREAM_OFFSET_SCAN_PACKETS packets of B.
+        Both captures are expected in time order, as written by capture tools.
+        """
+        rows_a = self._signature_rows(file_a)
+        rows_b = self._signature_rows(file_b)
+
+        # Offset from the leading packets, which are then replayed
+        head_a = deque(
+            filter(None, map(_signature, islice(rows_a, OFFSET_SAMPLE_PACKETS)))
+        )
+        head_b = deque(
+            filter(None, map(_signature, islice(rows_b, STREAM_OFFSET_SCAN_PACKETS)))
+        )
+        time_offset = estimate_offset(
+            SignatureTable.from_signatures(head_a),
+            SignatureIndex(SignatureTable.from_signatures(head_b)),
+        )
+        yield {"type": "offset", "estimated_time_offset": time_offset}
+
+        signatures_a = chain(_drain(head_a), filter(None, map(_signature, rows_a)))
+        signatures_b = chain(_drain(head_b), filter(None, map(_signature, rows_b)))
+        # B packets in the window: per signature, and all of them for
+        # eviction, both in arrival order. Entries are [ts, frame, key,
+        # matched]; matched ones stay until evicted and are skipped.
+        pending: dict[tuple[int, int], deque[list]] = {}
+        arrivals: deque[list] = deque()
+        next_b: tuple[float, int, int, int, int] | None = None
+        b_done = False
+
+        total_a = total_b = matched = lost = 0
+        for ts_a, seq_ack, len_port, frame_a, _ in signatures_a:
+            total_a += 1
+            target = ts_a + time_offset
+
+            # Read B up to the end of the window
+            while not b_done and (
+                next_b is None or next_b[0] < target + CORRELATION_WINDOW
+            ):
+                if next_b is not None:
+                    key = (next_b[1], next_b[2])
+                    entry = [next_b[0], next_b[3], key, False]
+                    pending.setdefault(key, deque()).append(entry)
+                    arrivals.append(entry)
+                    total_b += 1
+                next_b = next(signatures_b, None)
+                b_done = next_b is None
+
+            # B packets before the window can't match this or any later A packet
+            while arrivals and arrivals[0][0] <= target - CORRELATION_WINDOW:
+                key = arrivals.popleft()[2]
+                # Same arrival order, so it is the first of its signature
+                candidates = pending[key]
+                candidates.popleft()
+                if not candidates:
+                    del pending[key]
+
+            # Candidate closest in time, the earlier one on ties
+            best, best_diff = None, CORRELATION_WINDOW
+            candidates = pending.get((seq_ack, len_port))
+            for entry in candidates or ():
+                diff = abs(entry[0] - target)
+                if diff < best_diff and not entry[3]:
+                    best, best_diff = entry, diff
+
+            if best is not None:
+                best[3] = True
+                matched += 1
+                yield {
+                    "type": "match",
+                    "frame_a": str(frame_a),
+                    "frame_b": str(best[1]),
+                    "ts_a": ts_a,
+                    "ts_b": best[0],
+                    "latency": best[0] - ts_a,
+                }
+            else:
+                lost += 1
+                yield {"type": "lost", "frame_a": str(frame_a), "ts_a": ts_a}
+
+        if next_b is not None:
+            total_b += 1
+        total_b += sum(1 for _ in signatures_b)
+
+        yield {
+            "type": "summary",
+            "matched": matched,
+            "lost_in_b_count": lost,
+            "total_a": total_a,
+            "total_b": total_b,
+            "estimated_time_offset": time_offset,
         }
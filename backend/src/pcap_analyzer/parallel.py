@@ -0,0 +1,61 @@
+"""
+Parallel - Run per-file extraction of multi-file operations side by side
+"""
+
+from __future__ import annotations
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+# Upper bound on extraction processes, one per file below it
+MAX_PROCESSES = int(os.environ.get("NETLENS_EXTRACT_PROCESSES") or 0) or (
+    os.cpu_count() or 1
+)
+
+
+def _run(tshark_path: str | None, func: Callable, args: tuple) -> Any:
+    # Child processes find tshark on their own, use the one the parent uses
+    from .tshark import tshark
+
+    tshark.tshark_path = tshark_path
+    return func(*args)
+
+
+def map_processes(func: Callable, jobs: list[tuple]) -> list:
+    """
+    func(*args) for every args tuple of `jobs`, each in its own process.
+
+    `func` must be a module level function and should return something cheap
+    to pickle (arrays, columns of plain values). Results come back in job
+    order and exceptions raised by `func` propagate. Runs the jobs in this
+    process when there is a single one or processes can't be started.
+    """
+    if len(jobs) < 2 or MAX_PROCESSES < 2:
+        return [func(*args) for args in jobs]
+
+    from .tshark import tshark
+
+    try:
+        # Spawned, not forked: callers like the MCP server run threads
+        pool = ProcessPoolExecutor(
+            max_workers=min(len(jobs), MAX_PROCESSES),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    except (OSError, NotImplementedError) as e:
+        print(
+            f"Process pool unavailable, extracting sequentially: {e}", file=sys.stderr
+        )
+        return [func(*args) for args in jobs]
+
+    with pool:
+        try:
+            futures = [
+                pool.submit(_run, tshark.tshark_path, func, args) for args in jobs
+            ]
+            return [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            print(f"Process pool failed, extracting sequentially: {e}", file=sys.stderr)
+    return [func(*args) for args in jobs]
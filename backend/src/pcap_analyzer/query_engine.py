@@ -0,0 +1,508 @@
+"""
+Query Engine - In-process evaluation of search filters
+
+Compiles the common subset of Wireshark display-filter syntax and evaluates
+it over cached field columns, so interactive searches do not need a new
+tshark run:
+
+- Comparisons: == != > < >= <= (and eq ne gt lt ge le), contains
+- Logic: and / or / not (&& || !), parentheses
+- Sets: field in {a b c 10..20}
+- Addresses: ip.src == 10.0.0.0/8 (CIDR), ip.addr / tcp.port / udp.port
+- Bare fields and protocols as existence tests (tcp, udp, ip.src, ...)
+
+Anything else raises UnsupportedFilter and the caller falls back to tshark.
+"""
+
+from __future__ import annotations
+import ipaddress
+import json
+import re
+import sys
+from array import array
+from itertools import compress
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from .cache import temp_path
+
+# Bump when the saved table layout changes
+COLUMN_TABLE_VERSION = 1
+
+# Columns cached alongside every analysis so common searches can be answered
+SEARCH_FIELDS = [
+    "frame.number",
+    "frame.len",
+    "frame.time_relative",
+    "ip.src",
+    "ip.dst",
+    "ipv6.src",
+    "ipv6.dst",
+    "tcp.stream",
+    "tcp.srcport",
+    "tcp.dstport",
+    "udp.srcport",
+    "udp.dstport",
+]
+
+# Fields that expand to "any of" several columns
+FIELD_ALIASES = {
+    "ip.addr": ["ip.src", "ip.dst"],
+    "ipv6.addr": ["ipv6.src", "ipv6.dst"],
+    "tcp.port": ["tcp.srcport", "tcp.dstport"],
+    "udp.port": ["udp.srcport", "udp.dstport"],
+}
+
+# Protocol names tested through a field that is always set for the protocol
+PROTOCOL_FIELDS = {
+    "ip": "ip.src",
+    "ipv6": "ipv6.src",
+    "tcp": "tcp.srcport",
+    "udp": "udp.srcport",
+}
+
+IP_FIELDS = {"ip.src", "ip.dst", "ipv6.src", "ipv6.dst"}
+
+OPERATORS = {
+    "==": "==",
+    "eq": "==",
+    "!=": "!=",
+    "ne": "!=",
+    ">": ">",
+    "gt": ">",
+    "<": "<",
+    "lt": "<",
+    ">=": ">=",
+    "ge": ">=",
+    "<=": "<=",
+    "le": "<=",
+    "contains": "contains",
+}
+
+_TOKEN_RE = re.compile(
+    r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*")
+        |(?P<op>==|!=|>=|<=|&&|\|\||[><!(){},])
+        |(?P<word>[A-Za-z0-9_.:/\-]+)
+    )""",
+    re.VERBOSE,
+)
+
+
+class UnsupportedFilter(ValueError):
+    """The expression uses syntax or fields the in-process engine can't handle"""
+
+
+def _tokenize(text: str) -> list[str]:
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise UnsupportedFilter(f"Unsupported syntax at: {text[pos:]!r}")
+        tokens.append(m.group(m.lastgroup))
+        pos = m.end()
+    return tokens
+
+
+def _split_values(value: str) -> list[str]:
+    # Fields streamed with occurrence=a hold several values joined by ","
+    return value.split(",") if "," in value else [value]
+
+
+class _Literal:
+    """A comparison operand, typed against the field it is compared with"""
+
+    def __init__(self, text: str):
+        self.text = text[1:-1].replace('\\"', '"') if text.startswith('"') else text
+        self.network: ipaddress.IPv4Network | ipaddress.IPv6Network | None = None
+        self.number: float | None = None
+        try:
+            self.network = ipaddress.ip_network(self.text, strict=False)
+        except ValueError:
+            pass
+        try:
+            self.number = float(int(self.text, 0))
+        except ValueError:
+            try:
+                self.number = float(self.text)
+            except ValueError:
+                pass
+
+
+def _compare(op: str, a: Any, b: Any) -> bool:
+    if op == "==":
+        return a == b
+    if op == ">":
+        return a > b
+    if op == "<":
+        return a < b
+    if op == ">=":
+        return a >= b
+    if op == "<=":
+        return a <= b
+    raise UnsupportedFilter(op)
+
+
+def _value_predicate(
+    field: str, op: str, literals: list[_Literal]
+) -> Callable[[str], bool]:
+    """Predicate over one raw (single-occurrence) column value"""
+    if op == "contains":
+        needle = literals[0].text
+        return lambda v: needle in v
+
+    if field in IP_FIELDS:
+        if any(lit.network is None for lit in literals):
+            raise UnsupportedFilter(f"{field} needs an address operand")
+        networks = [lit.network for lit in literals]
+
+        def match_ip(v: str) -> bool:
+            try:
+                addr = ipaddress.ip_address(v)
+            except ValueError:
+                return False
+            if op == "==":
+                return any(addr in net for net in networks)
+            # Ordering compares against the network address, like tshark
+            try:
+                return _compare(op, addr, networks[0].network_address)
+            except TypeError:
+                return False
+
+        return match_ip
+
+    if all(lit.number is not None for lit in literals):
+        numbers = [lit.number for lit in literals]
+
+        def match_number(v: str) -> bool:
+            try:
+                n = float(int(v, 0))
+            except ValueError:
+                try:
+                    n = float(v)
+                except ValueError:
+                    return False
+            return any(_compare(op, n, x) for x in numbers)
+
+        return match_number
+
+    texts = [lit.text for lit in literals]
+    return lambda v: any(_compare(op, v, t) for t in texts)
+
+
+def _range_predicate(
+    field: str, low: _Literal, high: _Literal
+) -> Callable[[str], bool]:
+    """Predicate low <= value <= high over one raw column value"""
+    at_least = _value_predicate(field, ">=", [low])
+    at_most = _value_predicate(field, "<=", [high])
+    return lambda v: at_least(v) and at_most(v)
+
+
+class _Node:
+    fields: set[str]
+
+    def match(self, row: dict[str, str]) -> bool:
+        raise NotImplementedError
+
+    def mask(self, table: ColumnTable) -> int:
+        """Bitset with one 0x01/0x00 byte per row (see ColumnTable)"""
+        raise NotImplementedError
+
+
+class _Leaf(_Node):
+    def __init__(self, columns: list[str], predicate: Callable[[str], bool]):
+        self.columns = columns
+        self.fields = set(columns)
+        self.predicate = predicate
+
+    def _test(self, value: str) -> bool:
+        return bool(value) and any(self.predicate(v) for v in _split_values(value))
+
+    def match(self, row: dict[str, str]) -> bool:
+        return any(self._test(row.get(c) or "") for c in self.columns)
+
+    def mask(self, table: ColumnTable) -> int:
+        result = 0
+        for column in self.columns:
+            # Evaluate once per distinct value, then map codes through the
+            # lookup table; both steps run at C speed.
+            lut = bytes(self._test(v) for v in table.values[column])
+            result |= int.from_bytes(
+                bytes(map(lut.__getitem__, table.codes[column])), "little"
+            )
+        return result
+
+
+class _Not(_Node):
+    def __init__(self, child: _Node):
+        self.child = child
+        self.fields = child.fields
+
+    def match(self, row: dict[str, str]) -> bool:
+        return not self.child.match(row)
+
+    def mask(self, table: ColumnTable) -> int:
+        return self.child.mask(table) ^ table.ones
+
+
+class _And(_Node):
+    def __init__(self, children: list[_Node]):
+        self.children = children
+        self.fields = set().union(*(c.fields for c in children))
+
+    def match(self, row: dict[str, str]) -> bool:
+        return all(c.match(row) for c in self.children)
+
+    def mask(self, table: ColumnTable) -> int:
+        result = table.ones
+        for child in self.children:
+            result &= child.mask(table)
+        return result
+
+
+class _Or(_Node):
+    def __init__(self, children: list[_Node]):
+        self.children = children
+        self.fields = set().union(*(c.fields for c in children))
+
+    def match(self, row: dict[str, str]) -> bool:
+        return any(c.match(row) for c in self.children)
+
+    def mask(self, table: ColumnTable) -> int:
+        result = 0
+        for child in self.children:
+            result |= child.mask(table)
+        return result
+
+
+class _Parser:
+    def __init__(self, tokens: list[str]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise UnsupportedFilter("Unexpected end of filter")
+        self.pos += 1
+        return token
+
+    def expect(self, token: str) -> None:
+        if self.next() != token:
+            raise UnsupportedFilter(f"Expected {token!r}")
+
+    def parse(self) -> _Node:
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise UnsupportedFilter(f"Unexpected token {self.peek()!r}")
+        return node
+
+    def parse_or(self) -> _Node:
+        children = [self.parse_and()]
+        while self.peek() in ("or", "||"):
+            self.next()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else _Or(children)
+
+    def parse_and(self) -> _Node:
+        children = [self.parse_not()]
+        while self.peek() in ("and", "&&"):
+            self.next()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else _And(children)
+
+    def parse_not(self) -> _Node:
+        if self.peek() in ("not", "!"):
+            self.next()
+            return _Not(self.parse_not())
+        return self.parse_primary()
+
+    def parse_primary(self) -> _Node:
+        token = self.next()
+        if token == "(":
+            node = self.parse_or()
+            self.expect(")")
+            return node
+
+        field = token
+        if not re.fullmatch(r"[A-Za-z_][\w.\-]*", field):
+            raise UnsupportedFilter(f"Expected a field, got {field!r}")
+        columns = FIELD_ALIASES.get(field, [field])
+
+        op = self.peek()
+        if op == "in":
+            self.next()
+            return self._parse_set(columns)
+        if op not in OPERATORS:
+            # Bare field or protocol: existence test
+            column = PROTOCOL_FIELDS.get(field)
+            return _Leaf([column] if column else columns, lambda v: True)
+
+        self.next()
+        op = OPERATORS[op]
+        literal = _Literal(self.next())
+        if op == "!=":
+            # tshark semantics: field present and no occurrence equal
+            return _And(
+                [
+                    _Leaf(columns, lambda v: True),
+                    _Not(self._leaf(columns, "==", [literal])),
+                ]
+            )
+        return self._leaf(columns, op, [literal])
+
+    def _parse_set(self, columns: list[str]) -> _Node:
+        self.expect("{")
+        literals: list[_Literal] = []
+        ranges: list[tuple[_Literal, _Literal]] = []
+        while self.peek() != "}":
+            token = self.next()
+            if token == ",":
+                continue
+            if ".." in token:
+                low, high = token.split("..", 1)
+                ranges.append((_Literal(low), _Literal(high)))
+            else:
+                literals.append(_Literal(token))
+        self.expect("}")
+
+        if not literals and not ranges:
+            raise UnsupportedFilter("Empty set")
+
+        # One leaf, so that both ends of a range test the same value of the
+        # same column, as tshark does
+        field = columns[0]
+        predicates = []
+        if literals:
+            predicates.append(_value_predicate(field, "==", literals))
+        for low, high in ranges:
+            predicates.append(_range_predicate(field, low, high))
+        if len(predicates) == 1:
+            return _Leaf(columns, predicates[0])
+        return _Leaf(columns, lambda v: any(p(v) for p in predicates))
+
+    def _leaf(self, columns: list[str], op: str, literals: list[_Literal]) -> _Leaf:
+        # Aliased columns always share a type, so the first one decides
+        return _Leaf(columns, _value_predicate(columns[0], op, literals))
+
+
+class CompiledFilter:
+    def __init__(self, expression: str, root: _Node):
+        self.expression = expression
+        self.root = root
+        self.fields = root.fields
+
+    def match(self, row: dict[str, str]) -> bool:
+        return self.root.match(row)
+
+    def evaluate(self, table: ColumnTable) -> list[int]:
+        """Indices of matching rows, computed column-at-a-time"""
+        mask = self.root.mask(table).to_bytes(table.length, "little")
+        return list(compress(range(table.length), mask))
+
+
+def compile_filter(
+    expression: str, available_fields: Optional[Iterable[str]] = None
+) -> CompiledFilter:
+    """Compile a display filter, raising UnsupportedFilter if it can't run in-process"""
+    root = _Parser(_tokenize(expression)).parse()
+    if available_fields is not None:
+        missing = root.fields - set(available_fields)
+        if missing:
+            raise UnsupportedFilter(f"Fields not cached: {', '.join(sorted(missing))}")
+    return CompiledFilter(expression, root)
+
+
+class ColumnTable:
+    """
+    Dictionary-encoded field columns of a row stream.
+
+    Every column keeps its distinct values once plus one integer code per
+    row, which keeps repeated addresses/ports cheap and lets filters be
+    evaluated per distinct value rather than per row.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = list(dict.fromkeys(fields))
+        self.values: dict[str, list[str]] = {f: [] for f in self.fields}
+        self.codes: dict[str, array] = {f: array("I") for f in self.fields}
+        self._index: dict[str, dict[str, int]] = {f: {} for f in self.fields}
+        self.length = 0
+        self._ones = (0, 0)
+
+    @property
+    def ones(self) -> int:
+        if self._ones[0] != self.length:
+            self._ones = (self.length, int.from_bytes(b"\x01" * self.length, "little"))
+        return self._ones[1]
+
+    def append(self, row: dict[str, str]) -> None:
+        for f in self.fields:
+            value = row.get(f) or ""
+            index = self._index[f]
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(self.values[f])
+                self.values[f].append(value)
+            self.codes[f].append(code)
+        self.length += 1
+
+    def rows(self, indices: Optional[Iterable[int]] = None) -> Iterator[dict[str, str]]:
+        columns = [(f, self.values[f], self.codes[f]) for f in self.fields]
+        for i in range(self.length) if indices is None else indices:
+            yield {f: values[codes[i]] for f, values, codes in columns}
+
+    def save(self, path: Path) -> None:
+        """
+        Write the table as one line of JSON metadata (fields, distinct
+        values) followed by the raw code arrays in field order.
+        """
+        header = {
+            "version": COLUMN_TABLE_VERSION,
+            "fields": self.fields,
+            "values": self.values,
+            "length": self.length,
+            "itemsize": array("I").itemsize,
+            "byteorder": sys.byteorder,
+        }
+        tmp = temp_path(path)
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(header, separators=(",", ":")).encode() + b"\n")
+            for field in self.fields:
+                self.codes[field].tofile(f)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> ColumnTable:
+        """Read a saved table; raises ValueError if it is not a valid one"""
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            if (
+                not isinstance(header, dict)
+                or header.get("version") != COLUMN_TABLE_VERSION
+                or header.get("itemsize") != array("I").itemsize
+                or header.get("byteorder") != sys.byteorder
+            ):
+                raise ValueError(f"Not a column table: {path}")
+            table = cls(header["fields"])
+            table.length = header["length"]
+            for field in table.fields:
+                values = header["values"][field]
+                codes = array("I")
+                try:
+                    codes.fromfile(f, table.length)
+                except EOFError:
+                    raise ValueError(f"Truncated column table: {path}")
+                if codes and max(codes) >= len(values):
+                    raise ValueError(f"Corrupt column table: {path}")
+                table.values[field] = values
+                table.codes[field] = codes
+        # The value index is only needed for appending, which loaded tables don't do
+        table._index = {}
+        return table
@@ -0,0 +1,124 @@
+"""
+Report Writer - Write-behind persistence of analysis reports
+
+Reports are serialized and written by a background thread so callers get
+their results without waiting on JSON encoding, HTML rendering or disk I/O.
+The backlog is bounded (submitting blocks when it is full) and whatever is
+still queued is drained when the process exits.
+
+Environment:
+- NETLENS_REPORT_FSYNC=1: fsync every report before it replaces the old one
+- NETLENS_REPORT_GZIP=1: write JSON reports gzip-compressed (.json.gz)
+"""
+
+from __future__ import annotations
+import atexit
+import gzip
+import json
+import os
+import queue
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional, TextIO
+
+from .cache import temp_path
+
+# Reports waiting to be written before submit() blocks
+REPORT_QUEUE_SIZE = 8
+
+GZIP_LEVEL = 6
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+
+class ReportWriter:
+    def __init__(
+        self,
+        max_pending: int = REPORT_QUEUE_SIZE,
+        fsync: Optional[bool] = None,
+        compress: Optional[bool] = None,
+    ):
+        self.fsync = _env_flag("NETLENS_REPORT_FSYNC") if fsync is None else fsync
+        self.compress = (
+            _env_flag("NETLENS_REPORT_GZIP") if compress is None else compress
+        )
+        self._queue: queue.Queue[Callable[[], None]] = queue.Queue(max_pending)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def json_path(self, path: Path) -> Path:
+        """Final name of a JSON report, accounting for compression"""
+        return path.with_name(path.name + ".gz") if self.compress else path
+
+    def submit(self, job: Callable[[], None]) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="report-writer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+        self._queue.put(job)
+
+    def write_json(self, path: Path, data: dict[str, Any]) -> None:
+        # Shallow copy: the caller may keep adding keys to its dict
+        snapshot = dict(data)
+        self.submit(lambda: self._write_json(path, snapshot))
+
+    def write_stream(self, path: Path, render: Callable[[TextIO], None]) -> None:
+        """Stream the output of render() into a file on the writer thread"""
+        self.submit(lambda: self._write_stream(path, render))
+
+    def flush(self) -> None:
+        """Block until every submitted report is written"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                job()
+            except Exception as e:
+                print(f"Error writing report: {e}", file=sys.stderr)
+            finally:
+                self._queue.task_done()
+
+    def _write_json(self, path: Path, data: dict[str, Any]) -> None:
+        payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        self._write(path, payload.encode("utf-8"), path.suffix == ".gz")
+
+    def _write_stream(self, path: Path, render: Callable[[TextIO], None]) -> None:
+        tmp_path = temp_path(path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            render(f)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _write(self, path: Path, payload: bytes, compress: bool) -> None:
+        # Readers only ever see a complete report
+        tmp_path = temp_path(path)
+        with open(tmp_path, "wb") as f:
+            if compress:
+                with gzip.GzipFile(
+                    fileobj=f, mode="wb", compresslevel=GZIP_LEVEL, mtime=0
+                ) as gz:
+                    gz.write(payload)
+            else:
+                f.write(payload)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+# Global instance
+report_writer = ReportWriter()
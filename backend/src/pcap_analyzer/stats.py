@@ -0,0 +1,227 @@
+"""
+Streaming Statistics - Fixed-size aggregates for unbounded packet streams
+
+- LatencyHistogram: log-linear (HDR style) histogram with bounded relative error
+- TopCounter: heavy hitters with a bounded number of tracked keys
+- DistinctCounter: exact, then HyperLogLog, cardinality estimate
+- ReservoirSample: uniform fixed-size sample of stream items
+"""
+
+from __future__ import annotations
+import hashlib
+import heapq
+import math
+import random
+from array import array
+from typing import Any, Iterable
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram over integer microseconds.
+
+    Values below 2**SUB_BITS are stored exactly, larger values land in one of
+    2**(SUB_BITS-1) sub-buckets per power of two, so every bucket is within
+    ~1.6% of its values. Memory is fixed regardless of the number of samples.
+    """
+
+    SUB_BITS = 6
+    # One hour in microseconds; larger values are clamped
+    MAX_VALUE_US = 3_600_000_000
+
+    _HALF = 1 << (SUB_BITS - 1)
+
+    def __init__(self):
+        self.buckets = array("Q", bytes(8 * (self._index(self.MAX_VALUE_US) + 1)))
+        self.count = 0
+        self.total_us = 0
+        self.min_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        shift = value.bit_length() - cls.SUB_BITS
+        if shift <= 0:
+            return value
+        return shift * cls._HALF + (value >> shift)
+
+    @classmethod
+    def _bucket_bounds(cls, index: int) -> tuple[int, int]:
+        if index < 2 * cls._HALF:
+            return index, index
+        shift = index // cls._HALF - 1
+        low = (index - shift * cls._HALF) << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        value = min(max(int(seconds * 1_000_000), 0), self.MAX_VALUE_US)
+        self.buckets[self._index(value)] += 1
+        if self.count == 0 or value < self.min_us:
+            self.min_us = value
+        if value > self.max_us:
+            self.max_us = value
+        self.count += 1
+        self.total_us += value
+
+    def merge(self, other: LatencyHistogram) -> None:
+        if not other.count:
+            return
+        for i, n in enumerate(other.buckets):
+            if n:
+                self.buckets[i] += n
+        if self.count == 0 or other.min_us < self.min_us:
+            self.min_us = other.min_us
+        self.max_us = max(self.max_us, other.max_us)
+        self.count += other.count
+        self.total_us += other.total_us
+
+    def percentile(self, p: float) -> float:
+        """Value (in milliseconds) at percentile p (0-100)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if not n:
+                continue
+            seen += n
+            if seen >= rank:
+                low, high = self._bucket_bounds(i)
+                value = min(max((low + high) // 2, self.min_us), self.max_us)
+                return value / 1000
+        return self.max_us / 1000
+
+    def bins(self) -> list[list[float]]:
+        """Non-empty buckets as [low_ms, high_ms, count]"""
+        result = []
+        for i, n in enumerate(self.buckets):
+            if n:
+                low, high = self._bucket_bounds(i)
+                result.append([low / 1000, high / 1000, n])
+        return result
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "min_ms": round(self.min_us / 1000, 3),
+            "mean_ms": round(self.total_us / self.count / 1000, 3)
+            if self.count
+            else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p90_ms": round(self.percentile(90), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max_us / 1000, 3),
+        }
+
+
+class TopCounter:
+    """
+    Bounded heavy-hitter counter.
+
+    Keeps up to 2 * `capacity` keys; when that fills up, everything but the
+    `capacity` largest entries is dropped. Frequent keys keep exact counts,
+    while a key that was pruned and reappears restarts from zero, so counts
+    are lower bounds off by at most `error`.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+        self.total = 0
+        self.error = 0
+
+    def add(self, key: str, n: int = 1) -> None:
+        self.total += n
+        self.counts[key] = self.counts.get(key, 0) + n
+        if len(self.counts) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self) -> None:
+        kept = heapq.nlargest(self.capacity, self.counts.items(), key=lambda kv: kv[1])
+        self.error = max(self.error, kept[-1][1])
+        self.counts = dict(kept)
+
+    def merge(self, other: TopCounter) -> None:
+        for key, n in other.counts.items():
+            self.add(key, n)
+        self.error = max(self.error, other.error)
+
+    def most_common(self, n: int) -> list[tuple[str, int]]:
+        return heapq.nlargest(n, self.counts.items(), key=lambda kv: kv[1])
+
+
+class DistinctCounter:
+    """
+    Distinct-count estimate.
+
+    Exact while fewer than EXACT_LIMIT values have been seen, then falls back
+    to HyperLogLog (~1.6% standard error with 4096 registers).
+    """
+
+    P = 12
+    EXACT_LIMIT = 4096
+
+    def __init__(self):
+        self.registers = bytearray(1 << self.P)
+        self._exact: set[str] | None = set()
+
+    def add(self, value: str) -> None:
+        if self._exact is not None:
+            self._exact.add(value)
+            if len(self._exact) > self.EXACT_LIMIT:
+                self._exact = None
+
+        h = int.from_bytes(
+            hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+        )
+        index = h >> (64 - self.P)
+        rest = h & ((1 << (64 - self.P)) - 1)
+        rank = (64 - self.P) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[str]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: DistinctCounter) -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        if self._exact is not None and other._exact is not None:
+            self._exact |= other._exact
+            if len(self._exact) > self.EXACT_LIMIT:
+                self._exact = None
+        else:
+            self._exact = None
+
+    def estimate(self) -> int:
+        if self._exact is not None:
+            return len(self._exact)
+        m = len(self.registers)
+        estimate = (
+            (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0**-r for r in self.registers)
+        )
+        zeros = self.registers.count(0)
+        # Linear counting is far more accurate for small cardinalities
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class ReservoirSample:
+    """Uniform random sample of at most `size` items (Algorithm R)"""
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.items: list[Any] = []
+        self.seen = 0
+        # Fixed seed so re-running an analysis shows the same sample
+        self._random = random.Random(seed)
+
+    def add(self, item: Any) -> None:
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            j = self._random.randrange(self.seen)
+            if j < self.size:
+                self.items[j] = item
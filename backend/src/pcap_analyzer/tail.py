@@ -0,0 +1,370 @@
+"""
+Tail Mode - Incremental analysis of captures that are still being written
+
+A checkpoint remembers how far into the capture an analysis has read, the
+header blocks needed to make a standalone capture out of the records that
+follow, and the analysis' aggregator state. Each refresh copies only the
+complete records appended since into a temporary capture for tshark and
+feeds the resulting rows into the restored aggregator.
+"""
+
+from __future__ import annotations
+import base64
+import hashlib
+import json
+import os
+import struct
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Optional
+
+from .cache import cache_dir
+
+# Bump when the checkpoint or aggregator layout changes
+CHECKPOINT_VERSION = 2
+
+# Records replayed before each chunk for analyses that need stream history
+TAIL_CONTEXT_PACKETS = 500
+
+# Bytes of the capture's start hashed to detect a replaced file
+PREFIX_DIGEST_SIZE = 4096
+
+READ_SIZE = 1024 * 1024
+
+# Records larger than this mean we are not looking at a record boundary
+MAX_RECORD_SIZE = 256 * 1024 * 1024
+
+# Fields the tail driver needs to rebase chunk-local values
+TAIL_FIELDS = [
+    "frame.number",
+    "frame.time_epoch",
+    "frame.time_relative",
+    "tcp.stream",
+    "ip.src",
+    "ip.dst",
+    "ipv6.src",
+    "ipv6.dst",
+    "tcp.srcport",
+    "tcp.dstport",
+]
+
+# pcap magic -> (byte order, timestamp resolution)
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAP_HEADER_SIZE = 24
+PCAP_RECORD_HEADER_SIZE = 16
+
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_IDB = 1
+PCAPNG_PB = 2
+PCAPNG_SPB = 3
+PCAPNG_NRB = 4
+PCAPNG_EPB = 6
+PCAPNG_DSB = 10
+PCAPNG_PACKET_BLOCKS = (PCAPNG_PB, PCAPNG_SPB, PCAPNG_EPB)
+# Non-packet blocks later records depend on (names, decryption secrets)
+PCAPNG_HEADER_BLOCKS = (PCAPNG_NRB, PCAPNG_DSB)
+
+
+@dataclass
+class TailCheckpoint:
+    source: str
+    analysis_type: str
+    version: int = CHECKPOINT_VERSION
+    fmt: str = ""
+    byte_order: str = "<"
+    # File offset just past the last complete record read
+    offset: int = 0
+    # Packet records read so far
+    frames: int = 0
+    # File header (pcap) or section + interface blocks (pcapng) that are
+    # written in front of every chunk
+    header: bytes = b""
+    # Timestamp resolution per pcapng interface
+    ts_resolution: list[float] = field(default_factory=list)
+    # Timestamp of the first packet, the origin of frame.time_relative
+    start_time: Optional[float] = None
+    # Connection 4-tuple -> stream id that stays stable across chunks
+    streams: dict[tuple[str, ...], str] = field(default_factory=dict)
+    context: deque[bytes] = field(
+        default_factory=lambda: deque(maxlen=TAIL_CONTEXT_PACKETS)
+    )
+    prefix_digest: str = ""
+    prefix_size: int = 0
+    # Aggregator state of the analysis (its to_state()), None until the
+    # first refresh completes
+    state: Any = None
+
+    def to_json(self) -> dict[str, Any]:
+        """JSON-safe form of the checkpoint, records base64 encoded"""
+        return {
+            "source": self.source,
+            "analysis_type": self.analysis_type,
+            "version": self.version,
+            "fmt": self.fmt,
+            "byte_order": self.byte_order,
+            "offset": self.offset,
+            "frames": self.frames,
+            "header": base64.b64encode(self.header).decode(),
+            "ts_resolution": self.ts_resolution,
+            "start_time": self.start_time,
+            "streams": [[list(key), value] for key, value in self.streams.items()],
+            "context": [base64.b64encode(r).decode() for r in self.context],
+            "prefix_digest": self.prefix_digest,
+            "prefix_size": self.prefix_size,
+            "state": self.state,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> TailCheckpoint:
+        checkpoint = cls(
+            source=str(data["source"]),
+            analysis_type=str(data["analysis_type"]),
+            version=int(data["version"]),
+            fmt=str(data["fmt"]),
+            byte_order=str(data["byte_order"]),
+            offset=int(data["offset"]),
+            frames=int(data["frames"]),
+            header=base64.b64decode(data["header"], validate=True),
+            ts_resolution=[float(r) for r in data["ts_resolution"]],
+            start_time=data["start_time"],
+            streams={tuple(key): str(value) for key, value in data["streams"]},
+            prefix_digest=str(data["prefix_digest"]),
+            prefix_size=int(data["prefix_size"]),
+            state=data["state"],
+        )
+        checkpoint.context.extend(
+            base64.b64decode(r, validate=True) for r in data["context"]
+        )
+        return checkpoint
+
+    def rebase(self, row: dict[str, str], frame: int) -> None:
+        """Make chunk-local frame numbers, times and stream ids capture-wide"""
+        row["frame.number"] = str(frame)
+
+        if self.start_time is not None:
+            try:
+                epoch = float(row.get("frame.time_epoch") or "")
+                row["frame.time_relative"] = f"{epoch - self.start_time:.9f}"
+            except ValueError:
+                pass
+
+        if row.get("tcp.stream"):
+            src = row.get("ip.src") or row.get("ipv6.src") or ""
+            dst = row.get("ip.dst") or row.get("ipv6.dst") or ""
+            a = (src, row.get("tcp.srcport") or "")
+            b = (dst, row.get("tcp.dstport") or "")
+            key = a + b if a <= b else b + a
+            stream_id = self.streams.get(key)
+            if stream_id is None:
+                stream_id = self.streams[key] = str(len(self.streams))
+            row["tcp.stream"] = stream_id
+
+    def _pcap_record(self, buf: bytes, pos: int) -> int:
+        """Size of the pcap record at pos, 0 if it is not complete yet"""
+        if len(buf) - pos < PCAP_RECORD_HEADER_SIZE:
+            return 0
+        ts_sec, ts_frac, incl_len = struct.unpack_from(
+            self.byte_order + "III", buf, pos
+        )
+        size = PCAP_RECORD_HEADER_SIZE + incl_len
+        if size > MAX_RECORD_SIZE:
+            raise ValueError(f"Corrupt pcap record at offset {self.offset}")
+        if len(buf) - pos < size:
+            return 0
+        if self.start_time is None:
+            self.start_time = ts_sec + ts_frac * self.ts_resolution[0]
+        return size
+
+    def _pcapng_block(self, buf: bytes, pos: int) -> tuple[int, str]:
+        """
+        Size of the pcapng block at pos (0 if incomplete) and its kind:
+        "packet", "header" for blocks later packets depend on, or "" for
+        blocks that are dropped from chunks.
+        """
+        if len(buf) - pos < 12:
+            return 0, ""
+        block_type = struct.unpack_from("<I", buf, pos)[0]
+        if block_type == PCAPNG_SHB:
+            # The section header sets the byte order of everything after it
+            magic = struct.unpack_from("<I", buf, pos + 8)[0]
+            self.byte_order = "<" if magic == PCAPNG_BYTE_ORDER_MAGIC else ">"
+        else:
+            block_type = struct.unpack_from(self.byte_order + "I", buf, pos)[0]
+        size = struct.unpack_from(self.byte_order + "I", buf, pos + 4)[0]
+        if size < 12 or size % 4 or size > MAX_RECORD_SIZE:
+            raise ValueError(f"Corrupt pcapng block at offset {self.offset}")
+        if len(buf) - pos < size:
+            return 0, ""
+
+        block = buf[pos : pos + size]
+        if block_type == PCAPNG_SHB:
+            # Interface ids restart, so older records can't be replayed
+            self.header = block
+            self.ts_resolution = []
+            self.context.clear()
+        elif block_type == PCAPNG_IDB:
+            self.header += block
+            self.ts_resolution.append(self._if_tsresol(block))
+        elif block_type in PCAPNG_HEADER_BLOCKS:
+            self.header += block
+        elif block_type in PCAPNG_PACKET_BLOCKS:
+            if self.start_time is None and block_type != PCAPNG_SPB:
+                self._pcapng_start_time(block, block_type)
+            return size, "packet"
+        else:
+            return size, ""
+        return size, "header"
+
+    def _if_tsresol(self, block: bytes) -> float:
+        """if_tsresol option of an interface description block (default 1us)"""
+        pos = 16
+        end = len(block) - 4
+        while pos + 4 <= end:
+            code, length = struct.unpack_from(self.byte_order + "HH", block, pos)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                value = block[pos + 4]
+                return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0**-value
+            pos += 4 + (length + 3) // 4 * 4
+        return 1e-6
+
+    def _pcapng_start_time(self, block: bytes, block_type: int) -> None:
+        if block_type == PCAPNG_EPB:
+            interface = struct.unpack_from(self.byte_order + "I", block, 8)[0]
+        else:
+            interface = struct.unpack_from(self.byte_order + "H", block, 8)[0]
+        high, low = struct.unpack_from(self.byte_order + "II", block, 12)
+        if interface < len(self.ts_resolution):
+            self.start_time = ((high << 32) | low) * self.ts_resolution[interface]
+
+    def _read_header(self, f: BinaryIO) -> bool:
+        """Detect the capture format and read the pcap file header"""
+        magic = f.read(4)
+        if len(magic) < 4:
+            return False
+        if magic in PCAP_MAGIC:
+            f.seek(0)
+            header = f.read(PCAP_HEADER_SIZE)
+            if len(header) < PCAP_HEADER_SIZE:
+                return False
+            self.fmt = "pcap"
+            self.byte_order, resolution = PCAP_MAGIC[magic]
+            self.ts_resolution = [resolution]
+            self.header = header
+            self.offset = PCAP_HEADER_SIZE
+        elif struct.unpack("<I", magic)[0] == PCAPNG_SHB:
+            # The section header block is picked up by the block reader
+            self.fmt = "pcapng"
+        else:
+            raise ValueError("Unsupported capture format (expected pcap or pcapng)")
+        return True
+
+    def read_new(self, out: BinaryIO, context: int = 0) -> tuple[int, int]:
+        """
+        Read the complete records appended since the last call.
+
+        The records are written to `out` as a standalone capture, preceded
+        by up to `context` already processed records. Returns the number of
+        context records and of new records written.
+        """
+        with open(self.source, "rb") as f:
+            if not self.fmt and not self._read_header(f):
+                return 0, 0
+
+            replay = list(self.context)[-context:] if context else []
+            out.write(self.header)
+            for record in replay:
+                out.write(record)
+
+            # Stop at the size seen now, the writer keeps appending
+            remaining = os.fstat(f.fileno()).st_size - self.offset
+            f.seek(self.offset)
+            new = 0
+            buf = b""
+            while remaining > 0:
+                data = f.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                buf += data
+                pos = 0
+                while True:
+                    if self.fmt == "pcap":
+                        size, kind = self._pcap_record(buf, pos), "packet"
+                    else:
+                        size, kind = self._pcapng_block(buf, pos)
+                    if not size:
+                        break
+                    record = buf[pos : pos + size]
+                    if kind:
+                        out.write(record)
+                    if kind == "packet":
+                        if context:
+                            self.context.append(record)
+                        new += 1
+                    pos += size
+                    self.offset += size
+                # Keep a partially read record for the next read
+                buf = buf[pos:]
+
+        self.frames += new
+        return len(replay), new
+
+    def matches_source(self) -> bool:
+        """Whether the capture on disk is still the one this checkpoint read"""
+        try:
+            if os.path.getsize(self.source) < self.offset:
+                return False
+            return _prefix_digest(self.source, self.prefix_size) == self.prefix_digest
+        except OSError:
+            return False
+
+
+def _prefix_digest(path: str, size: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(size)).hexdigest()
+
+
+def _checkpoint_path(filepath: Path, analysis_type: str) -> Path:
+    key = f"{filepath.resolve()}:{analysis_type}"
+    return cache_dir("tail") / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+
+def load_checkpoint(filepath: str | Path, analysis_type: str) -> TailCheckpoint:
+    """Saved checkpoint for this capture and analysis, or a fresh one"""
+    filepath = Path(filepath)
+    try:
+        with open(_checkpoint_path(filepath, analysis_type), encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == CHECKPOINT_VERSION:
+            checkpoint = TailCheckpoint.from_json(data)
+            if (
+                checkpoint.source == str(filepath)
+                and checkpoint.analysis_type == analysis_type
+                and checkpoint.matches_source()
+            ):
+                return checkpoint
+    except Exception:
+        # Missing, unreadable, foreign or written by an older version: start over
+        pass
+    return TailCheckpoint(source=str(filepath), analysis_type=analysis_type)
+
+
+def save_checkpoint(checkpoint: TailCheckpoint) -> None:
+    filepath = Path(checkpoint.source)
+    checkpoint.prefix_size = min(checkpoint.offset, PREFIX_DIGEST_SIZE)
+    checkpoint.prefix_digest = _prefix_digest(checkpoint.source, checkpoint.prefix_size)
+
+    path = _checkpoint_path(filepath, checkpoint.analysis_type)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint.to_json(), f, separators=(",", ":"))
+    os.replace(tmp_path, path)
@@ -1,10 +1,32 @@
+import asyncio
+import codecs
+import contextvars
+import csv
+import io
+import re
 import shutil
 import subprocess
 import json
 import os
 import sys
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+# Rows between reports of the capture read position
+READ_POSITION_ROWS = 100
+
+# Rows per batch yielded by astream_fields, and bytes read from tshark at once
+ASYNC_BATCH_ROWS = 500
+ASYNC_READ_SIZE = 64 * 1024
+
+# Characters deciding where a CSV record ends: newlines outside quotes
+_RECORD_CHARS = re.compile(r'["\n]')
+
+# Errors of the tshark runs in the current failure_scope(), per thread/task
+_failures: contextvars.ContextVar[Optional[list[str]]] = contextvars.ContextVar(
+    "tshark_failures", default=None
+)
 
 
 class TsharkManager:
@@ -37,6 +59,28 @@ class TsharkManager:
         # 4. Check PATH
         return shutil.which("tshark")
 
+    @contextmanager
+    def failure_scope(self) -> Iterator[list[str]]:
+        """
+        Collect the errors of the field streams read within the block by this
+        thread or task. Streams don't raise when tshark fails (e.g. exit
+        status 2 for a capture cut short mid-packet), the rows read so far
+        stand; callers check this to tell a partial result from a complete one.
+        """
+        failures: list[str] = []
+        token = _failures.set(failures)
+        try:
+            yield failures
+        finally:
+            _failures.reset(token)
+
+    def _stream_failed(self, returncode: int) -> None:
+        message = f"Tshark exited with status {returncode}, output may be incomplete"
+        print(message, file=sys.stderr)
+        failures = _failures.get()
+        if failures is not None:
+            failures.append(message)
+
     def is_available(self) -> bool:
         return self.tshark_path is not None and os.path.exists(self.tshark_path)
 
@@ -64,6 +108,22 @@ class TsharkManager:
         if not self.is_available():
             raise RuntimeError("Tshark not found")
 
+        cmd = self._json_cmd(pcap_path, display_filter, fields)
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            return json.loads(result.stdout)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Tshark failed: {e.stderr}")
+        except json.JSONDecodeError:
+            raise RuntimeError("Failed to parse Tshark JSON output")
+
+    def _json_cmd(
+        self,
+        pcap_path: str,
+        display_filter: Optional[str],
+        fields: Optional[list[str]],
+    ) -> list[str]:
         # Cast to str to satisfy type checker, though is_available guarantees not None
         tshark_exe = str(self.tshark_path)
 
@@ -75,25 +135,16 @@ class TsharkManager:
         if fields:
             for field in fields:
                 cmd.extend(["-e", field])
+        return cmd
 
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            return json.loads(result.stdout)
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Tshark failed: {e.stderr}")
-        except json.JSONDecodeError:
-            raise RuntimeError("Failed to parse Tshark JSON output")
-
-    def stream_fields(
-        self, pcap_path: str, fields: list[str], display_filter: Optional[str] = None
-    ):
-        """
-        Generator yielding dicts of fields for each packet.
-        Uses -T fields -E separator=, -E header=y -E quote=d
-        """
-        if not self.is_available():
-            raise RuntimeError("Tshark not found")
-
+    def _fields_cmd(
+        self,
+        pcap_path: str,
+        fields: list[str],
+        display_filter: Optional[str],
+        occurrence: str,
+        flush: bool = False,
+    ) -> list[str]:
         cmd = [
             str(self.tshark_path),
             "-r",
@@ -107,7 +158,7 @@ class TsharkManager:
             "-E",
             "quote=d",
             "-E",
-            "occurrence=f",
+            f"occurrence={occurrence}",
         ]
 
         for f in fields:
@@ -116,18 +167,156 @@ class TsharkManager:
         if display_filter:
             cmd.extend(["-Y", display_filter])
 
-        import csv
+        if flush:
+            # Live input: hand out every packet as it is dissected
+            cmd.append("-l")
+        return cmd
+
+    def stream_fields(
+        self,
+        pcap_path: str,
+        fields: list[str],
+        display_filter: Optional[str] = None,
+        occurrence: str = "f",
+        on_read: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        Generator yielding dicts of fields for each packet.
+        Uses -T fields -E separator=, -E header=y -E quote=d
+        occurrence="a" returns every occurrence of a field joined by ","
+        pcap_path "-" reads the capture from stdin (e.g. `dumpcap -w -`),
+        with output flushed after every packet
+        on_read is called with the number of capture bytes tshark has read
+        A failing tshark ends the rows early, see failure_scope()
+        """
+        if not self.is_available():
+            raise RuntimeError("Tshark not found")
+
+        # For on_read tshark gets the capture as its stdin, sharing the file
+        # offset with us, so its read position is a seek away
+        source = open(pcap_path, "rb") if on_read and pcap_path != "-" else None
+
+        # Only a live pipe needs per-packet flushing, not our stdin handoff
+        cmd = self._fields_cmd(
+            "-" if source else pcap_path,
+            fields,
+            display_filter,
+            occurrence,
+            flush=pcap_path == "-",
+        )
 
         # Use Popen to stream stdout
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, bufsize=1)
+        proc = subprocess.Popen(
+            cmd, stdin=source, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+        finished = False
         try:
             if proc.stdout:
                 reader = csv.DictReader(proc.stdout)
-                for row in reader:
+                for count, row in enumerate(reader, 1):
+                    if source and count % READ_POSITION_ROWS == 0:
+                        on_read(os.lseek(source.fileno(), 0, os.SEEK_CUR))
                     yield row
+            if source:
+                on_read(os.lseek(source.fileno(), 0, os.SEEK_CUR))
+            finished = True
         finally:
-            proc.kill()
+            if not finished:
+                proc.kill()
             proc.wait()
+            if source:
+                source.close()
+
+        if proc.returncode:
+            self._stream_failed(proc.returncode)
+
+    async def astream_fields(
+        self,
+        pcap_path: str,
+        fields: list[str],
+        display_filter: Optional[str] = None,
+        occurrence: str = "f",
+        batch_size: int = ASYNC_BATCH_ROWS,
+        on_read: Optional[Callable[[int], None]] = None,
+    ) -> AsyncIterator[list[dict[str, str]]]:
+        """
+        Async counterpart of stream_fields, yielding rows in batches.
+        tshark is only read while the consumer asks for more (the pipe
+        applies backpressure), and is killed when iteration stops early or
+        the task is cancelled; wrap the iterator in contextlib.aclosing() to
+        have that happen right away rather than when it is collected.
+        Like stream_fields, a failing tshark is reported to failure_scope()
+        and on_read is called with the capture bytes tshark has read.
+        """
+        if not self.is_available():
+            raise RuntimeError("Tshark not found")
+
+        # Same stdin handoff as stream_fields for the read position
+        source = open(pcap_path, "rb") if on_read and pcap_path != "-" else None
+        cmd = self._fields_cmd(
+            "-" if source else pcap_path,
+            fields,
+            display_filter,
+            occurrence,
+            flush=pcap_path == "-",
+        )
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=source or (None if pcap_path == "-" else subprocess.DEVNULL),
+            stdout=subprocess.PIPE,
+        )
+        assert proc.stdout is not None
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        header: list[str] | None = None
+        pending = ""
+        # pending[:scanned] was searched for record ends, `quoted` is whether
+        # that position is inside a quoted field
+        scanned = 0
+        quoted = False
+        try:
+            while True:
+                chunk = await proc.stdout.read(ASYNC_READ_SIZE)
+                if source:
+                    on_read(os.lseek(source.fileno(), 0, os.SEEK_CUR))
+                pending += decoder.decode(chunk, final=not chunk)
+                if chunk:
+                    # Only parse complete records (quoted fields may contain
+                    # newlines), keep the rest for later
+                    end = 0
+                    for match in _RECORD_CHARS.finditer(pending, scanned):
+                        if match.group() == '"':
+                            quoted = not quoted
+                        elif not quoted:
+                            end = match.end()
+                    scanned = len(pending) - end
+                    if not end:
+                        continue
+                    data, pending = pending[:end], pending[end:]
+                elif pending:
+                    data, pending = pending, ""
+                else:
+                    break
+
+                batch: list[dict[str, str]] = []
+                for values in csv.reader(io.StringIO(data, newline="")):
+                    if header is None:
+                        header = values
+                        continue
+                    batch.append(dict(zip(header, values)))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+            if source:
+                source.close()
+
+        if proc.returncode:
+            self._stream_failed(proc.returncode)
 
 
 # Global instance
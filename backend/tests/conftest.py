@@ -0,0 +1,74 @@
+import pytest
+
+from pcap_analyzer.tshark import tshark
+
+
+class FakeTshark:
+    """Stands in for tshark.stream_fields, recording every run"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def __call__(
+        self, pcap_path, fields, display_filter=None, occurrence="f", on_read=None
+    ):
+        self.calls.append(display_filter)
+        for row in self.rows:
+            yield {f: row.get(f, "") for f in fields}
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # Keep result and column caches out of the user's cache directory
+    path = tmp_path / "cache"
+    monkeypatch.setenv("NETLENS_CACHE_DIR", str(path))
+    return path
+
+
+@pytest.fixture
+def capture(tmp_path):
+    path = tmp_path / "capture.pcap"
+    path.write_bytes(b"\xd4\xc3\xb2\xa1" + bytes(60))
+    return path
+
+
+@pytest.fixture
+def fake_tshark(monkeypatch):
+    def install(rows):
+        fake = FakeTshark(rows)
+        monkeypatch.setattr(tshark, "stream_fields", fake)
+        monkeypatch.setattr(tshark, "is_available", lambda: True)
+        return fake
+
+    return install
+
+
+FAKE_TSHARK = """#!{python}
+import sys
+args = sys.argv[1:]
+sys.stdin.buffer.read() if "-r" in args and args[args.index("-r") + 1] == "-" else None
+sys.stdout.write({output!r})
+sys.stdout.write('"' + " ".join(args).replace('"', "'") + '"\\n' if {echo} else "")
+sys.exit({exit_code})
+"""
+
+
+@pytest.fixture
+def tshark_script(tmp_path, monkeypatch):
+    """Point tshark at a script printing `output` (then its arguments if echo)"""
+
+    def install(output="", exit_code=0, echo=False):
+        import sys
+
+        path = tmp_path / "tshark"
+        path.write_text(
+            FAKE_TSHARK.format(
+                python=sys.executable, output=output, exit_code=exit_code, echo=echo
+            )
+        )
+        path.chmod(0o755)
+        monkeypatch.setattr(tshark, "tshark_path", str(path))
+        return path
+
+    return install
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from pcap_analyzer import cache
+from pcap_analyzer.analyzer import PcapAnalyzer
+
+SUMMARY_OUTPUT = "frame.number,frame.len\n1,60\n2,70\n"
+PACKETS_OUTPUT = (
+    "frame.time_epoch,frame.len,ip.src,ip.dst,_ws.col.protocol\n"
+    "1.0,60,10.0.0.1,10.0.0.2,TCP\n1.5,70,10.0.0.2,10.0.0.1,TCP\n"
+)
+HTTP_OUTPUT = (
+    "frame.time_relative,tcp.stream,http.request.method,http.host,http.response.code\n"
+    "0.5,1,GET,a.example,\n0.75,1,,,200\n"
+)
+
+
+def test_key_follows_options_content_and_code(capture, monkeypatch):
+    path = cache.result_cache_path(capture, "pcap_summary", {})
+    assert cache.result_cache_path(capture, "pcap_summary", {}) == path
+    assert cache.result_cache_path(capture, "pcap_summary", {"a": 1}) != path
+    assert cache.result_cache_path(capture, "dns_analysis", {}) != path
+
+    monkeypatch.setattr(cache, "_code_version", lambda: "changed")
+    upgraded = cache.result_cache_path(capture, "pcap_summary", {})
+    assert upgraded.name.split("_")[0] == path.name.split("_")[0]
+    assert upgraded != path
+
+
+def test_rewritten_capture_supersedes_entry(capture):
+    old = cache.result_cache_path(capture, "pcap_summary", {})
+    cache.store_result(old, {"total": 1})
+    assert cache.load_result(old) == {"total": 1}
+
+    capture.write_bytes(b"\1" * 64)
+    new = cache.result_cache_path(capture, "pcap_summary", {})
+    assert new != old and cache.load_result(new) is None
+    cache.store_result(new, {"total": 2})
+    assert not old.exists()
+
+
+def test_run_caches_successful_result(capture, tshark_script):
+    script = tshark_script(output=SUMMARY_OUTPUT)
+    result = PcapAnalyzer(str(capture)).run("pcap_summary")
+    assert cache.load_result(cache.result_cache_path(capture, "pcap_summary", {}))
+
+    script.unlink()
+    tshark_script(output="", exit_code=1)
+    assert PcapAnalyzer(str(capture)).run("pcap_summary") == result
+
+
+def test_run_skips_cache_when_tshark_fails(capture, tshark_script):
+    tshark_script(output=SUMMARY_OUTPUT, exit_code=2)
+    PcapAnalyzer(str(capture)).run("pcap_summary")
+    assert (
+        cache.load_result(cache.result_cache_path(capture, "pcap_summary", {})) is None
+    )
+
+
+def test_failed_summary_keeps_stdout_clean(capture, tshark_script, capsys):
+    tshark_script(output=SUMMARY_OUTPUT, exit_code=2)
+    result = PcapAnalyzer(str(capture)).run("pcap_summary")
+    assert result["summary"]["total_packets"] == 2
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.parametrize(
+    "analysis_type, output",
+    [("pcap_summary", PACKETS_OUTPUT), ("http_analysis", HTTP_OUTPUT)],
+)
+def test_arun_matches_run_and_shares_cache(
+    capture, tshark_script, analysis_type, output
+):
+    tshark_script(output=output)
+    result = asyncio.run(PcapAnalyzer(str(capture)).arun(analysis_type))
+    path = cache.result_cache_path(capture, analysis_type, {})
+    assert cache.load_result(path) == result
+
+    path.unlink()
+    assert PcapAnalyzer(str(capture)).run(analysis_type) == result
+
+
+def test_async_single_flight_waits_for_holder(capture):
+    path = cache.result_cache_path(capture, "pcap_summary", {})
+    entered = []
+
+    async def enter():
+        async with cache.async_single_flight(path):
+            entered.append(True)
+
+    async def main():
+        with cache.single_flight(path):
+            task = asyncio.create_task(enter())
+            await asyncio.sleep(5 * cache.FLIGHT_POLL_SECONDS)
+            assert entered == []
+        await task
+
+    asyncio.run(main())
+    assert entered == [True]
+    assert cache._flight_locks == {}
+
+
+def test_single_flight_forgets_released_entries(capture):
+    path = cache.result_cache_path(capture, "pcap_summary", {})
+    release = threading.Event()
+
+    def run():
+        with cache.single_flight(path):
+            release.wait()
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    while sum(holders for _, holders in cache._flight_locks.values()) < 2:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert cache._flight_locks == {}
+
+
+@pytest.mark.skipif(cache.fcntl is None, reason="needs flock")
+def test_held_lock_files_are_not_pruned(capture):
+    path = cache.result_cache_path(capture, "pcap_summary", {})
+    idle = path.parent / "idle.lock"
+    idle.touch()
+    with cache.single_flight(path):
+        held = path.parent / f"{path.name.split('_')[0]}.lock"
+        cache._prune_locks(path.parent, 0)
+        assert held.exists()
+        assert not idle.exists()
+
+
+@pytest.mark.skipif(cache.fcntl is None, reason="needs flock")
+def test_lock_file_pruned_while_waiting_is_replaced(tmp_path):
+    lock_path = tmp_path / "entry.lock"
+    holder = open(lock_path, "a")
+    cache.fcntl.flock(holder, cache.fcntl.LOCK_EX)
+    acquired = []
+    waiter = threading.Thread(
+        target=lambda: acquired.append(cache._lock_file(lock_path))
+    )
+    waiter.start()
+    time.sleep(0.1)  # let it block on the flock
+
+    lock_path.unlink()
+    holder.close()
+    waiter.join()
+    assert os.fstat(acquired[0].fileno()).st_ino == lock_path.stat().st_ino
+    acquired[0].close()
@@ -0,0 +1,185 @@
+import random
+
+from pcap_analyzer.link_tracer import LinkTracer, SessionInfo
+
+
+def pairwise_matches(tracer, sessions):
+    """The all-pairs timing and size matcher the bucketed one replaced"""
+    matches = []
+    ordered = sorted(sessions, key=lambda s: s.start_time)
+    for i, s1 in enumerate(ordered):
+        for s2 in ordered[i + 1 :]:
+            time_diff = s2.start_time - s1.start_time
+            if time_diff > tracer.TIME_WINDOW:
+                break
+            if time_diff < 0.001:
+                continue
+            if s1.src_ip == s2.src_ip and s1.dst_ip == s2.dst_ip:
+                continue
+            is_direct_proxy = s1.dst_ip == s2.src_ip
+            is_snat_pattern = (
+                s1.src_port == s2.src_port
+                and s1.dst_ip == s2.dst_ip
+                and s1.src_ip != s2.src_ip
+            )
+            is_port_preserved_proxy = (
+                s1.src_port == s2.src_port
+                and s1.src_ip != s2.src_ip
+                and (s1.dst_ip == s2.dst_ip or s1.dst_ip == s2.src_ip)
+            )
+            if not (is_direct_proxy or is_snat_pattern or is_port_preserved_proxy):
+                continue
+            if s1.packet_sizes and s2.packet_sizes:
+                similarity = tracer._size_sequence_similarity(
+                    s1.packet_sizes, s2.packet_sizes
+                )
+                if similarity > 0.6:
+                    matches.append((s1, s2, 0.5 + similarity * 0.3))
+    return matches
+
+
+def random_sessions(rng, count):
+    ips = [f"10.0.0.{k}" for k in range(6)]
+    sessions = []
+    for k in range(count):
+        base = rng.choice([60, 500, 1400])
+        sessions.append(
+            SessionInfo(
+                session_id=str(k),
+                src_ip=rng.choice(ips),
+                src_port=rng.choice([1000, 1001, 1002]),
+                dst_ip=rng.choice(ips),
+                dst_port=80,
+                start_time=round(rng.uniform(0, 3), 3),
+                packet_sizes=[
+                    base + rng.randint(-150, 150)
+                    for _ in range(rng.choice([0, 2, 3, 5, 12]))
+                ],
+            )
+        )
+    return sessions
+
+
+def test_timing_and_size_matches_equal_pairwise():
+    rng = random.Random(49)
+    tracer = LinkTracer()
+    for _ in range(100):
+        sessions = random_sessions(rng, rng.randint(2, 60))
+        expected = pairwise_matches(tracer, sessions)
+        actual = tracer._match_by_timing_and_size(sessions)
+        assert [(a.session_id, b.session_id, c) for a, b, c in actual] == [
+            (a.session_id, b.session_id, c) for a, b, c in expected
+        ]
+
+
+def pairwise_fingerprint_matches(tracer, sessions):
+    """The all-pairs fingerprint matcher the indexed one replaced"""
+    matches = []
+    by_fingerprint = {}
+    for s in sessions:
+        by_fingerprint.setdefault(s.payload_fingerprint, []).append(s)
+    for group in by_fingerprint.values():
+        group.sort(key=lambda s: s.start_time)
+        for i, s1 in enumerate(group):
+            for s2 in group[i + 1 :]:
+                if s1.src_ip == s2.src_ip and s1.dst_ip == s2.dst_ip:
+                    continue
+                if abs(s2.start_time - s1.start_time) > tracer.TIME_WINDOW * 2:
+                    continue
+                confidence = tracer._proxy_confidence(s1, s2)
+                if confidence:
+                    matches.append((s1, s2, confidence))
+    return matches
+
+
+def fingerprint_sessions(rng, count, ties=False):
+    ips = [f"10.0.0.{k}" for k in range(rng.randint(2, 8))]
+    ports = range(rng.randint(1, 5))
+    span = rng.choice([0.5, 2, 6])
+    return [
+        SessionInfo(
+            session_id=f"{k:03d}",
+            src_ip=rng.choice(ips),
+            src_port=rng.choice(ports),
+            dst_ip=rng.choice(ips),
+            dst_port=80,
+            start_time=(
+                rng.choice([0.5, 1.0, round(rng.uniform(0, span), 2)])
+                if ties
+                else rng.uniform(0, span)
+            ),
+            payload_fingerprint=rng.choice("ab"),
+        )
+        for k in range(count)
+    ]
+
+
+def groups(matches):
+    parent = {}
+
+    def find(key):
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            key = parent[key]
+        return key
+
+    for s1, s2, _ in matches:
+        parent[find(s1.session_id)] = find(s2.session_id)
+    members = {}
+    for key in parent:
+        members.setdefault(find(key), set()).add(key)
+    return sorted(sorted(group) for group in members.values())
+
+
+def chains(tracer, matches):
+    found = tracer._build_chains(
+        [(s1, s2, c, "payload_fingerprint") for s1, s2, c in matches],
+        include_packets=False,
+    )
+    return sorted(
+        (tuple(hop.session_id for hop in chain.hops), round(chain.confidence, 9))
+        for chain in found
+    )
+
+
+def test_fingerprint_groups_bridge_through_earlier_sessions():
+    sessions = [
+        SessionInfo(
+            session_id=session_id,
+            src_ip=src_ip,
+            src_port=src_port,
+            dst_ip=dst_ip,
+            dst_port=80,
+            start_time=start_time,
+            payload_fingerprint="x",
+        )
+        for session_id, src_ip, src_port, dst_ip, start_time in [
+            ("0", "10.0.0.3", 1002, "10.0.0.1", 0.002),
+            ("1", "10.0.0.1", 1000, "10.0.0.4", 0.103),
+            ("2", "10.0.0.3", 1002, "10.0.0.0", 0.205),
+            ("3", "10.0.0.3", 1001, "10.0.0.1", 0.308),
+            ("4", "10.0.0.1", 1001, "10.0.0.4", 0.407),
+        ]
+    ]
+    tracer = LinkTracer()
+    assert groups(tracer._match_by_payload_fingerprint(sessions)) == [
+        ["0", "1", "3", "4"]
+    ]
+
+
+def test_fingerprint_groups_and_chains_equal_pairwise():
+    rng = random.Random(48)
+    tracer = LinkTracer()
+    for k in range(600):
+        ties = k % 2 == 1
+        sessions = fingerprint_sessions(rng, rng.randint(2, 60), ties)
+        expected = pairwise_fingerprint_matches(tracer, sessions)
+        actual = tracer._match_by_payload_fingerprint(sessions)
+        assert groups(actual) == groups(expected)
+        if ties:
+            # Which of two simultaneous sessions comes first is arbitrary
+            assert [c[0] for c in chains(tracer, actual)] == [
+                c[0] for c in chains(tracer, expected)
+            ]
+        else:
+            assert chains(tracer, actual) == chains(tracer, expected)
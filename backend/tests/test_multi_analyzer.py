@@ -0,0 +1,108 @@
+from pcap_analyzer.event_store import EventStoreWriter
+from pcap_analyzer.multi_analyzer import MultiPcapAnalyzer
+
+
+def write_matches(analyzer, file_a, file_b, output_dir):
+    store = EventStoreWriter(
+        analyzer._match_store_path(file_a, file_b, output_dir),
+        analyzer._match_store_meta(file_a, file_b),
+    )
+    for ts in range(10):
+        store.add(str(ts % 2), float(ts), {"type": "lost", "ts_a": float(ts)})
+    return store.commit()
+
+
+def test_matches_in_output_dir_with_range_totals(tmp_path):
+    file_a, file_b = tmp_path / "a.pcap", tmp_path / "b.pcap"
+    file_a.write_bytes(b"a")
+    file_b.write_bytes(b"b")
+    analyzer = MultiPcapAnalyzer()
+    output_dir = tmp_path / "reports"
+    path = write_matches(analyzer, str(file_a), str(file_b), str(output_dir))
+    assert path.parent == output_dir
+
+    result = analyzer.get_correlation_matches(
+        str(file_a),
+        str(file_b),
+        start_ts=2,
+        end_ts=8,
+        page_size=2,
+        output_dir=str(output_dir),
+    )
+    assert result["total_events"] == 6
+    assert [e["ts_a"] for e in result["events"]] == [2.0, 3.0]
+
+    result = analyzer.get_correlation_matches(
+        str(file_a), str(file_b), flow="1", start_ts=2, output_dir=str(output_dir)
+    )
+    assert result["total_events"] == 4
+    assert not (tmp_path / "analysis_reports").exists()
+
+
+def signature_rows(rng, count):
+    """Time-ordered rows with few distinct signatures and repeated times"""
+    ts = 1000.0
+    rows = []
+    for frame in range(1, count + 1):
+        ts += rng.choice([0.0, 0.0, 0.25, 0.5, 1.0])
+        rows.append(
+            {
+                "frame.time_epoch": repr(ts),
+                "tcp.seq": str(rng.randint(1, 3)),
+                "tcp.ack": "1",
+                "tcp.len": str(rng.choice([0, 100])),
+                "tcp.dstport": "80",
+                "frame.number": str(frame),
+                "tcp.stream": str(rng.randint(0, 2)),
+            }
+        )
+    return rows
+
+
+def copied_rows(rng, rows):
+    """rows as seen further down the path: delayed, some lost or duplicated"""
+    copies = []
+    for row in rows:
+        for _ in range(rng.choice([0, 1, 1, 1, 2])):
+            delay = rng.choice([0.0, 0.25, 0.5, 2.5])
+            ts = float(row["frame.time_epoch"]) + 5 + delay
+            copies.append(dict(row, **{"frame.time_epoch": repr(ts)}))
+    copies.sort(key=lambda row: float(row["frame.time_epoch"]))
+    for frame, row in enumerate(copies, 1):
+        row["frame.number"] = str(frame)
+    return copies
+
+
+def test_correlate_variants_agree(tmp_path, monkeypatch):
+    import random
+
+    from pcap_analyzer import parallel
+    from pcap_analyzer.tshark import tshark
+
+    monkeypatch.setattr(parallel, "MAX_PROCESSES", 1)
+    captures = {}
+    monkeypatch.setattr(
+        tshark, "stream_fields", lambda path, fields, **kwargs: iter(captures[path])
+    )
+    file_a, file_b = str(tmp_path / "a.pcap"), str(tmp_path / "b.pcap")
+    for path in (file_a, file_b):
+        open(path, "wb").close()
+
+    rng = random.Random(42)
+    analyzer = MultiPcapAnalyzer()
+    for _ in range(50):
+        captures[file_a] = signature_rows(rng, rng.randint(1, 90))
+        captures[file_b] = copied_rows(rng, captures[file_a])
+
+        result = analyzer.correlate(file_a, file_b, str(tmp_path / "reports"))
+        events = list(analyzer.correlate_stream(file_a, file_b))
+        path = analyzer.correlate_path([file_a, file_b])
+
+        matches = [(m["frame_a"], m["frame_b"]) for m in result["matches"]]
+        assert [
+            (e["frame_a"], e["frame_b"]) for e in events if e["type"] == "match"
+        ] == matches
+        lost = [e["frame_a"] for e in events if e["type"] == "lost"]
+        assert lost == result["lost_frames_a"] == path["hops"][0]["lost_frames"]
+        assert path["hops"][0]["matched"] == result["matched_count"] == len(matches)
+        assert events[-1]["estimated_time_offset"] == result["estimated_time_offset"]
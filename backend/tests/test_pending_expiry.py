@@ -0,0 +1,67 @@
+from pcap_analyzer.analyzer import (
+    DNS_QUERY_TIMEOUT,
+    HTTP_PENDING_TIMEOUT,
+    PcapAnalyzer,
+)
+
+
+def dns(frame, ts, tx_id, response=False):
+    src, dst = ("10.0.0.53", "10.0.0.1") if response else ("10.0.0.1", "10.0.0.53")
+    return {
+        "frame.number": str(frame),
+        "frame.time_relative": str(ts),
+        "ip.src": src,
+        "ip.dst": dst,
+        "dns.id": tx_id,
+        "dns.qry.name": "example.com",
+        "dns.qry.type": "1",
+        "dns.flags.response": "1" if response else "0",
+        "dns.flags.rcode": "0",
+    }
+
+
+def http(frame, ts, stream, response=False):
+    row = {
+        "frame.number": str(frame),
+        "frame.time_relative": str(ts),
+        "tcp.stream": stream,
+    }
+    if response:
+        row["http.response.code"] = "200"
+    else:
+        row["http.request.method"] = "GET"
+        row["http.host"] = "example.com"
+    return row
+
+
+def test_retried_dns_query_still_expires(capture, fake_tshark):
+    late = DNS_QUERY_TIMEOUT + 0.5
+    fake_tshark(
+        [
+            dns(1, 0.0, "a"),
+            dns(2, 1.0, "b"),
+            dns(3, 2.0, "a"),  # retry of the first query
+            dns(4, late, "c"),
+            dns(5, late, "a", response=True),
+        ]
+    )
+    result = PcapAnalyzer(str(capture)).analyze_dns()
+    assert result["retransmitted_queries"] == 1
+    assert result["unmatched_responses"] == 1
+    assert result["latency"]["overall"]["count"] == 0
+
+
+def test_pipelined_http_request_keeps_stream_age(capture, fake_tshark):
+    late = HTTP_PENDING_TIMEOUT + 1.0
+    fake_tshark(
+        [
+            http(1, 0.0, "1"),
+            http(2, 1.0, "2"),
+            http(3, 2.0, "1"),  # pipelined behind the first request
+            http(4, late, "3"),
+            http(5, late + 0.5, "1", response=True),
+        ]
+    )
+    result = PcapAnalyzer(str(capture)).analyze_http()
+    # The first request expired, the response answers the pipelined one
+    assert result["latency"]["overall"]["max_ms"] == (late + 0.5 - 2.0) * 1000
@@ -0,0 +1,113 @@
+import pytest
+
+from pcap_analyzer.query_engine import ColumnTable, UnsupportedFilter, compile_filter
+
+
+def tcp_row(src="10.0.0.1", dst="10.0.0.2", sport="50000", dport="80", **extra):
+    row = {
+        "ip.src": src,
+        "ip.dst": dst,
+        "tcp.srcport": sport,
+        "tcp.dstport": dport,
+    }
+    row.update(extra)
+    return row
+
+
+def matches(expression, rows):
+    """Matching row indices, checked to agree between row and column evaluation"""
+    compiled = compile_filter(expression)
+    by_row = [i for i, row in enumerate(rows) if compiled.match(row)]
+
+    table = ColumnTable(sorted({f for row in rows for f in row}))
+    for row in rows:
+        table.append(row)
+    assert compiled.evaluate(table) == by_row
+    return by_row
+
+
+def test_range_needs_one_value_within_both_bounds():
+    rows = [
+        tcp_row(sport="50000", dport="80"),  # one above, one below the range
+        tcp_row(sport="1500", dport="80"),
+        tcp_row(sport="50000", dport="2000"),
+    ]
+    assert matches("tcp.port in {1000..2000}", rows) == [1, 2]
+
+
+def test_range_over_multiple_occurrences():
+    # occurrence=a joins the values of a field seen several times (tunnels)
+    rows = [
+        {"ip.src": "10.0.0.1", "frame.len": "60,5000"},
+        {"ip.src": "10.0.0.1", "frame.len": "60,1000"},
+    ]
+    assert matches("frame.len in {100..2000}", rows) == [1]
+
+
+def test_set_mixes_values_and_ranges():
+    rows = [
+        tcp_row(dport="22"),
+        tcp_row(dport="443"),
+        tcp_row(dport="8081"),
+        tcp_row(dport="9000"),
+    ]
+    assert matches("tcp.dstport in {22 443 8000..8100}", rows) == [0, 1, 2]
+
+
+def test_address_range():
+    rows = [tcp_row(src="10.0.0.5"), tcp_row(src="10.0.1.5")]
+    assert matches("ip.src in {10.0.0.1..10.0.0.9}", rows) == [0]
+
+
+def test_alias_matches_any_column():
+    rows = [
+        tcp_row(src="10.0.0.1", dst="10.0.0.2"),
+        tcp_row(src="10.0.0.3", dst="10.0.0.1"),
+        tcp_row(src="10.0.0.3", dst="10.0.0.4"),
+    ]
+    assert matches("ip.addr == 10.0.0.1", rows) == [0, 1]
+
+
+def test_not_equal_needs_every_value_different():
+    # tshark: "tcp.port != 80" is true only if no port is 80
+    rows = [tcp_row(sport="50000", dport="80"), tcp_row(sport="50000", dport="443")]
+    assert matches("tcp.port != 80", rows) == [1]
+
+
+def test_cidr_and_logic():
+    rows = [
+        tcp_row(src="192.168.1.7", dport="443"),
+        tcp_row(src="192.168.2.7", dport="443"),
+        tcp_row(src="192.168.1.7", dport="80"),
+    ]
+    assert matches("ip.src == 192.168.1.0/24 and not tcp.dstport == 80", rows) == [0]
+
+
+def test_bare_protocol_is_existence_test():
+    rows = [tcp_row(), {"ip.src": "10.0.0.1", "udp.srcport": "53"}]
+    assert matches("udp", rows) == [1]
+
+
+@pytest.mark.parametrize("expression", ["http.request", "tcp.port in {}", "frame["])
+def test_unsupported_filters_raise(expression):
+    with pytest.raises(UnsupportedFilter):
+        compile_filter(expression, available_fields=["ip.src"])
+
+
+def test_table_round_trip(tmp_path):
+    rows = [tcp_row(), tcp_row(dport="443", **{"http.host": "a\nb"})]
+    table = ColumnTable(["ip.src", "tcp.dstport", "http.host"])
+    for row in rows:
+        table.append(row)
+    table.save(tmp_path / "table.cols")
+    loaded = ColumnTable.load(tmp_path / "table.cols")
+    assert list(loaded.rows()) == list(table.rows())
+    assert compile_filter("tcp.dstport == 443").evaluate(loaded) == [1]
+
+
+def test_foreign_table_file_is_rejected(tmp_path):
+    path = tmp_path / "table.cols"
+    for data in [b"", b"\x80\x04junk", b'{"version": 1}\n', b"[]\n"]:
+        path.write_bytes(data)
+        with pytest.raises((ValueError, KeyError, TypeError)):
+            ColumnTable.load(path)
@@ -0,0 +1,32 @@
+import gzip
+import json
+
+from pcap_analyzer.report_writer import ReportWriter
+
+
+def test_writers_use_private_temporary_files(tmp_path):
+    path = tmp_path / "report.json"
+    # Another writer of the same report, midway through
+    (tmp_path / "report.json.tmp").write_text("partial")
+
+    writer = ReportWriter()
+    writer.write_json(path, {"a": 1})
+    writer.write_stream(tmp_path / "report.html", lambda f: f.write("<html>"))
+    writer.flush()
+
+    assert json.loads(path.read_text()) == {"a": 1}
+    assert (tmp_path / "report.html").read_text() == "<html>"
+    assert (tmp_path / "report.json.tmp").read_text() == "partial"
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "report.html",
+        "report.json",
+        "report.json.tmp",
+    ]
+
+
+def test_compressed_reports(tmp_path):
+    writer = ReportWriter(compress=True)
+    path = writer.json_path(tmp_path / "report.json")
+    writer.write_json(path, {"a": 1})
+    writer.flush()
+    assert json.loads(gzip.decompress(path.read_bytes())) == {"a": 1}
@@ -0,0 +1,57 @@
+from pcap_analyzer import analyzer as analyzer_module
+from pcap_analyzer.analyzer import PcapAnalyzer
+
+FIELDS = ["frame.number", "tcp.dstport"]
+ROWS = [
+    {"frame.number": "1", "tcp.srcport": "50000", "tcp.dstport": "80"},
+    {"frame.number": "2", "tcp.srcport": "50001", "tcp.dstport": "443"},
+]
+
+
+def frames(rows):
+    return [row["frame.number"] for row in rows]
+
+
+def test_search_without_cached_table_filters_in_tshark(capture, fake_tshark):
+    fake = fake_tshark(ROWS[:1])
+    analyzer = PcapAnalyzer(str(capture))
+    rows = list(analyzer._stream_rows("tcp", FIELDS, "tcp.port == 80"))
+    assert fake.calls == ["(tcp) and (tcp.port == 80)"]
+    assert frames(rows) == ["1"]
+
+
+def test_search_uses_cached_table(capture, fake_tshark):
+    fake = fake_tshark(ROWS)
+    analyzer = PcapAnalyzer(str(capture))
+    assert frames(analyzer._stream_rows("tcp", FIELDS)) == ["1", "2"]
+    assert frames(analyzer._stream_rows("tcp", FIELDS, "tcp.port == 443")) == ["2"]
+    assert fake.calls == ["tcp"]
+
+
+def test_search_on_capture_too_large_to_cache(capture, fake_tshark, monkeypatch):
+    monkeypatch.setattr(analyzer_module, "MAX_CACHED_ROWS", 1)
+    fake = fake_tshark(ROWS)
+    analyzer = PcapAnalyzer(str(capture))
+    assert frames(analyzer._stream_rows("tcp", FIELDS)) == ["1", "2"]
+    list(analyzer._stream_rows("tcp", FIELDS, "tcp.port == 443"))
+    assert fake.calls == ["tcp", "(tcp) and (tcp.port == 443)"]
+
+
+def test_corrupt_cached_table_is_a_miss(capture, fake_tshark, cache_dir):
+    fake = fake_tshark(ROWS)
+    analyzer = PcapAnalyzer(str(capture))
+    list(analyzer._stream_rows("tcp", FIELDS))
+    (saved,) = (cache_dir / "columns").glob("*.cols")
+    saved.write_bytes(saved.read_bytes()[:-3])
+    list(analyzer._stream_rows("tcp", FIELDS, "tcp.port == 443"))
+    assert fake.calls == ["tcp", "(tcp) and (tcp.port == 443)"]
+
+
+def test_unscoped_aggregator_run_caches_table(capture, fake_tshark):
+    fake = fake_tshark(
+        [dict(row, **{"tcp.stream": row["frame.number"]}) for row in ROWS]
+    )
+    analyzer = PcapAnalyzer(str(capture))
+    assert analyzer.analyze_tcp_sessions()["total_sessions"] == 2
+    assert analyzer.analyze_tcp_sessions("tcp.port == 443")["total_sessions"] == 1
+    assert fake.calls == ["tcp"]
@@ -0,0 +1,84 @@
+import struct
+
+from pcap_analyzer.analyzer import PcapAnalyzer
+from pcap_analyzer.tshark import tshark
+
+PCAP_HEADER = b"\xd4\xc3\xb2\xa1" + struct.pack("<HHiIII", 2, 4, 0, 0, 65535, 1)
+
+
+def record(ts, payload):
+    return struct.pack("<IIII", ts, 0, len(payload), len(payload)) + payload
+
+
+def install(monkeypatch, rows_for):
+    """Fake tshark yielding rows_for(chunk bytes), recording every chunk"""
+    seen = []
+
+    def stream_fields(pcap_path, fields, display_filter=None, **kwargs):
+        with open(pcap_path, "rb") as f:
+            seen.append(f.read())
+        yield from rows_for(seen[-1])
+
+    monkeypatch.setattr(tshark, "stream_fields", stream_fields)
+    monkeypatch.setattr(tshark, "is_available", lambda: True)
+    return seen
+
+
+def summary_rows(chunk):
+    # One row per record, 60 bytes each
+    count = (len(chunk) - len(PCAP_HEADER)) // len(record(0, b"a" * 60))
+    for frame in range(1, count + 1):
+        yield {
+            "frame.number": str(frame),
+            "frame.len": "60",
+            "frame.time_epoch": f"{frame}.0",
+            "ip.src": "10.0.0.1",
+        }
+
+
+def test_first_refresh_leaves_partial_record_out(tmp_path, monkeypatch):
+    path = tmp_path / "growing.pcap"
+    partial = record(3, b"c" * 60)[:30]
+    path.write_bytes(
+        PCAP_HEADER + record(1, b"a" * 60) + record(2, b"b" * 60) + partial
+    )
+    seen = install(monkeypatch, summary_rows)
+    result = PcapAnalyzer(path).run("pcap_summary", {"tail": True})
+    assert result["tail"]["new_frames"] == 2
+    assert seen == [path.read_bytes()[: -len(partial)]]
+
+
+def test_refresh_resumes_from_saved_checkpoint(tmp_path, monkeypatch, cache_dir):
+    path = tmp_path / "growing.pcap"
+    path.write_bytes(PCAP_HEADER + record(1, b"a" * 60))
+    install(monkeypatch, summary_rows)
+    first = PcapAnalyzer(path).run("pcap_summary", {"tail": True})
+    assert first["tail"]["resumed"] is False
+
+    with open(path, "ab") as f:
+        f.write(record(2, b"b" * 60) + record(3, b"c" * 60))
+    second = PcapAnalyzer(path).run("pcap_summary", {"tail": True})
+    assert second["tail"] == {
+        "resumed": True,
+        "new_frames": 2,
+        "total_frames": 3,
+        "offset": len(path.read_bytes()),
+    }
+    assert second["summary"]["total_packets"] == 3
+    assert second["top_talkers"][0]["packets_sent"] == 3
+
+
+def test_foreign_checkpoint_starts_over(tmp_path, monkeypatch, cache_dir):
+    path = tmp_path / "growing.pcap"
+    path.write_bytes(PCAP_HEADER + record(1, b"a" * 60))
+    install(monkeypatch, summary_rows)
+    PcapAnalyzer(path).run("pcap_summary", {"tail": True})
+
+    (saved,) = (cache_dir / "tail").glob("*.json")
+    # Not JSON, not a checkpoint, state of another aggregator layout
+    layout = saved.read_bytes().replace(b'"total_packets"', b'"packets"')
+    for data in [b"\x80\x04junk", b"[]", layout]:
+        saved.write_bytes(data)
+        result = PcapAnalyzer(path).run("pcap_summary", {"tail": True})
+        assert result["tail"]["resumed"] is False
+        assert result["summary"]["total_packets"] == 1
@@ -0,0 +1,110 @@
+import asyncio
+import sys
+
+import pytest
+
+from pcap_analyzer.tshark import tshark
+
+tshark_module = sys.modules[tshark.__module__]
+
+
+def test_line_buffered_only_for_live_pipes(capture):
+    cmd = tshark._fields_cmd(str(capture), ["frame.number"], None, "f")
+    assert "-l" not in cmd
+    cmd = tshark._fields_cmd("-", ["frame.number"], None, "f", flush=True)
+    assert "-l" in cmd
+
+
+def test_progress_reads_from_stdin_without_flushing(capture, tshark_script):
+    tshark_script(output="args\n", echo=True)
+    positions = []
+    rows = list(tshark.stream_fields(str(capture), ["args"], on_read=positions.append))
+    args = rows[0]["args"].split()
+    assert args[args.index("-r") + 1] == "-"
+    assert "-l" not in args
+    assert positions[-1] == capture.stat().st_size
+
+
+QUOTED_OUTPUT = 'http.host,http.user_agent\n"a.example","multi\nline ""agent"""\n"b.\xe9xample",""\n'
+QUOTED_ROWS = [
+    {"http.host": "a.example", "http.user_agent": 'multi\nline "agent"'},
+    {"http.host": "b.\xe9xample", "http.user_agent": ""},
+]
+
+
+def collect(capture, batch_size=500):
+    async def run():
+        rows = []
+        async for batch in tshark.astream_fields(
+            str(capture), ["http.host", "http.user_agent"], batch_size=batch_size
+        ):
+            rows.extend(batch)
+        return rows
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("read_size", [1, 7, 64 * 1024])
+def test_async_rows_keep_quoted_newlines(
+    capture, tshark_script, monkeypatch, read_size
+):
+    monkeypatch.setattr(tshark_module, "ASYNC_READ_SIZE", read_size)
+    tshark_script(output=QUOTED_OUTPUT)
+    assert collect(capture, batch_size=1) == QUOTED_ROWS
+
+
+def test_async_progress_reads_from_stdin(capture, tshark_script):
+    tshark_script(output="args\n", echo=True)
+    positions = []
+
+    async def run():
+        return [
+            row
+            async for batch in tshark.astream_fields(
+                str(capture), ["args"], on_read=positions.append
+            )
+            for row in batch
+        ]
+
+    args = asyncio.run(run())[0]["args"].split()
+    assert args[args.index("-r") + 1] == "-"
+    assert positions[-1] == capture.stat().st_size
+
+
+def test_failures_keep_rows_and_are_reported(capture, tshark_script):
+    tshark_script(output=QUOTED_OUTPUT, exit_code=2)
+    with tshark.failure_scope() as failures:
+        assert collect(capture) == QUOTED_ROWS
+    assert len(failures) == 1
+
+    with tshark.failure_scope() as failures:
+        rows = list(tshark.stream_fields(str(capture), ["http.host"]))
+    assert [row["http.user_agent"] for row in rows] == [
+        row["http.user_agent"] for row in QUOTED_ROWS
+    ]
+    assert len(failures) == 1
+
+    # Stopping early kills tshark, that is not a failure
+    with tshark.failure_scope() as failures:
+        stream = tshark.stream_fields(str(capture), ["http.host"])
+        next(stream)
+        stream.close()
+    assert failures == []
+
+
+def test_failure_scopes_are_per_thread(capture, tshark_script):
+    from concurrent.futures import ThreadPoolExecutor
+
+    tshark_script(output=QUOTED_OUTPUT, exit_code=2)
+    with tshark.failure_scope() as failures:
+        with ThreadPoolExecutor(1) as pool:
+            pool.submit(lambda: list(tshark.stream_fields(str(capture), []))).result()
+    assert failures == []
+
+
+def test_live_stream_ends_with_final_snapshot_on_failure(capture, tshark_script):
+    from pcap_analyzer.live import stream_live
+
+    tshark_script(output="frame.time_epoch\n1.0\n2.0\n", exit_code=2)
+    snapshots = list(stream_live(str(capture)))
+    assert snapshots[-1]["type"] == "final"
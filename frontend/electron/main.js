@@ -281,7 +281,23 @@ const runPythonCommand = (cliArgs, extraDevArgs = []) => {
       }
     });
 
+    // The backend releases stdout as soon as the result is printed and may
+    // keep running to finish writing reports in the background
+    let settled = false;
+    childProcess.stdout.on('end', () => {
+      try {
+        const result = JSON.parse(stdout);
+        if (result && !result.error) {
+          settled = true;
+          resolve(result);
+        }
+      } catch (e) {
+        // Incomplete output, wait for the exit code
+      }
+    });
+
     childProcess.on('close', (code) => {
+      if (settled) return;
       if (code === 0) {
         try {
           const result = JSON.parse(stdout);
@@ -632,7 +648,11 @@ ipcMain.handle('export-report', async (event, format, sourcePath, content) => {
   const fs = require('fs');
   
   try {
-    if (sourcePath) {
+    if (sourcePath && sourcePath.endsWith('.gz')) {
+      // Compressed JSON reports are exported as plain JSON
+      const zlib = require('zlib');
+      fs.writeFileSync(filePath, zlib.gunzipSync(fs.readFileSync(sourcePath)));
+    } else if (sourcePath) {
       fs.copyFileSync(sourcePath, filePath);
     } else if (content) {
       fs.writeFileSync(filePath, content);
@@ -652,6 +672,14 @@ ipcMain.handle('get-tcp-stream-packets', async (event, filePath, streamId, page)
   return runPythonCommand(['tcp_stream_packets', filePath, '--stream', streamId, '--page', page.toString()]);
 });
 
+ipcMain.handle('get-tcp-anomaly-events', async (event, filePath, streamId, page) => {
+  const outputDir = store.get('outputDir');
+  return runPythonCommand(
+    ['tcp_anomaly_events', filePath, '--stream', streamId, '--page', page.toString()],
+    ['--output-dir', outputDir || '']
+  );
+});
+
 app.whenReady().then(() => {
   createWindow();
   
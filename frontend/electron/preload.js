@@ -11,6 +11,7 @@ contextBridge.exposeInMainWorld('electronAPI', {
   analyzeCorrelation: (file1, file2) => ipcRenderer.invoke('analyze-correlation', file1, file2),
   analyzeLinkTrace: (file1, file2) => ipcRenderer.invoke('analyze-link-trace', file1, file2),
   getTcpStreamPackets: (filePath, streamId, page) => ipcRenderer.invoke('get-tcp-stream-packets', filePath, streamId, page),
+  getTcpAnomalyEvents: (filePath, streamId, page) => ipcRenderer.invoke('get-tcp-anomaly-events', filePath, streamId, page),
   askAi: (message, filePath) => ipcRenderer.invoke('ask-ai', message, filePath),
   verifyAiConfig: (config) => ipcRenderer.invoke('verify-ai-config', config),
   copyToClipboard: (text) => ipcRenderer.invoke('copy-to-clipboard', text),
@@ -620,7 +620,7 @@ function App() {
         title="对比分析"
         fileName={selectedFiles.map(f => f.split('/').pop()).join(' vs ')}
         stats={[
-            { label: '总匹配', value: data.matches?.length || 0 },
+            { label: '总匹配', value: data.matched_count ?? data.matches?.length ?? 0 },
             { label: '丢包 (A->B)', value: data.lost_in_b_count || 0, colorClass: data.lost_in_b_count > 0 ? 'value--danger' : '' },
             { label: '时间偏移', value: `${(data.estimated_time_offset || 0).toFixed(6)}s` }
         ]}
@@ -7,6 +7,9 @@ function DiagnosticsPanel({ data, filePath }) {
   const [selectedSessionId, setSelectedSessionId] = useState(null);
   const [selectedPacketDetails, setSelectedPacketDetails] = useState(null);
   const [isLoadingDetails, setIsLoadingDetails] = useState(false);
+  // Events beyond the in-memory sample, paged from the backend event store
+  const [eventPages, setEventPages] = useState({});
+  const [isLoadingEvents, setIsLoadingEvents] = useState(false);
 
   // Select first session by default
   useEffect(() => {
@@ -15,7 +18,37 @@ function DiagnosticsPanel({ data, filePath }) {
     }
   }, [data, selectedSessionId]);
 
+  useEffect(() => {
+    setEventPages({});
+  }, [data]);
+
   const selectedSession = data?.anomalous_sessions?.find(s => s.stream_id === selectedSessionId);
+  const selectedPages = selectedSession ? eventPages[selectedSession.stream_id] : null;
+  const selectedEvents = selectedPages ? selectedPages.events : selectedSession?.events;
+  const hasMoreEvents = selectedSession && (selectedEvents?.length || 0) < selectedSession.events_count;
+
+  const handleLoadMoreEvents = async () => {
+    const sample = selectedSession.events || [];
+    // The first page of the store is the sample we already have
+    const nextPage = selectedPages ? selectedPages.page + 1 : Math.floor(sample.length / 100) + 1;
+    setIsLoadingEvents(true);
+    try {
+      const res = await window.electronAPI.getTcpAnomalyEvents(filePath, selectedSession.stream_id, nextPage);
+      if (res?.events) {
+        setEventPages(prev => ({
+          ...prev,
+          [selectedSession.stream_id]: {
+            page: nextPage,
+            events: [...(selectedPages ? selectedPages.events : sample), ...res.events],
+          },
+        }));
+      }
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setIsLoadingEvents(false);
+    }
+  };
 
   const handleSessionClick = (id) => {
     setSelectedSessionId(id);
@@ -80,11 +113,23 @@ function DiagnosticsPanel({ data, filePath }) {
                 </div>
 
                 <SequenceDiagram 
-                  events={selectedSession.events} 
+                  events={selectedEvents} 
                   clientIp={selectedSession.src.split(':')[0]} 
                   serverIp={selectedSession.dst.split(':')[0]} 
                   onPacketClick={handlePacketClick}
                 />
+
+                {hasMoreEvents && (
+                  <button
+                    className="diag-load-more"
+                    onClick={handleLoadMoreEvents}
+                    disabled={isLoadingEvents}
+                  >
+                    {isLoadingEvents
+                      ? 'Loading...'
+                      : `Load more events (${selectedEvents.length} / ${selectedSession.events_count})`}
+                  </button>
+                )}
             </div>
 
             <div className="diag-detail-panel">
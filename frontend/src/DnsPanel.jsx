@@ -58,6 +58,7 @@ function DnsPanel({ data, filePath }) {
                         <span>Frame: #{selectedQuery.frame}</span>
                         <span>ID: {selectedQuery.id}</span>
                         <span>{selectedQuery.is_response ? "Response" : "Query"}</span>
+                        {selectedQuery.latency_ms != null && <span>Latency: {selectedQuery.latency_ms} ms</span>}
                     </div>
                 </div>
 
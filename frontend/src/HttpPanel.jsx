@@ -87,6 +87,7 @@ function HttpPanel({ data, filePath }) {
                         <span>Stream: {selectedReq.stream}</span>
                         {selectedReq.ua && <span>UA: {selectedReq.ua}</span>}
                         {selectedReq.ctype && <span>Type: {selectedReq.ctype}</span>}
+                        {selectedReq.latency_ms != null && <span>Latency: {selectedReq.latency_ms} ms</span>}
                     </div>
                 </div>
 